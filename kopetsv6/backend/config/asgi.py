@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.tiempo_real import RUTA_EVENTOS, aplicacion_eventos  # noqa: E402 (requiere django.setup)
+
+
+async def application(scope, receive, send):
+    # Los eventos en tiempo real (conexiones de larga duración) no pasan por Django
+    if scope['type'] == 'http' and scope['path'] == RUTA_EVENTOS:
+        return await aplicacion_eventos(scope, receive, send)
+    return await django_application(scope, receive, send)
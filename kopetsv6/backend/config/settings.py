@@ -1,3 +1,5 @@
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -152,6 +154,30 @@ CORS_ALLOW_HEADERS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Los archivos subidos se guardan por contenido (blobs/<sha256>): un mismo archivo subido
+# varias veces ocupa disco una sola vez. Ver manage.py reconciliar_blobs
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.almacenamiento.AlmacenamientoDeduplicado',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    # Documentos, contratos y verificaciones: fuera de MEDIA_ROOT para que /media/ no los
+    # sirva. Solo se leen por /api/archivos/ (o por nginx en la ruta interna /media-protegida/)
+    'protegido': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': os.environ.get('KOPETS_MEDIA_PROTEGIDA', str(BASE_DIR / 'media_protegida')),
+            'base_url': '/media-protegida/',
+        },
+    },
+}
+
+# Destino de los archivos huérfanos que mueve recolectar_media --cuarentena. Queda fuera de
+# MEDIA_ROOT para que no se sirvan en /media/
+MEDIA_CUARENTENA_ROOT = os.environ.get('KOPETS_MEDIA_CUARENTENA', str(BASE_DIR / 'media_cuarentena'))
+
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -177,14 +203,119 @@ SIMPLE_JWT = {
 }
 
 
-DATA_UPLOAD_MAX_MEMORY_SIZE = 150 * 1024 * 1024  # 150MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 150 * 1024 * 1024  # 150MB
+# Cuerpos que no son archivos (JSON, campos de formularios). Los documentos grandes se suben
+# por partes (/api/documentos-subidas/) y los trozos se copian a disco sin pasar por memoria
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+# Archivos más grandes se escriben a un temporal en disco en vez de quedar en la memoria del worker
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB (valor por defecto de Django)
+
+
+DOCUMENTOS_TAMANO_MAXIMO = 150 * 1024 * 1024  # 150MB
+SUBIDAS_TAMANO_TROZO = 5 * 1024 * 1024
+SUBIDAS_EXPIRACION_HORAS = 24
+# Archivos parciales de las subidas por partes; debe ser compartido entre servidores
+SUBIDAS_PARCIALES_DIR = os.environ.get('KOPETS_SUBIDAS_DIR', os.path.join(tempfile.gettempdir(), 'kopets_subidas'))
+
+
+# Descargas protegidas (/api/archivos/...). Con 'X-Accel-Redirect' (nginx) o 'X-Sendfile' (Apache)
+# Django solo autoriza y el proxy envía el archivo desde una ubicación interna
+DESCARGAS_OFFLOAD = os.environ.get('KOPETS_DESCARGAS_OFFLOAD', '')
+DESCARGAS_PREFIJO_INTERNO = '/media-protegida/'
+DESCARGAS_FIRMA_SEGUNDOS = 300
+
+
+# Cola de tareas en segundo plano (python manage.py procesar_tareas).
+# TAREAS_EN_LINEA ejecuta las tareas al confirmar la transacción, sin worker (solo desarrollo)
+TAREAS_EN_LINEA = os.environ.get('KOPETS_TAREAS_EN_LINEA', '') == '1'
+TAREAS_BLOQUEO_SEGUNDOS = 300
+TAREAS_RETENCION_DIAS = 7
+TAREAS_RETENCION_FALLIDAS_DIAS = 30
+
+
+# Notificaciones en tiempo real (/api/notificaciones/eventos/, requiere servidor ASGI).
+# Con varios procesos, KOPETS_TIEMPO_REAL_BROKER=host:puerto de manage.py broker_notificaciones
+TIEMPO_REAL_BROKER = os.environ.get('KOPETS_TIEMPO_REAL_BROKER', '')
+TIEMPO_REAL_LATIDO_SEGUNDOS = 25
+TIEMPO_REAL_COLA_MAXIMA = 100
+# Eventos pendientes de enviar al broker por proceso; con el broker caído se descartan
+TIEMPO_REAL_PUBLICADOR_COLA = 1000
+
+# Retención de notificaciones (manage.py archivar_notificaciones). Por tipo: (días, acción)
+# para las leídas; 'archivar' las pasa a NotificacionArchivada y 'borrar' las elimina.
+# '*' aplica a los tipos no listados. Las difusiones se borran al cumplir los mismos días
+NOTIFICACIONES_RETENCION = {
+    'TIP_NUEVO': (90, 'borrar'),
+    'CAMPANA_NUEVA': (90, 'borrar'),
+    'VOLUNTARIADO_NUEVO': (90, 'borrar'),
+    'MENSAJE_GENERAL': (90, 'borrar'),
+    '*': (180, 'archivar'),
+}
+NOTIFICACIONES_ARCHIVO_DIAS = 730
+NOTIFICACIONES_RETENCION_LOTE = 1000
+
+
+# Caché de respuestas del catálogo y datos de referencia (invalidada por tags).
+# KOPETS_CACHE: "memoria" (por proceso), "archivo" (compartida en disco) o "redis"
+# (cualquier servidor compatible con el protocolo Redis; requiere el paquete redis).
+CACHES_DISPONIBLES = {
+    'memoria': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kopets',
+    },
+    'archivo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('KOPETS_CACHE_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+CACHES = {
+    'default': CACHES_DISPONIBLES[os.environ.get('KOPETS_CACHE', 'memoria')],
+}
+CACHE_RESPUESTAS = True
+CACHE_RESPUESTAS_TTL = 300
 
+# Índice bitmap en memoria para los filtros del catálogo público (se reconstruye cada TTL segundos)
+CATALOGO_INDICE_BITMAP = True
+CATALOGO_INDICE_BITMAP_TTL = 60
 
+# Conteos de /mascotas-publicas/facets/ por combinación de filtros (también se invalidan por tags)
+CATALOGO_FACETAS_TTL = 60
+
+# Matriz de compatibilidad para /mascotas-publicas/recomendadas/ (se reconstruye cada TTL segundos)
+RECOMENDADOR_TTL = 300
+
+# Vecinos precalculados por mascota para /mascotas-publicas/{id}/similares/
+SIMILARES_POR_MASCOTA = 12
+# Al cambiar una mascota, el worker revisa las listas de sus N vecinas más cercanas y espera
+# unos segundos para fundir guardados seguidos en una sola tarea
+SIMILARES_CANDIDATOS = 1000
+SIMILARES_ESPERA_SEGUNDOS = 30
+
+
+# Los correos se envían desde el worker de tareas (core/correo.py). Para desarrollo y pruebas:
+# manage.py servidor_smtp_local y KOPETS_EMAIL_HOST=127.0.0.1 KOPETS_EMAIL_PORT=1025 KOPETS_EMAIL_TLS=0
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
-EMAIL_HOST_USER = 'soporteKokoropets@gmail.com'
-EMAIL_HOST_PASSWORD = 'ddebgcqbdjyxdpxy'  
-DEFAULT_FROM_EMAIL = 'Kokoropets <soporteKokoropets@gmail.com>'  
\ No newline at end of file
+EMAIL_HOST = os.environ.get('KOPETS_EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.environ.get('KOPETS_EMAIL_PORT', '587'))
+EMAIL_USE_TLS = os.environ.get('KOPETS_EMAIL_TLS', '1') == '1'
+EMAIL_HOST_USER = os.environ.get('KOPETS_EMAIL_USUARIO', 'soporteKokoropets@gmail.com')
+EMAIL_HOST_PASSWORD = os.environ.get('KOPETS_EMAIL_CLAVE', 'ddebgcqbdjyxdpxy')
+EMAIL_TIMEOUT = 20
+DEFAULT_FROM_EMAIL = 'Kokoropets <soporteKokoropets@gmail.com>'
+
+CORREO_MAX_INTENTOS = 5
+CORREO_RETENCION_DIAS = 7
+# Entrega: cada proceso mantiene hasta CORREO_POOL_CONEXIONES conexiones SMTP abiertas por
+# servidor y envía como máximo CORREO_LIMITES[servidor] mensajes por segundo ('*': el resto;
+# None: sin límite)
+CORREO_POOL_CONEXIONES = 4
+CORREO_MENSAJES_POR_CONEXION = 100
+CORREO_CONEXION_INACTIVA_SEGUNDOS = 60
+CORREO_LOTE = 50
+CORREO_LIMITES = {
+    'smtp.gmail.com': 5,
+    '*': 20,
+}
@@ -6,8 +6,10 @@ from .models import (
     PerfilAdoptante, SolicitudAdopcion, Adopcion,
     VisitaSeguimiento, FotoVisita, TwoFactorCode, Campana, ParticipacionCampana,
     Tip, ResenaRefugio, EventoVoluntariado, InscripcionVoluntariado, Documento,
-    Notificacion, MascotaFavorita, TipFavorito
+    Notificacion, NotificacionArchivada, NotificacionDifusion, MascotaFavorita, TipFavorito, Tarea, CorreoSaliente,
+    BlobMedia
 )
+from .correo import reintentar_correo
 
 
 # =============================================================================
@@ -614,6 +616,24 @@ class NotificacionAdmin(admin.ModelAdmin):
     date_hierarchy = 'fecha_creacion'
 
 
+@admin.register(NotificacionArchivada)
+class NotificacionArchivadaAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'tipo', 'titulo', 'fecha_creacion', 'fecha_archivado')
+    list_filter = ('tipo', 'fecha_creacion')
+    search_fields = ('usuario__username', 'titulo', 'mensaje')
+    readonly_fields = ('fecha_creacion', 'fecha_archivado')
+    date_hierarchy = 'fecha_creacion'
+
+
+@admin.register(NotificacionDifusion)
+class NotificacionDifusionAdmin(admin.ModelAdmin):
+    list_display = ('titulo', 'tipo', 'tipo_usuario', 'fecha_creacion')
+    list_filter = ('tipo', 'tipo_usuario', 'fecha_creacion')
+    search_fields = ('titulo', 'mensaje')
+    readonly_fields = ('fecha_creacion',)
+    date_hierarchy = 'fecha_creacion'
+
+
 # =============================================================================
 # FAVORITOS
 # =============================================================================
@@ -633,4 +653,44 @@ class TipFavoritoAdmin(admin.ModelAdmin):
     list_filter = ('fecha_agregado',)
     search_fields = ('usuario__username', 'tip__titulo')
     readonly_fields = ('fecha_agregado',)
-    date_hierarchy = 'fecha_agregado'
\ No newline at end of file
+    date_hierarchy = 'fecha_agregado'
+
+
+# =============================================================================
+# TAREAS EN SEGUNDO PLANO
+# =============================================================================
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('tipo', 'clave', 'estado', 'prioridad', 'intentos', 'disponible_en', 'fecha_actualizacion')
+    list_filter = ('tipo', 'estado')
+    search_fields = ('clave', 'error')
+    readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
+    date_hierarchy = 'fecha_creacion'
+
+
+@admin.register(CorreoSaliente)
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    list_display = ('asunto', 'destinatarios', 'estado', 'intentos', 'fecha_creacion', 'fecha_envio')
+    list_filter = ('estado', 'fecha_creacion')
+    search_fields = ('asunto', 'error')
+    readonly_fields = ('intentos', 'error', 'fecha_creacion', 'fecha_envio')
+    date_hierarchy = 'fecha_creacion'
+    actions = ['reintentar']
+
+    @admin.action(description='Reintentar el envío')
+    def reintentar(self, request, queryset):
+        for correo in queryset.exclude(estado='ENVIADO'):
+            reintentar_correo(correo)
+
+
+# =============================================================================
+# ALMACENAMIENTO DE ARCHIVOS
+# =============================================================================
+
+@admin.register(BlobMedia)
+class BlobMediaAdmin(admin.ModelAdmin):
+    list_display = ('ruta', 'tamano', 'referencias', 'fecha_creacion', 'fecha_actualizacion')
+    search_fields = ('hash', 'ruta')
+    readonly_fields = ('hash', 'ruta', 'tamano', 'referencias', 'fecha_creacion', 'fecha_actualizacion')
+    date_hierarchy = 'fecha_creacion'
@@ -0,0 +1,339 @@
+import hashlib
+import logging
+import os
+import posixpath
+import shutil
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage, storages
+from django.db.models import Count, F, FileField, Q, Sum
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from .imagenes import CAMPOS_IMAGEN, TAREA_DERIVADOS, eliminar_derivados, rutas_derivados
+from .models import BlobMedia
+from .tareas import encolar
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# STORAGE DIRECCIONADO POR CONTENIDO
+# =============================================================================
+
+PREFIJO_BLOBS = 'blobs'
+
+
+def ruta_blob(digest, extension):
+    return f'{PREFIJO_BLOBS}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def es_blob(nombre):
+    return bool(nombre) and nombre.startswith(f'{PREFIJO_BLOBS}/')
+
+
+def hash_contenido(contenido):
+
+    sha = hashlib.sha256()
+    tamano = 0
+    contenido.seek(0)
+    for trozo in contenido.chunks():
+        sha.update(trozo)
+        tamano += len(trozo)
+    contenido.seek(0)
+    return sha.hexdigest(), tamano
+
+
+@deconstructible
+class AlmacenamientoDeduplicado(FileSystemStorage):
+
+    # Cada archivo subido se guarda una sola vez por contenido en blobs/ab/cd/<sha256>.<ext>
+    # y el campo del modelo apunta a esa ruta: el mismo logo subido por tres campañas ocupa
+    # un archivo. Las rutas con prefijo directo (derivados de imágenes) se guardan tal cual
+    prefijos_directos = ('derivados/',)
+
+    def _directo(self, name):
+        return name.startswith(self.prefijos_directos) or es_blob(name)
+
+    def get_available_name(self, name, max_length=None):
+        if es_blob(name) and self.exists(name):
+            # La ruta de un blob es su contenido: si ya existe (otra subida igual que llegó
+            # antes) se reutiliza en _guardar_blob en vez de crear una copia con sufijo
+            raise FileExistsError(name)
+        if self._directo(name):
+            return super().get_available_name(name, max_length=max_length)
+        # El nombre final lo decide el hash en _save
+        return name
+
+    def _guardar_blob(self, ruta, content):
+        try:
+            super()._save(ruta, content)
+        except FileExistsError:
+            pass
+        return ruta
+
+    def _save(self, name, content):
+
+        if self._directo(name):
+            return super()._save(name, content)
+
+        digest, tamano = hash_contenido(content)
+        blob = BlobMedia.objects.filter(hash=digest).first()
+        if blob is None:
+            ruta = self._guardar_blob(ruta_blob(digest, posixpath.splitext(name)[1].lower()), content)
+            # Dos subidas simultáneas del mismo contenido comparten la fila: la ruta de la que
+            # llegó primero no se reemplaza
+            blob, creado = BlobMedia.objects.get_or_create(hash=digest, defaults={'ruta': ruta, 'tamano': tamano})
+            if creado:
+                return blob.ruta
+        if not self.exists(blob.ruta):
+            self._guardar_blob(blob.ruta, content)
+        # Reusar cuenta como actividad: el recolector respeta el margen desde ahora
+        BlobMedia.objects.filter(pk=blob.pk).update(fecha_actualizacion=timezone.now())
+        return blob.ruta
+
+
+# =============================================================================
+# CONTEO DE REFERENCIAS
+# =============================================================================
+
+def campos_archivo(protegidos=False):
+
+    # {modelo: (campos FileField / ImageField)} de todos los modelos de core que usan el
+    # storage deduplicado, o con protegidos=True los que usan STORAGES['protegido']
+    protegido = storages['protegido']
+    campos = {}
+    for modelo in apps.get_app_config('core').get_models():
+        nombres = tuple(
+            f.name for f in modelo._meta.concrete_fields
+            if isinstance(f, FileField) and (f.storage is protegido) == protegidos
+        )
+        if nombres:
+            campos[modelo] = nombres
+    return campos
+
+
+def ajustar_referencias(agregadas, quitadas):
+
+    cambios = Counter(ruta for ruta in agregadas if es_blob(ruta))
+    cambios.subtract(ruta for ruta in quitadas if es_blob(ruta))
+    for ruta, delta in cambios.items():
+        if delta:
+            BlobMedia.objects.filter(ruta=ruta).update(
+                referencias=F('referencias') + delta, fecha_actualizacion=timezone.now()
+            )
+
+
+def referencias_actuales():
+
+    conteo = Counter()
+    for modelo, campos in campos_archivo().items():
+        for campo in campos:
+            nombres = (
+                modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .order_by().values_list(campo, flat=True)
+            )
+            conteo.update(nombres.iterator(chunk_size=2000))
+    return conteo
+
+
+def metricas_deduplicacion():
+
+    datos = BlobMedia.objects.aggregate(
+        blobs=Count('id'),
+        referencias_totales=Sum('referencias'),
+        bytes_almacenados=Sum('tamano'),
+        bytes_sin_deduplicar=Sum(F('tamano') * F('referencias'), filter=Q(referencias__gt=0)),
+        bytes_huerfanos=Sum('tamano', filter=Q(referencias__lte=0)),
+    )
+    datos = {clave: valor or 0 for clave, valor in datos.items()}
+    datos['bytes_ahorrados'] = datos['bytes_sin_deduplicar'] - (datos['bytes_almacenados'] - datos['bytes_huerfanos'])
+    return datos
+
+
+# =============================================================================
+# RECONCILIACIÓN
+# =============================================================================
+
+def migrar_archivos_legados():
+
+    # Archivos subidos antes del storage deduplicado (mascotas/foto.jpg, ...): se copian al
+    # blob de su contenido y se actualizan las filas. El archivo viejo queda para el recolector
+    migrados = 0
+    for modelo, campos in campos_archivo().items():
+        for campo in campos:
+            nombres = (
+                modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .exclude(**{f'{campo}__startswith': f'{PREFIJO_BLOBS}/'})
+                .order_by().values_list(campo, flat=True).distinct()
+            )
+            for nombre in list(nombres):
+                if not default_storage.exists(nombre):
+                    logger.warning("Archivo referenciado inexistente: %s", nombre)
+                    continue
+                with default_storage.open(nombre, 'rb') as archivo:
+                    ruta = default_storage.save(nombre, archivo)
+
+                filas = modelo.objects.filter(**{campo: nombre})
+                pks = list(filas.values_list('pk', flat=True))
+                filas.update(**{campo: ruta})
+                if campo in CAMPOS_IMAGEN.get(modelo, ()):
+                    for pk in pks:
+                        encolar(
+                            TAREA_DERIVADOS, clave=ruta,
+                            modelo=modelo._meta.label, pk=pk, campo=campo, nombre=ruta,
+                        )
+                migrados += 1
+    return migrados
+
+
+def reconciliar_referencias():
+
+    # Recalcula el conteo desde los campos de archivo (la fuente de verdad) y registra los
+    # blobs referenciados que no tienen fila (p. ej. tras restaurar un respaldo)
+    conteo = referencias_actuales()
+    corregidos = 0
+    for blob in BlobMedia.objects.iterator():
+        reales = conteo.pop(blob.ruta, 0)
+        if blob.referencias != reales:
+            BlobMedia.objects.filter(pk=blob.pk).update(referencias=reales, fecha_actualizacion=timezone.now())
+            corregidos += 1
+
+    for ruta, reales in conteo.items():
+        if es_blob(ruta) and default_storage.exists(ruta):
+            digest = posixpath.splitext(posixpath.basename(ruta))[0]
+            BlobMedia.objects.get_or_create(
+                hash=digest, defaults={'ruta': ruta, 'tamano': default_storage.size(ruta), 'referencias': reales}
+            )
+            corregidos += 1
+    return corregidos
+
+
+def borrar_blobs_sin_referencias(gracia=timedelta(hours=24)):
+
+    # El margen evita borrar un blob recién subido cuya fila todavía no se guarda
+    limite = timezone.now() - gracia
+    borrados = 0
+    liberados = 0
+    for blob in BlobMedia.objects.filter(referencias__lte=0, fecha_actualizacion__lt=limite).iterator():
+        # Se vuelve a comprobar al borrar la fila por si alguien lo referenció entretanto
+        eliminadas, _ = BlobMedia.objects.filter(
+            pk=blob.pk, referencias__lte=0, fecha_actualizacion__lt=limite
+        ).delete()
+        if not eliminadas:
+            continue
+        default_storage.delete(blob.ruta)
+        eliminar_derivados(blob.ruta)
+        borrados += 1
+        liberados += blob.tamano
+    return borrados, liberados
+
+
+# =============================================================================
+# RECOLECCIÓN DE ARCHIVOS HUÉRFANOS
+# =============================================================================
+
+# Archivos del árbol de media que ninguna fila referencia: reemplazos de foto anteriores al
+# storage deduplicado, archivos de filas borradas con SQL directo o restauraciones parciales.
+# Cada etapa es un generador: ni el árbol ni la lista de huérfanos se cargan completos
+
+def rutas_referenciadas():
+
+    for modelo, campos in campos_archivo().items():
+        imagenes = CAMPOS_IMAGEN.get(modelo, ())
+        for campo in campos:
+            nombres = (
+                modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .order_by().values_list(campo, flat=True)
+            )
+            for nombre in nombres.iterator(chunk_size=2000):
+                yield nombre
+                if campo in imagenes:
+                    yield from rutas_derivados(nombre)
+
+    # Los blobs con fila los gestiona borrar_blobs_sin_referencias (con su margen propio)
+    for ruta in BlobMedia.objects.values_list('ruta', flat=True).iterator(chunk_size=2000):
+        yield ruta
+        yield from rutas_derivados(ruta)
+
+
+def directorio_cuarentena():
+    return str(getattr(settings, 'MEDIA_CUARENTENA_ROOT', os.path.join(settings.BASE_DIR, 'media_cuarentena')))
+
+
+def archivos_media(raiz=None):
+
+    # (ruta relativa con /, tamaño, mtime) de cada archivo bajo MEDIA_ROOT
+    raiz = str(raiz or settings.MEDIA_ROOT)
+    cuarentena = os.path.realpath(directorio_cuarentena())
+    pendientes = [raiz]
+    while pendientes:
+        directorio = pendientes.pop()
+        if os.path.realpath(directorio) == cuarentena:
+            continue
+        with os.scandir(directorio) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    pendientes.append(entrada.path)
+                elif entrada.is_file(follow_symlinks=False):
+                    datos = entrada.stat(follow_symlinks=False)
+                    ruta = os.path.relpath(entrada.path, raiz).replace(os.sep, '/')
+                    yield ruta, datos.st_size, datos.st_mtime
+
+
+def archivos_huerfanos(gracia=timedelta(hours=24)):
+
+    # Las referencias se leen antes de recorrer el árbol. El margen por fecha de modificación
+    # cubre un archivo recién guardado cuya fila todavía no se confirma
+    referenciadas = set(rutas_referenciadas())
+    limite = time.time() - gracia.total_seconds()
+    for ruta, tamano, modificado in archivos_media():
+        if ruta not in referenciadas and modificado < limite:
+            yield ruta, tamano
+
+
+def mover_a_cuarentena(ruta, fecha=None):
+
+    destino = os.path.join(directorio_cuarentena(), fecha or timezone.localdate().isoformat(), *ruta.split('/'))
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    shutil.move(default_storage.path(ruta), destino)
+
+
+def recolectar_huerfanos(accion=None, gracia=timedelta(hours=24)):
+
+    # accion: None (solo informa), 'borrar' o 'cuarentena'. Entrega cada huérfano procesado
+    fecha = timezone.localdate().isoformat()
+    for ruta, tamano in archivos_huerfanos(gracia):
+        try:
+            if accion == 'borrar':
+                default_storage.delete(ruta)
+            elif accion == 'cuarentena':
+                mover_a_cuarentena(ruta, fecha)
+        except FileNotFoundError:
+            continue
+        yield ruta, tamano
+
+
+def purgar_cuarentena(dias):
+
+    # La cuarentena se guarda por fecha (AAAA-MM-DD/<ruta original>): se borran las carpetas
+    # con más de `dias` días
+    directorio = directorio_cuarentena()
+    if not os.path.isdir(directorio):
+        return 0, 0
+    limite = (timezone.localdate() - timedelta(days=dias)).isoformat()
+    carpetas = 0
+    liberados = 0
+    with os.scandir(directorio) as entradas:
+        for entrada in entradas:
+            if not entrada.is_dir(follow_symlinks=False) or entrada.name >= limite:
+                continue
+            for raiz, _, archivos in os.walk(entrada.path):
+                liberados += sum(os.path.getsize(os.path.join(raiz, nombre)) for nombre in archivos)
+            shutil.rmtree(entrada.path)
+            carpetas += 1
+    return carpetas, liberados
@@ -8,3 +8,4 @@ class CoreConfig(AppConfig):
     def ready(self):
         
         import core.signals
+        import core.correo
@@ -0,0 +1,131 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+# =============================================================================
+# NORMALIZACIÓN Y STEMMING (ESPAÑOL)
+# =============================================================================
+
+STOPWORDS = frozenset("""
+a al algo con contra cual cuando de del desde donde e el ella ellas ellos en entre era es esa ese eso
+esta este esto estos estas fue ha hay la las le les lo los mas me mi mis muy ni no nos o os para pero
+por que se ser si sin sobre su sus te tiene tu un una uno unos unas y ya
+""".split())
+
+# Sufijos ordenados de más largo a más corto: se elimina el primero que calce
+SUFIJOS = (
+    'amientos', 'imientos', 'aciones', 'uciones', 'amiento', 'imiento', 'adoras', 'adores',
+    'ancias', 'encias', 'mente', 'acion', 'ucion', 'adora', 'ador', 'ancia', 'encia',
+    'itos', 'itas', 'illos', 'illas', 'osos', 'osas', 'ito', 'ita', 'illo', 'illa', 'oso', 'osa',
+    'ces', 'es', 'os', 'as', 's', 'o', 'a', 'e',
+)
+
+LARGO_MINIMO_RAIZ = 3
+
+PESOS_CAMPOS = (
+    ('nombre', 3),
+    ('raza', 2),
+    ('color', 2),
+    ('tipo_animal', 1),
+    ('descripcion', 1),
+)
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalizar(texto):
+
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def raiz(palabra):
+
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LARGO_MINIMO_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def tokenizar(texto):
+
+    return [
+        raiz(token)
+        for token in _TOKEN_RE.findall(normalizar(texto))
+        if token not in STOPWORDS and len(token) >= 2
+    ]
+
+
+def texto_indexable(nombre='', raza='', color='', tipo_animal='', descripcion=''):
+
+    valores = {
+        'nombre': nombre,
+        'raza': raza,
+        'color': color,
+        'tipo_animal': tipo_animal,
+        'descripcion': descripcion,
+    }
+    partes = []
+    for campo, peso in PESOS_CAMPOS:
+        tokens = tokenizar(valores[campo])
+        if tokens:
+            partes.extend([' '.join(tokens)] * peso)
+    return ' '.join(partes)
+
+
+def texto_indexable_mascota(mascota):
+
+    return texto_indexable(
+        nombre=mascota.nombre,
+        raza=mascota.raza.nombre if mascota.raza_id else '',
+        color=mascota.color,
+        tipo_animal=mascota.tipo_animal.nombre if mascota.tipo_animal_id else '',
+        descripcion=mascota.descripcion,
+    )
+
+
+# =============================================================================
+# CONSULTAS
+# =============================================================================
+
+def _usa_fulltext():
+    return connection.vendor == 'mysql'
+
+
+def _consulta_booleana(terminos, prefijo_final):
+
+    partes = [f'+{termino}' for termino in terminos]
+    if prefijo_final:
+        partes[-1] += '*'
+    return ' '.join(partes)
+
+
+def buscar_mascotas(queryset, texto):
+
+    terminos = tokenizar(texto)
+    if not terminos:
+        return queryset.none() if texto.strip() else queryset
+
+    # Mientras el usuario escribe, la última palabra se trata como prefijo
+    prefijo_final = not texto.endswith(' ')
+
+    if _usa_fulltext():
+        consulta = _consulta_booleana(terminos, prefijo_final)
+        relevancia = RawSQL(
+            'MATCH(core_mascota.texto_busqueda) AGAINST (%s IN BOOLEAN MODE)',
+            [consulta]
+        )
+        return queryset.annotate(relevancia=relevancia).filter(relevancia__gt=0).order_by(
+            '-relevancia', '-fecha_ingreso', '-id'
+        )
+
+    filtro = Q()
+    for termino in terminos:
+        filtro &= Q(texto_busqueda__contains=termino)
+    return queryset.filter(filtro).order_by('-fecha_ingreso', '-id')
@@ -0,0 +1,116 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# TAGS DE INVALIDACIÓN
+# =============================================================================
+
+# Cada tag tiene un número de versión en la caché; las claves de respuesta incluyen las
+# versiones de sus tags, así que invalidar es solo incrementar la versión.
+TAG_MASCOTAS = 'mascotas'
+TAG_REFUGIOS = 'refugios'
+TAG_REFERENCIA = 'referencia'
+TAG_CAMPANAS = 'campanas'
+
+
+def _cache():
+    return caches[getattr(settings, 'CACHE_RESPUESTAS_ALIAS', 'default')]
+
+
+def _clave_tag(tag):
+    return f'tag:{tag}'
+
+
+def versiones_tags(tags):
+
+    cache = _cache()
+    claves = [_clave_tag(tag) for tag in tags]
+    versiones = cache.get_many(claves)
+    faltantes = {clave: 1 for clave in claves if clave not in versiones}
+    if faltantes:
+        for clave in faltantes:
+            cache.add(clave, 1, timeout=None)
+        versiones.update(cache.get_many(list(faltantes)))
+    return [versiones.get(clave, 1) for clave in claves]
+
+
+def invalidar_tags(*tags):
+
+    cache = _cache()
+    for tag in tags:
+        clave = _clave_tag(tag)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            # El tag aún no existía: cualquier versión distinta de la inicial sirve
+            cache.set(clave, 2, timeout=None)
+
+
+# =============================================================================
+# CACHÉ DE RESPUESTAS
+# =============================================================================
+
+def clave_respuesta(prefijo, request, tags):
+
+    parametros = sorted(
+        (clave, valor)
+        for clave, valores in request.query_params.lists()
+        for valor in valores
+        if valor != ''
+    )
+    partes = [
+        prefijo,
+        request.scheme,
+        request.get_host(),
+        request.path,
+        repr(parametros),
+        repr(versiones_tags(tags)),
+    ]
+    return 'respuesta:' + hashlib.sha1('|'.join(partes).encode()).hexdigest()
+
+
+class RespuestaCacheadaMixin:
+
+    # Para vistas de solo lectura cuyo contenido es el mismo para cualquier usuario autenticado
+    tags_cache = ()
+    cache_ttl = None
+
+    def _ttl_cache(self):
+        if self.cache_ttl is not None:
+            return self.cache_ttl
+        return getattr(settings, 'CACHE_RESPUESTAS_TTL', 300)
+
+    def _respuesta_cacheada(self, request, generar):
+
+        if not getattr(settings, 'CACHE_RESPUESTAS', True) or request.accepted_renderer.format != 'json':
+            return generar()
+
+        cache = _cache()
+        clave = clave_respuesta(self.basename, request, self.tags_cache)
+        contenido = cache.get(clave)
+        if contenido is not None:
+            respuesta = HttpResponse(contenido, content_type='application/json')
+            respuesta['X-Cache'] = 'HIT'
+            return respuesta
+
+        respuesta = generar()
+        if respuesta.status_code == status.HTTP_200_OK:
+            contenido = JSONRenderer().render(respuesta.data)
+            cache.set(clave, contenido, self._ttl_cache())
+            respuesta['X-Cache'] = 'MISS'
+        return respuesta
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, lambda: super(RespuestaCacheadaMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, lambda: super(RespuestaCacheadaMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,185 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .busqueda import buscar_mascotas
+from .cache_respuestas import TAG_MASCOTAS, TAG_REFERENCIA, versiones_tags
+from .models import Mascota, Raza, TipoAnimal, TipoVacuna, VacunaMascota
+
+
+# =============================================================================
+# FILTROS DEL CATÁLOGO PÚBLICO
+# =============================================================================
+
+# (parámetro, columna, tipo)
+FILTROS_CATALOGO = [
+    ('tipo_animal', 'tipo_animal_id', 'id'),
+    ('raza', 'raza_id', 'id'),
+    ('sexo', 'sexo', 'opcion'),
+    ('edad', 'edad', 'opcion'),
+    ('tamano', 'tamano', 'opcion'),
+    ('nivel_energia', 'nivel_energia', 'opcion'),
+    ('nivel_cuidado', 'nivel_cuidado', 'opcion'),
+    ('esterilizado', 'esterilizado', 'bool'),
+    ('apto_ninos', 'apto_ninos', 'bool'),
+    ('apto_apartamento', 'apto_apartamento', 'bool'),
+    ('sociable_perros', 'sociable_perros', 'bool'),
+    ('sociable_gatos', 'sociable_gatos', 'bool'),
+]
+
+ETIQUETAS_OPCIONES = {
+    'sexo': dict(Mascota.SEXO_CHOICES),
+    'edad': dict(Mascota.EDAD_CHOICES),
+    'tamano': dict(Mascota.TAMANO_CHOICES),
+    'nivel_energia': dict(Mascota.ENERGIA_CHOICES),
+    'nivel_cuidado': dict(Mascota.CUIDADO_CHOICES),
+}
+
+
+def filtros_catalogo(query_params):
+
+    filtros = {}
+    for parametro, columna, tipo in FILTROS_CATALOGO:
+        valor = query_params.get(parametro)
+        if not valor:
+            continue
+        if tipo == 'bool':
+            # Igual que antes: solo "true" filtra, cualquier otro valor se ignora
+            if valor.lower() == 'true':
+                filtros[columna] = True
+        elif tipo == 'id':
+            try:
+                filtros[columna] = int(valor)
+            except ValueError:
+                filtros[columna] = -1
+        else:
+            filtros[columna] = valor
+    return filtros
+
+
+def aplicar_filtros(queryset, filtros):
+
+    if filtros:
+        queryset = queryset.filter(**filtros)
+    return queryset
+
+
+def mascotas_disponibles(query_params):
+
+    queryset = Mascota.objects.filter(estado='DISPONIBLE')
+    busqueda = query_params.get('search')
+    if busqueda:
+        queryset = buscar_mascotas(queryset, busqueda)
+    return queryset
+
+
+def anotar_resumen_vacunas(queryset):
+
+    total_vacunas = VacunaMascota.objects.filter(
+        mascota=OuterRef('pk')
+    ).order_by().values('mascota').annotate(total=Count('id')).values('total')
+
+    # Una obligatoria está pendiente si no tiene aplicación vigente (sin refuerzo o con refuerzo no vencido)
+    aplicacion_vigente = VacunaMascota.objects.filter(
+        mascota=OuterRef(OuterRef('pk')),
+        tipo_vacuna=OuterRef('pk'),
+    ).filter(Q(fecha_proxima__isnull=True) | Q(fecha_proxima__gte=timezone.localdate()))
+    obligatorias_pendientes = TipoVacuna.objects.filter(
+        tipo_animal=OuterRef('tipo_animal'),
+        obligatoria=True,
+        activo=True,
+    ).exclude(Exists(aplicacion_vigente))
+
+    return queryset.annotate(
+        total_vacunas=Coalesce(Subquery(total_vacunas, output_field=IntegerField()), 0),
+        vacunas_obligatorias_al_dia=~Exists(obligatorias_pendientes),
+    )
+
+
+# =============================================================================
+# FACETAS
+# =============================================================================
+
+def clave_facetas(query_params):
+
+    parametros = [p for p, _, _ in FILTROS_CATALOGO] + ['search']
+    partes = [f'{p}={query_params.get(p, "")}' for p in parametros]
+    partes.append(repr(versiones_tags((TAG_MASCOTAS, TAG_REFERENCIA))))
+    return 'catalogo:facetas:' + hashlib.sha1('&'.join(partes).encode()).hexdigest()
+
+
+def calcular_facetas(queryset, filtros):
+
+    columnas = [columna for _, columna, _ in FILTROS_CATALOGO]
+    queryset = queryset.order_by()
+
+    # Solo sirven las filas que fallan a lo más un filtro activo: las que fallan dos o
+    # más no suman en ninguna faceta (cada faceta ignora únicamente su propio filtro)
+    if len(filtros) >= 2:
+        fallos = [
+            Case(When(Q(**{columna: valor}), then=Value(0)), default=Value(1), output_field=IntegerField())
+            for columna, valor in filtros.items()
+        ]
+        queryset = queryset.annotate(
+            fallos_filtros=sum(fallos[1:], fallos[0])
+        ).filter(fallos_filtros__lte=1)
+
+    grupos = list(queryset.values(*columnas).annotate(total=Count('id')))
+
+    total = 0
+    conteos = {columna: {} for columna in columnas}
+    for grupo in grupos:
+        fallidos = [columna for columna, valor in filtros.items() if grupo[columna] != valor]
+        if not fallidos:
+            total += grupo['total']
+        for columna in columnas:
+            # Cada faceta se cuenta con todos los filtros activos excepto el suyo
+            if fallidos and fallidos != [columna]:
+                continue
+            valor = grupo[columna]
+            conteos[columna][valor] = conteos[columna].get(valor, 0) + grupo['total']
+
+    return total, conteos
+
+
+def _formatear_facetas(conteos):
+
+    tipos = TipoAnimal.objects.in_bulk([v for v in conteos['tipo_animal_id'] if v is not None])
+    razas = Raza.objects.in_bulk([v for v in conteos['raza_id'] if v is not None])
+
+    facetas = {}
+    for parametro, columna, tipo in FILTROS_CATALOGO:
+        opciones = []
+        for valor, total in conteos[columna].items():
+            opcion = {'valor': valor, 'total': total}
+            if parametro == 'tipo_animal':
+                opcion['nombre'] = tipos[valor].nombre if valor in tipos else None
+            elif parametro == 'raza':
+                opcion['nombre'] = razas[valor].nombre if valor in razas else None
+            elif tipo == 'opcion':
+                opcion['nombre'] = ETIQUETAS_OPCIONES[parametro].get(valor, valor)
+            opciones.append(opcion)
+        opciones.sort(key=lambda o: -o['total'])
+        facetas[parametro] = opciones
+    return facetas
+
+
+def facetas_catalogo(query_params):
+
+    clave = clave_facetas(query_params)
+    resultado = cache.get(clave)
+    if resultado is not None:
+        return resultado
+
+    filtros = filtros_catalogo(query_params)
+    total, conteos = calcular_facetas(mascotas_disponibles(query_params), filtros)
+    resultado = {
+        'total': total,
+        'facetas': _formatear_facetas(conteos),
+    }
+    cache.set(clave, resultado, getattr(settings, 'CATALOGO_FACETAS_TTL', 60))
+    return resultado
@@ -0,0 +1,76 @@
+import calendar
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+
+from .cache_respuestas import versiones_tags
+
+
+class GetCondicionalMixin:
+
+    # La firma de la respuesta se calcula con un solo aggregate sobre el queryset filtrado
+    # (total de filas + última modificación) y las versiones de los tags de los que depende
+    # la representación. Si el cliente ya la tiene se responde 304 sin serializar nada.
+    campo_ultima_modificacion = None
+    tags_etag = None
+
+    def queryset_etag(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def agregados_etag(self):
+        return {}
+
+    def firma_etag(self):
+
+        queryset = self.queryset_etag()
+        if self.action == 'retrieve':
+            lookup = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup]})
+
+        agregados = {'total': Count('pk')}
+        if self.campo_ultima_modificacion:
+            agregados['ultima_modificacion'] = Max(self.campo_ultima_modificacion)
+        agregados.update(self.agregados_etag())
+        datos = queryset.order_by().aggregate(**agregados)
+
+        tags = self.tags_etag if self.tags_etag is not None else getattr(self, 'tags_cache', ())
+        parametros = sorted(self.request.query_params.lists())
+        partes = [
+            self.basename,
+            str(self.action),
+            str(self.request.user.pk),
+            self.request.path,
+            repr(parametros),
+            repr(sorted(datos.items())),
+            repr(versiones_tags(tags)),
+        ]
+        etag = '"%s"' % hashlib.sha1('|'.join(partes).encode()).hexdigest()
+
+        ultima_modificacion = datos.get('ultima_modificacion')
+        if ultima_modificacion is not None:
+            ultima_modificacion = calendar.timegm(ultima_modificacion.utctimetuple())
+        return etag, ultima_modificacion
+
+    def _respuesta_condicional(self, request, generar):
+
+        etag, ultima_modificacion = self.firma_etag()
+        # Solo se valida con el ETag: la fecha por sí sola no detecta borrados ni cambios en
+        # datos relacionados, así que If-Modified-Since sin If-None-Match no produce 304
+        no_modificado = get_conditional_response(request._request, etag=etag)
+        respuesta = no_modificado if no_modificado is not None else generar()
+
+        if respuesta.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            respuesta['ETag'] = etag
+            if ultima_modificacion is not None:
+                respuesta['Last-Modified'] = http_date(ultima_modificacion)
+            patch_cache_control(respuesta, private=True, no_cache=True)
+        return respuesta
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_condicional(request, lambda: super(GetCondicionalMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_condicional(request, lambda: super(GetCondicionalMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,383 @@
+import logging
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CorreoSaliente
+from .tareas import PRIORIDAD_ALTA, PRIORIDAD_NORMAL, TareaFallida, encolar, registrar_tarea
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# ENTREGA SMTP
+# =============================================================================
+
+# Cada proceso mantiene por servidor SMTP un pool de conexiones abiertas (evita el saludo,
+# TLS y AUTH por mensaje), un límite de mensajes por segundo y contadores de entrega
+
+def proveedor_actual():
+    return f'{settings.EMAIL_HOST}:{settings.EMAIL_PORT}'
+
+
+class LimiteEnvio:
+
+    # Token bucket: hasta `por_segundo` mensajes por segundo con ráfagas de hasta un segundo.
+    # Cada llamada reserva su turno bajo el lock y espera fuera de él
+    def __init__(self, por_segundo):
+        self.por_segundo = por_segundo
+        self.disponibles = float(por_segundo or 0)
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def esperar(self):
+
+        if not self.por_segundo:
+            return
+        with self.lock:
+            ahora = time.monotonic()
+            self.disponibles = min(self.por_segundo, self.disponibles + (ahora - self.ultimo) * self.por_segundo)
+            self.ultimo = ahora
+            self.disponibles -= 1
+            espera = -self.disponibles / self.por_segundo if self.disponibles < 0 else 0
+        if espera:
+            time.sleep(espera)
+
+
+class MetricasEnvio:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entregados = 0
+        self.fallidos = 0
+        self.conexiones = 0
+        self.latencias = deque(maxlen=1000)
+
+    def entregado(self, segundos):
+        with self.lock:
+            self.entregados += 1
+            self.latencias.append(segundos)
+
+    def fallaron(self, cantidad):
+        with self.lock:
+            self.fallidos += cantidad
+
+    def conexion_abierta(self):
+        with self.lock:
+            self.conexiones += 1
+
+    def resumen(self):
+
+        with self.lock:
+            latencias = sorted(self.latencias)
+            datos = {'entregados': self.entregados, 'fallidos': self.fallidos, 'conexiones': self.conexiones}
+        if latencias:
+            datos['latencia_media_ms'] = round(sum(latencias) / len(latencias) * 1000, 1)
+            datos['latencia_p95_ms'] = round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000, 1)
+        return datos
+
+
+class PoolSMTP:
+
+    def __init__(self, tamano, mensajes_por_conexion, inactividad, limite):
+        self.libres = queue.LifoQueue()
+        self.cupos = threading.BoundedSemaphore(tamano)
+        self.mensajes_por_conexion = mensajes_por_conexion
+        self.inactividad = inactividad
+        self.limite = limite
+        self.metricas = MetricasEnvio()
+
+    def _abrir(self):
+        conexion = get_connection(fail_silently=False)
+        conexion.open()
+        conexion.enviados = 0
+        conexion.ultimo_uso = time.monotonic()
+        self.metricas.conexion_abierta()
+        return conexion
+
+    def _tomar(self):
+
+        # Las conexiones inactivas mucho tiempo probablemente ya las cerró el servidor
+        while True:
+            try:
+                conexion = self.libres.get_nowait()
+            except queue.Empty:
+                return self._abrir()
+            if time.monotonic() - conexion.ultimo_uso < self.inactividad:
+                return conexion
+            _cerrar(conexion)
+
+    @contextmanager
+    def conexion(self):
+
+        with self.cupos:
+            conexion = self._tomar()
+            try:
+                yield conexion
+            except Exception:
+                _cerrar(conexion)
+                raise
+            conexion.ultimo_uso = time.monotonic()
+            if conexion.enviados >= self.mensajes_por_conexion:
+                _cerrar(conexion)
+            else:
+                self.libres.put(conexion)
+
+    def enviar(self, conexion, mensaje):
+
+        # send_messages sobre una conexión ya abierta no la cierra. Si el servidor la cortó
+        # (inactividad, límite de mensajes) se reabre y se intenta una vez más
+        self.limite.esperar()
+        inicio = time.monotonic()
+        try:
+            conexion.send_messages([mensaje])
+        except smtplib.SMTPServerDisconnected:
+            conexion.close()
+            conexion.open()
+            conexion.enviados = 0
+            self.metricas.conexion_abierta()
+            conexion.send_messages([mensaje])
+        conexion.enviados += 1
+        self.metricas.entregado(time.monotonic() - inicio)
+
+    def cerrar_todas(self):
+        while True:
+            try:
+                _cerrar(self.libres.get_nowait())
+            except queue.Empty:
+                return
+
+
+def _cerrar(conexion):
+    try:
+        conexion.close()
+    except Exception:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_smtp(proveedor=None):
+
+    proveedor = proveedor or proveedor_actual()
+    with _pools_lock:
+        if proveedor not in _pools:
+            limites = getattr(settings, 'CORREO_LIMITES', {})
+            _pools[proveedor] = PoolSMTP(
+                getattr(settings, 'CORREO_POOL_CONEXIONES', 4),
+                getattr(settings, 'CORREO_MENSAJES_POR_CONEXION', 100),
+                getattr(settings, 'CORREO_CONEXION_INACTIVA_SEGUNDOS', 60),
+                LimiteEnvio(limites.get(settings.EMAIL_HOST, limites.get('*'))),
+            )
+        return _pools[proveedor]
+
+
+def metricas_envio():
+    return {proveedor: pool.metricas.resumen() for proveedor, pool in _pools.items()}
+
+
+def cerrar_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.cerrar_todas()
+        _pools.clear()
+
+
+def enviar_mensajes(mensajes):
+
+    # Envía por lotes de CORREO_LOTE, cada lote por una conexión del pool. Devuelve un error
+    # (o None) por mensaje, en el mismo orden
+    pool = pool_smtp()
+    tamano = getattr(settings, 'CORREO_LOTE', 50)
+    errores = []
+    for inicio in range(0, len(mensajes), tamano):
+        lote = mensajes[inicio:inicio + tamano]
+        try:
+            with pool.conexion() as conexion:
+                for mensaje in lote:
+                    try:
+                        pool.enviar(conexion, mensaje)
+                        errores.append(None)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                        # Rechazo de este mensaje: la conexión sigue sirviendo
+                        errores.append(e)
+                        pool.metricas.fallaron(1)
+        except Exception as e:
+            # Falla de conexión: el resto del lote queda con ese error
+            faltan = inicio + len(lote) - len(errores)
+            errores.extend([e] * faltan)
+            pool.metricas.fallaron(faltan)
+    return errores
+
+
+# =============================================================================
+# BANDEJA DE SALIDA
+# =============================================================================
+
+# Los requests no hablan con el servidor SMTP: guardan el correo en CorreoSaliente y encolan
+# su envío. El worker (manage.py procesar_tareas) lo entrega y la cola de tareas reintenta
+# con espera exponencial si el servidor falla
+
+TAREA_CORREO = 'correo.enviar'
+TAREA_CORREO_LOTE = 'correo.enviar_lote'
+
+# Rechazos que no se arreglan reintentando
+ERRORES_DEFINITIVOS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+
+def encolar_correo(asunto, texto, destinatarios, html='', remitente=None, sensible=False, vence_en=None):
+
+    # El correo y su tarea se guardan juntos: fuera de una transacción (autocommit) un fallo
+    # al encolar dejaría un correo PENDIENTE que nadie envía. Los sensibles (códigos) van
+    # con prioridad alta para no esperar detrás de un envío masivo
+    with transaction.atomic():
+        correo = CorreoSaliente.objects.create(
+            remitente=remitente or settings.DEFAULT_FROM_EMAIL,
+            destinatarios=list(destinatarios),
+            asunto=asunto,
+            texto=texto,
+            html=html,
+            sensible=sensible,
+            vence_en=vence_en,
+        )
+        encolar(TAREA_CORREO, clave=f'correo:{correo.pk}', prioridad=prioridad_correo(correo), correo_id=correo.pk)
+    return correo
+
+
+def prioridad_correo(correo):
+    return PRIORIDAD_ALTA if correo.sensible else PRIORIDAD_NORMAL
+
+
+def mensaje_de(correo):
+    mensaje = EmailMultiAlternatives(correo.asunto, correo.texto, correo.remitente, correo.destinatarios)
+    if correo.html:
+        mensaje.attach_alternative(correo.html, 'text/html')
+    return mensaje
+
+
+def marcar_enviado(correo):
+
+    correo.estado = 'ENVIADO'
+    correo.fecha_envio = timezone.now()
+    correo.error = ''
+    campos = ['estado', 'fecha_envio', 'error']
+    if correo.sensible:
+        correo.texto = correo.html = ''
+        campos += ['texto', 'html']
+    correo.save(update_fields=campos)
+
+
+def marcar_error(correo, error):
+
+    # Devuelve True si el correo ya no se va a reintentar
+    definitivo = isinstance(error, (*ERRORES_DEFINITIVOS, TareaFallida)) or correo.intentos >= getattr(settings, 'CORREO_MAX_INTENTOS', 5)
+    correo.error = f'{type(error).__name__}: {error}'
+    campos = ['error']
+    if definitivo:
+        correo.estado = 'FALLIDO'
+        campos.append('estado')
+        if correo.sensible:
+            correo.texto = correo.html = ''
+            campos += ['texto', 'html']
+    correo.save(update_fields=campos)
+    return definitivo
+
+
+@registrar_tarea(TAREA_CORREO)
+def tarea_enviar_correo(correo_id):
+
+    correo = CorreoSaliente.objects.filter(pk=correo_id, estado='PENDIENTE').first()
+    if correo is None:
+        # Ya enviado (tarea repetida tras caerse el worker) o borrado
+        return
+    if correo.vence_en and correo.vence_en <= timezone.now():
+        # Un código 2FA vencido no le sirve a nadie: no se envía ni se reintenta
+        marcar_error(correo, TareaFallida('Vencido antes de enviarse'))
+        raise TareaFallida(f'Correo {correo.pk} vencido antes de enviarse')
+    CorreoSaliente.objects.filter(pk=correo.pk).update(intentos=F('intentos') + 1)
+    correo.intentos += 1
+    error, = enviar_mensajes([mensaje_de(correo)])
+    if error is not None:
+        if marcar_error(correo, error):
+            raise TareaFallida(f'Correo {correo.pk} no enviado: {error}') from error
+        raise error
+    marcar_enviado(correo)
+
+
+def encolar_correos(correos, remitente=None):
+
+    # Envío masivo: correos es una lista de dicts con asunto, texto, destinatarios y html
+    # opcional. Se guardan con bulk_create y se encola una tarea por cada CORREO_LOTE
+    tamano = getattr(settings, 'CORREO_LOTE', 50)
+    lotes = []
+    for inicio in range(0, len(correos), tamano):
+        lote = str(uuid.uuid4())
+        with transaction.atomic():
+            CorreoSaliente.objects.bulk_create([
+                CorreoSaliente(
+                    remitente=remitente or settings.DEFAULT_FROM_EMAIL,
+                    destinatarios=list(correo['destinatarios']),
+                    asunto=correo['asunto'],
+                    texto=correo['texto'],
+                    html=correo.get('html', ''),
+                    lote=lote,
+                )
+                for correo in correos[inicio:inicio + tamano]
+            ])
+            encolar(TAREA_CORREO_LOTE, clave=f'correo-lote:{lote}', lote=lote)
+        lotes.append(lote)
+    return lotes
+
+
+@registrar_tarea(TAREA_CORREO_LOTE)
+def tarea_enviar_lote(lote):
+
+    # Solo los pendientes: al reintentar el lote no se repiten los ya enviados
+    correos = list(CorreoSaliente.objects.filter(lote=lote, estado='PENDIENTE').order_by('pk'))
+    if not correos:
+        return
+    CorreoSaliente.objects.filter(pk__in=[correo.pk for correo in correos]).update(intentos=F('intentos') + 1)
+    pendientes = 0
+    for correo, error in zip(correos, enviar_mensajes([mensaje_de(correo) for correo in correos])):
+        correo.intentos += 1
+        if error is None:
+            marcar_enviado(correo)
+        elif not marcar_error(correo, error):
+            pendientes += 1
+    if pendientes:
+        raise RuntimeError(f'Lote {lote}: {pendientes} correos se reintentarán')
+
+
+def reintentar_correo(correo):
+
+    CorreoSaliente.objects.filter(pk=correo.pk).update(estado='PENDIENTE', intentos=0, error='')
+    if correo.lote:
+        encolar(TAREA_CORREO_LOTE, clave=f'correo-lote:{correo.lote}', lote=correo.lote)
+    else:
+        encolar(TAREA_CORREO, clave=f'correo:{correo.pk}', prioridad=prioridad_correo(correo), correo_id=correo.pk)
+
+
+def purgar_correos():
+
+    # Los enviados solo sirven de historial; los fallidos se guardan más tiempo para revisarlos
+    ahora = timezone.now()
+    enviados = getattr(settings, 'CORREO_RETENCION_DIAS', 7)
+    fallidos = getattr(settings, 'TAREAS_RETENCION_FALLIDAS_DIAS', 30)
+    borrados, _ = CorreoSaliente.objects.filter(
+        Q(estado='ENVIADO', fecha_envio__lt=ahora - timedelta(days=enviados))
+        | Q(estado='FALLIDO', fecha_creacion__lt=ahora - timedelta(days=fallidos))
+    ).delete()
+    return borrados
@@ -0,0 +1,212 @@
+import hashlib
+import mimetypes
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header
+from rest_framework.exceptions import NotFound, PermissionDenied
+
+from .models import Adopcion, Documento, Refugio, almacenamiento_protegido
+
+
+# =============================================================================
+# ARCHIVOS PROTEGIDOS
+# =============================================================================
+
+# tipo (segmento de la URL) -> (modelo, campo del archivo, campo con el nombre para el
+# usuario, filtro de permiso). El filtro recibe el id del usuario y se aplica en la misma
+# consulta que lee la ruta del archivo: no se cargan el objeto ni sus relaciones
+ARCHIVOS_PROTEGIDOS = {
+    'documentos': (
+        Documento, 'archivo', 'nombre',
+        lambda usuario_id: Q(refugio_id=usuario_id),
+    ),
+    'contratos': (
+        Adopcion, 'documento_contrato', None,
+        lambda usuario_id: Q(solicitud__mascota__refugio_id=usuario_id) | Q(solicitud__adoptante_id=usuario_id),
+    ),
+    'verificaciones': (
+        Refugio, 'documento_verificacion', 'nombre',
+        lambda usuario_id: Q(pk=usuario_id),
+    ),
+}
+
+SAL_FIRMA = 'core.descargas'
+TAMANO_LECTURA = 64 * 1024
+RANGO_BYTES = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def firmar_descarga(tipo, pk, usuario):
+
+    # La URL firmada permite abrir el archivo en una pestaña nueva, donde el navegador no
+    # envía el token JWT
+    return signing.dumps([tipo, str(pk), usuario.pk, usuario.is_staff], salt=SAL_FIRMA)
+
+
+def leer_firma(firma):
+
+    segundos = getattr(settings, 'DESCARGAS_FIRMA_SEGUNDOS', 300)
+    try:
+        tipo, pk, usuario_id, es_staff = signing.loads(firma, salt=SAL_FIRMA, max_age=segundos)
+    except signing.SignatureExpired:
+        raise PermissionDenied("El enlace de descarga expiró.")
+    except (signing.BadSignature, ValueError):
+        raise PermissionDenied("Enlace de descarga inválido.")
+    return tipo, pk, usuario_id, es_staff
+
+
+def url_descarga(request, tipo, pk):
+
+    url = reverse('archivo-detail', kwargs={'tipo': tipo, 'pk': pk})
+    url = f'{url}?firma={firmar_descarga(tipo, pk, request.user)}'
+    return request.build_absolute_uri(url)
+
+
+def resolver_archivo(tipo, pk, usuario_id, es_staff=False):
+
+    if tipo not in ARCHIVOS_PROTEGIDOS:
+        raise NotFound()
+    modelo, campo, campo_nombre, permiso = ARCHIVOS_PROTEGIDOS[tipo]
+
+    campos = (campo, campo_nombre) if campo_nombre else (campo,)
+    try:
+        filas = modelo.objects.filter(pk=pk)
+        if not es_staff:
+            filas = filas.filter(permiso(usuario_id))
+        fila = filas.values_list(*campos).first()
+    except (ValueError, TypeError):
+        fila = None
+    if not fila or not fila[0]:
+        raise NotFound("Archivo no encontrado.")
+
+    nombre = fila[0]
+    extension = posixpath.splitext(nombre)[1]
+    descarga = f'{fila[1]}{extension}' if campo_nombre else f'{tipo}-{pk}{extension}'
+    return nombre, descarga
+
+
+# =============================================================================
+# RESPUESTA CON RANGOS
+# =============================================================================
+
+def etag_archivo(nombre):
+
+    # El archivo se hashea una vez y se guarda el resultado mientras no cambien el tamaño ni la fecha
+    storage = almacenamiento_protegido()
+    clave = 'etag-archivo:%s' % hashlib.sha1(
+        f'{nombre}|{storage.size(nombre)}|{storage.get_modified_time(nombre).timestamp()}'.encode()
+    ).hexdigest()
+    digest = cache.get(clave)
+    if digest is None:
+        sha = hashlib.sha256()
+        with storage.open(nombre, 'rb') as archivo:
+            for bloque in iter(lambda: archivo.read(TAMANO_LECTURA), b''):
+                sha.update(bloque)
+        digest = sha.hexdigest()
+        cache.set(clave, digest, None)
+    return '"%s"' % digest
+
+
+def parsear_range(cabecera, tamano):
+
+    # Un solo rango: bytes=a-b, bytes=a- o bytes=-n. Con varios rangos (o un formato que no
+    # se entiende) se responde el archivo completo, como permite la RFC 9110.
+    # Devuelve (inicio, fin) inclusivo, None para el archivo completo o False si no se puede cumplir
+    coincidencia = RANGO_BYTES.match((cabecera or '').strip())
+    if not coincidencia or coincidencia.groups() == ('', ''):
+        return None
+
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        sufijo = int(fin)
+        if sufijo == 0:
+            return False
+        return max(tamano - sufijo, 0), tamano - 1
+
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, fin
+
+
+def _leer_rango(nombre, inicio, longitud):
+
+    with almacenamiento_protegido().open(nombre, 'rb') as archivo:
+        archivo.seek(inicio)
+        while longitud > 0:
+            bloque = archivo.read(min(TAMANO_LECTURA, longitud))
+            if not bloque:
+                break
+            longitud -= len(bloque)
+            yield bloque
+
+
+def respuesta_archivo(request, nombre, nombre_descarga):
+
+    if not almacenamiento_protegido().exists(nombre):
+        raise NotFound("Archivo no encontrado.")
+
+    etag = etag_archivo(nombre)
+    respuesta = get_conditional_response(request, etag=etag)
+    if respuesta is None:
+        respuesta = _respuesta_contenido(request, nombre, etag)
+
+    respuesta['ETag'] = etag
+    respuesta['Content-Disposition'] = content_disposition_header(False, nombre_descarga)
+    respuesta['X-Content-Type-Options'] = 'nosniff'
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+
+def _respuesta_contenido(request, nombre, etag):
+
+    storage = almacenamiento_protegido()
+    tipo_contenido = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+
+    # Con un proxy delante (nginx / Apache) Django solo autoriza: el proxy envía el archivo
+    # y atiende él mismo los Range
+    offload = getattr(settings, 'DESCARGAS_OFFLOAD', '')
+    if offload == 'X-Accel-Redirect':
+        respuesta = HttpResponse(content_type=tipo_contenido)
+        prefijo = getattr(settings, 'DESCARGAS_PREFIJO_INTERNO', '/media-protegida/')
+        respuesta['X-Accel-Redirect'] = prefijo + quote(nombre)
+        return respuesta
+    if offload == 'X-Sendfile':
+        respuesta = HttpResponse(content_type=tipo_contenido)
+        respuesta['X-Sendfile'] = storage.path(nombre)
+        return respuesta
+
+    tamano = storage.size(nombre)
+    rango = None
+    if request.method in ('GET', 'HEAD') and 'HTTP_RANGE' in request.META:
+        # If-Range: el rango solo vale si el cliente tiene la misma versión del archivo
+        si_rango = request.META.get('HTTP_IF_RANGE')
+        if not si_rango or si_rango == etag:
+            rango = parsear_range(request.META['HTTP_RANGE'], tamano)
+
+    if rango is False:
+        respuesta = HttpResponse(status=416)
+        respuesta['Content-Range'] = f'bytes */{tamano}'
+        return respuesta
+
+    inicio, fin = rango or (0, tamano - 1)
+    longitud = max(fin - inicio + 1, 0)
+    respuesta = StreamingHttpResponse(
+        _leer_rango(nombre, inicio, longitud) if request.method != 'HEAD' else iter(()),
+        status=206 if rango else 200,
+        content_type=tipo_contenido,
+    )
+    respuesta['Content-Length'] = str(longitud)
+    respuesta['Accept-Ranges'] = 'bytes'
+    if rango:
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+    return respuesta
@@ -0,0 +1,239 @@
+import csv
+import logging
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.db.models import F, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+
+from .busqueda import normalizar
+from .models import Refugio
+
+logger = logging.getLogger(__name__)
+
+RADIO_TIERRA_KM = 6371.0
+RADIO_KM_POR_DEFECTO = 20
+RADIO_KM_MAXIMO = 500
+
+ARCHIVO_COMUNAS = Path(__file__).resolve().parent / 'datos' / 'comunas_chile.csv'
+
+
+# =============================================================================
+# GEOHASH
+# =============================================================================
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION_GEOHASH = 9
+
+
+def codificar_geohash(latitud, longitud, precision=PRECISION_GEOHASH):
+
+    rango_lat = [-90.0, 90.0]
+    rango_lng = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    cantidad_bits = 0
+    es_longitud = True
+    while len(geohash) < precision:
+        rango, valor = (rango_lng, longitud) if es_longitud else (rango_lat, latitud)
+        medio = (rango[0] + rango[1]) / 2
+        bits <<= 1
+        if valor >= medio:
+            bits |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        es_longitud = not es_longitud
+        cantidad_bits += 1
+        if cantidad_bits == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            cantidad_bits = 0
+    return ''.join(geohash)
+
+
+def tamano_celda_grados(precision):
+
+    bits = 5 * precision
+    bits_lng = (bits + 1) // 2
+    bits_lat = bits // 2
+    return 180.0 / (1 << bits_lat), 360.0 / (1 << bits_lng)
+
+
+def precision_para_radio(latitud, radio_km):
+
+    # La celda más fina cuyo alto y ancho cubren el radio: así el círculo queda
+    # contenido en la celda central y sus 8 vecinas
+    for precision in range(PRECISION_GEOHASH, 0, -1):
+        alto, ancho = tamano_celda_grados(precision)
+        alto_km = alto * 111.32
+        ancho_km = ancho * 111.32 * math.cos(math.radians(latitud))
+        if alto_km >= radio_km and ancho_km >= radio_km:
+            return precision
+    return 1
+
+
+def celdas_cobertura(latitud, longitud, radio_km):
+
+    precision = precision_para_radio(latitud, radio_km)
+    alto, ancho = tamano_celda_grados(precision)
+    celdas = set()
+    for d_lat in (-alto, 0, alto):
+        for d_lng in (-ancho, 0, ancho):
+            lat = max(min(latitud + d_lat, 89.999999), -89.999999)
+            lng = (longitud + d_lng + 180) % 360 - 180
+            celdas.add(codificar_geohash(lat, lng, precision))
+    return sorted(celdas)
+
+
+# =============================================================================
+# DISTANCIAS
+# =============================================================================
+
+def haversine_km(lat1, lng1, lat2, lng2):
+
+    d_lat = math.radians(lat2 - lat1)
+    d_lng = math.radians(lng2 - lng1)
+    a = (
+        math.sin(d_lat / 2) ** 2
+        + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lng / 2) ** 2
+    )
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+def distancia_sql(latitud, longitud, prefijo=''):
+
+    lat = Radians(F(f'{prefijo}latitud'))
+    lng = Radians(F(f'{prefijo}longitud'))
+    lat0 = math.radians(latitud)
+    lng0 = math.radians(longitud)
+    a = Power(Sin((lat - lat0) / 2), 2) + math.cos(lat0) * Cos(lat) * Power(Sin((lng - lng0) / 2), 2)
+    return 2 * RADIO_TIERRA_KM * ASin(Sqrt(a))
+
+
+def parsear_cercania(query_params):
+
+    cerca_de = query_params.get('cerca_de')
+    if not cerca_de:
+        return None
+    try:
+        latitud, longitud = (float(parte) for parte in cerca_de.split(','))
+    except ValueError:
+        raise ValidationError({'cerca_de': 'Formato esperado: cerca_de=latitud,longitud'})
+    if not (-90 <= latitud <= 90 and -180 <= longitud <= 180):
+        raise ValidationError({'cerca_de': 'Coordenadas fuera de rango'})
+
+    try:
+        radio_km = float(query_params.get('radio_km', RADIO_KM_POR_DEFECTO))
+    except ValueError:
+        raise ValidationError({'radio_km': 'Debe ser un número'})
+    if not 0 < radio_km <= RADIO_KM_MAXIMO:
+        raise ValidationError({'radio_km': f'Debe estar entre 0 y {RADIO_KM_MAXIMO} km'})
+    return latitud, longitud, radio_km
+
+
+def refugios_cercanos(latitud, longitud, radio_km):
+
+    filtro = Q()
+    for celda in celdas_cobertura(latitud, longitud, radio_km):
+        filtro |= Q(geohash__startswith=celda)
+    candidatos = Refugio.objects.filter(filtro).values_list('pk', 'latitud', 'longitud')
+    return [
+        refugio_id for refugio_id, lat, lng in candidatos
+        if haversine_km(latitud, longitud, lat, lng) <= radio_km
+    ]
+
+
+def filtrar_por_cercania(queryset, latitud, longitud, radio_km, campo_refugio=None, desempate=('-pk',)):
+
+    # El índice de geohash acota los refugios candidatos; la distancia exacta y el orden
+    # se resuelven en SQL solo sobre ese conjunto
+    ids = refugios_cercanos(latitud, longitud, radio_km)
+    if campo_refugio:
+        filtro = {f'{campo_refugio}_id__in': ids}
+        prefijo = f'{campo_refugio}__'
+    else:
+        filtro = {'pk__in': ids}
+        prefijo = ''
+    return queryset.filter(**filtro).annotate(
+        distancia_km=distancia_sql(latitud, longitud, prefijo)
+    ).order_by('distancia_km', *desempate)
+
+
+# =============================================================================
+# GEOCODIFICACIÓN (TABLA DE COMUNAS)
+# =============================================================================
+
+# Capital regional usada cuando solo se reconoce la región
+REGIONES = {
+    'arica': 'Arica',
+    'tarapaca': 'Iquique',
+    'antofagasta': 'Antofagasta',
+    'atacama': 'Copiapó',
+    'coquimbo': 'La Serena',
+    'valparaiso': 'Valparaíso',
+    'metropolitana': 'Santiago',
+    'santiago': 'Santiago',
+    'higgins': 'Rancagua',
+    'libertador': 'Rancagua',
+    'maule': 'Talca',
+    'nuble': 'Chillán',
+    'biobio': 'Concepción',
+    'bio bio': 'Concepción',
+    'araucania': 'Temuco',
+    'los rios': 'Valdivia',
+    'los lagos': 'Puerto Montt',
+    'aysen': 'Coyhaique',
+    'aisen': 'Coyhaique',
+    'magallanes': 'Punta Arenas',
+}
+
+
+def _clave(texto):
+    return re.sub(r'[^a-z0-9]+', ' ', normalizar(texto)).strip()
+
+
+@lru_cache(maxsize=1)
+def tabla_comunas():
+
+    with open(ARCHIVO_COMUNAS, encoding='utf-8') as archivo:
+        return {
+            _clave(fila['comuna']): (float(fila['latitud']), float(fila['longitud']))
+            for fila in csv.DictReader(archivo)
+        }
+
+
+def geocodificar(ciudad='', region='', direccion=''):
+
+    comunas = tabla_comunas()
+
+    coordenadas = comunas.get(_clave(ciudad))
+    if coordenadas:
+        return coordenadas
+
+    # La comuna suele venir al final de la dirección ("Av. Grecia 123, Ñuñoa")
+    texto = f' {_clave(direccion)} '
+    coincidencias = [nombre for nombre in comunas if f' {nombre} ' in texto]
+    if coincidencias:
+        return comunas[max(coincidencias, key=len)]
+
+    texto = _clave(region)
+    for clave, capital in REGIONES.items():
+        if clave in texto:
+            return comunas[_clave(capital)]
+
+    logger.info("No se pudo geocodificar la ubicación: %s, %s", ciudad, region)
+    return None
+
+
+def clave_region(region):
+
+    # "Región Metropolitana" y "Santiago" deben comparar iguales
+    texto = _clave(region)
+    for clave, capital in REGIONES.items():
+        if clave in texto:
+            return _clave(capital)
+    return texto
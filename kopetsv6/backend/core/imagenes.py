@@ -0,0 +1,279 @@
+import base64
+import logging
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cache_respuestas import invalidar_tags
+from .models import Campana, EventoVoluntariado, FotoVisita, Mascota, Refugio, Tarea, Tip
+from .tareas import TareaFallida, registrar_tarea
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# DERIVADOS DE IMÁGENES SUBIDAS
+# =============================================================================
+
+# Lado mayor en píxeles; nunca se amplía una imagen más chica que el tamaño pedido.
+# De mayor a menor: cada tamaño se reduce a partir del anterior
+TAMANOS_DERIVADOS = (
+    ('full', 1280),
+    ('card', 480),
+    ('thumb', 160),
+)
+FORMATOS_DERIVADOS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+CARPETA_DERIVADOS = 'derivados'
+
+CAMPOS_IMAGEN = {
+    Mascota: ('foto_principal', 'foto_2', 'foto_3'),
+    Refugio: ('logo', 'portada'),
+    FotoVisita: ('imagen',),
+    Campana: ('imagen',),
+    Tip: ('imagen',),
+    EventoVoluntariado: ('imagen',),
+    get_user_model(): ('foto_perfil',),
+}
+
+
+def ruta_derivado(nombre_original, tamano, formato):
+
+    # La ruta sale del nombre del original: los serializers arman las URLs sin consultar nada
+    base, _ = posixpath.splitext(nombre_original)
+    return f'{CARPETA_DERIVADOS}/{base}_{tamano}.{formato}'
+
+
+def rutas_derivados(nombre_original):
+    return [
+        ruta_derivado(nombre_original, tamano, formato)
+        for tamano, _ in TAMANOS_DERIVADOS
+        for formato in FORMATOS_DERIVADOS
+    ]
+
+
+def _abrir(archivo, lado=TAMANOS_DERIVADOS[0][1]):
+
+    imagen = Image.open(archivo)
+    if imagen.format == 'JPEG':
+        # Decodifica directamente a una escala reducida (1/2, 1/4, 1/8) cuando alcanza para el
+        # tamaño pedido: evita expandir en memoria los 12+ MP de una foto de celular
+        imagen.draft('RGB', (lado, lado))
+    # Aplica la orientación de la cámara antes de descartar los metadatos EXIF
+    imagen = ImageOps.exif_transpose(imagen)
+
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        imagen = imagen.convert('RGBA')
+    elif imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+    return imagen
+
+
+def _sobre_blanco(imagen):
+
+    if imagen.mode != 'RGBA':
+        return imagen
+    fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+    fondo.paste(imagen, mask=imagen.getchannel('A'))
+    return fondo
+
+
+def _codificar(imagen, formato):
+
+    opciones = dict(FORMATOS_DERIVADOS[formato])
+    if opciones['format'] == 'JPEG':
+        imagen = _sobre_blanco(imagen)
+    salida = BytesIO()
+    # Sin exif= ni icc_profile= Pillow no copia metadatos del original
+    imagen.save(salida, **opciones)
+    return salida.getvalue()
+
+
+def generar_derivados(archivo):
+
+    nombre = archivo.name
+    archivo.open('rb')
+    try:
+        imagen = _abrir(archivo)
+        imagen.load()
+    finally:
+        archivo.close()
+
+    generados = []
+    for tamano, lado in TAMANOS_DERIVADOS:
+        if max(imagen.size) > lado:
+            imagen = imagen.copy()
+            imagen.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        for formato in FORMATOS_DERIVADOS:
+            ruta = ruta_derivado(nombre, tamano, formato)
+            # Misma ruta al regenerar: el storage agregaría un sufijo si el archivo existe
+            default_storage.delete(ruta)
+            generados.append(default_storage.save(ruta, ContentFile(_codificar(imagen, formato))))
+    return generados
+
+
+def eliminar_derivados(nombre_original):
+
+    for ruta in rutas_derivados(nombre_original):
+        default_storage.delete(ruta)
+
+
+def tiene_derivados(nombre_original):
+    return all(default_storage.exists(ruta) for ruta in rutas_derivados(nombre_original))
+
+
+# =============================================================================
+# PLACEHOLDERS (LQIP Y COLOR DOMINANTE)
+# =============================================================================
+
+# Fotos con placeholder: el catálogo pinta la versión borrosa / el color mientras carga la foto
+CAMPOS_PLACEHOLDER = {
+    Mascota: ('foto_principal', 'foto_2', 'foto_3'),
+}
+LADO_LQIP = 16
+LADO_MUESTRA_COLOR = 64
+
+
+def calcular_placeholder(archivo):
+
+    # {'lqip': data URI WebP de 16 px (~200 bytes), 'color': '#rrggbb'}
+    archivo.open('rb')
+    try:
+        imagen = _abrir(archivo, lado=LADO_MUESTRA_COLOR)
+        imagen.load()
+    finally:
+        archivo.close()
+
+    muestra = _sobre_blanco(imagen).convert('RGB')
+    muestra.thumbnail((LADO_MUESTRA_COLOR, LADO_MUESTRA_COLOR), Image.Resampling.BOX)
+
+    # Color dominante: el más frecuente tras reducir la muestra a 5 colores (el promedio
+    # de una foto suele dar un gris barroso)
+    paleta = muestra.quantize(colors=5, method=Image.Quantize.MEDIANCUT)
+    _, indice = max(paleta.getcolors())
+    r, g, b = paleta.getpalette()[indice * 3:indice * 3 + 3]
+
+    lqip = muestra.copy()
+    lqip.thumbnail((LADO_LQIP, LADO_LQIP), Image.Resampling.LANCZOS)
+    salida = BytesIO()
+    lqip.save(salida, format='WEBP', quality=40)
+    return {
+        'lqip': 'data:image/webp;base64,' + base64.b64encode(salida.getvalue()).decode('ascii'),
+        'color': f'#{r:02x}{g:02x}{b:02x}',
+    }
+
+
+def placeholder_vigente(instancia, campo):
+
+    # Solo si se calculó para la foto actual: tras reemplazarla queda None hasta que el worker
+    # calcule el nuevo
+    archivo = getattr(instancia, campo)
+    datos = (instancia.placeholders or {}).get(campo)
+    if not archivo or not datos or datos.get('nombre') != archivo.name:
+        return None
+    return {'lqip': datos['lqip'], 'color': datos['color']}
+
+
+def guardar_placeholder(modelo, pk, campo, nombre, placeholder):
+
+    # Bloquea la fila: las tareas de foto_principal / foto_2 / foto_3 pueden correr a la vez
+    with transaction.atomic():
+        instancia = modelo.objects.select_for_update().filter(pk=pk, **{campo: nombre}).only('pk', 'placeholders').first()
+        if instancia is None:
+            return False
+        placeholders = dict(instancia.placeholders or {})
+        placeholders[campo] = {'nombre': nombre, **placeholder}
+        modelo.objects.filter(pk=pk).update(placeholders=placeholders)
+    return True
+
+
+# =============================================================================
+# PROCESAMIENTO EN SEGUNDO PLANO
+# =============================================================================
+
+TAREA_DERIVADOS = 'imagenes.derivados'
+TAREA_PLACEHOLDER = 'imagenes.placeholder'
+
+
+@registrar_tarea(TAREA_DERIVADOS)
+def tarea_derivados(modelo, pk, campo, nombre, tags=()):
+
+    modelo = apps.get_model(modelo)
+    if not modelo.objects.filter(pk=pk, **{campo: nombre}).exists():
+        # La imagen se reemplazó o el objeto se borró antes de procesarla
+        return
+
+    field = modelo._meta.get_field(campo)
+    try:
+        generar_derivados(field.attr_class(None, field, nombre))
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise TareaFallida(f'{nombre} no es una imagen válida: {e}') from e
+
+    # La representación cambia de "procesando" a la lista de derivados
+    _marcar_modificado(modelo, pk, tags)
+
+
+@registrar_tarea(TAREA_PLACEHOLDER)
+def tarea_placeholder(modelo, pk, campo, nombre, tags=()):
+
+    modelo = apps.get_model(modelo)
+    field = modelo._meta.get_field(campo)
+    try:
+        placeholder = calcular_placeholder(field.attr_class(None, field, nombre))
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise TareaFallida(f'{nombre} no es una imagen válida: {e}') from e
+    except FileNotFoundError:
+        # La foto se reemplazó y su archivo ya se borró
+        return
+
+    if guardar_placeholder(modelo, pk, campo, nombre, placeholder):
+        _marcar_modificado(modelo, pk, tags)
+
+
+def _marcar_modificado(modelo, pk, tags):
+
+    # Se actualiza la fecha de modificación (ETag / Last-Modified) y se invalidan las
+    # respuestas cacheadas
+    campos_fecha = [f.name for f in modelo._meta.concrete_fields if getattr(f, 'auto_now', False)]
+    if campos_fecha:
+        ahora = timezone.now()
+        modelo.objects.filter(pk=pk).update(**{campo_fecha: ahora for campo_fecha in campos_fecha})
+    if tags:
+        invalidar_tags(*tags)
+
+
+def estados_imagenes():
+
+    # Solo las imágenes con tareas sin completar: es un conjunto chico sin importar cuántas
+    # imágenes tenga el sitio, y basta una consulta por respuesta
+    return {
+        clave: 'error' if estado == 'FALLIDA' else 'procesando'
+        for clave, estado in Tarea.objects.filter(
+            tipo=TAREA_DERIVADOS, estado__in=('PENDIENTE', 'EN_PROCESO', 'FALLIDA')
+        ).values_list('clave', 'estado')
+    }
+
+
+def srcset(nombre_original, request=None):
+
+    # {'thumb': {'webp': url, 'jpeg': url, 'ancho': 160}, 'card': {...}, 'full': {...}}
+    def url(ruta):
+        direccion = default_storage.url(ruta)
+        return request.build_absolute_uri(direccion) if request else direccion
+
+    return {
+        tamano: {
+            'ancho': lado,
+            **{formato: url(ruta_derivado(nombre_original, tamano, formato)) for formato in FORMATOS_DERIVADOS},
+        }
+        for tamano, lado in TAMANOS_DERIVADOS
+    }
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .catalogo import FILTROS_CATALOGO, filtros_catalogo
+from .models import Mascota
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# ÍNDICE BITMAP DEL CATÁLOGO (POR PROCESO)
+# =============================================================================
+
+# Cada posición ("slot") es una mascota disponible, ordenadas por (fecha_ingreso, id)
+# ascendente; los bitsets son enteros de Python donde el bit i corresponde al slot i.
+COLUMNAS_INDICE = [columna for _, columna, _ in FILTROS_CATALOGO]
+
+PARAMETROS_PRESENTACION = {'page', 'page_size', 'format', 'fields', 'vista'}
+
+
+class IndiceBitmap:
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._construido_en = None
+        self._desordenado = False
+        self.slots = []
+        self.posiciones = {}
+        self.claves = []
+        self.vivos = 0
+        self.bitsets = {}
+        self.valores = {}
+
+    def _vigente(self):
+        return (
+            self._construido_en is not None
+            and not self._desordenado
+            and time.monotonic() - self._construido_en < self.ttl
+        )
+
+    def construir(self):
+
+        filas = Mascota.objects.filter(estado='DISPONIBLE').order_by(
+            'fecha_ingreso', 'id'
+        ).values_list('id', 'fecha_ingreso', *COLUMNAS_INDICE)
+
+        slots, claves, valores = [], [], {}
+        bitsets = {columna: {} for columna in COLUMNAS_INDICE}
+        for slot, (mascota_id, fecha_ingreso, *atributos) in enumerate(filas.iterator(chunk_size=2000)):
+            slots.append(mascota_id)
+            claves.append((fecha_ingreso, mascota_id))
+            valores[mascota_id] = tuple(atributos)
+            bit = 1 << slot
+            for columna, valor in zip(COLUMNAS_INDICE, atributos):
+                bitsets[columna][valor] = bitsets[columna].get(valor, 0) | bit
+
+        with self._lock:
+            self.slots = slots
+            self.claves = claves
+            self.posiciones = {mascota_id: slot for slot, mascota_id in enumerate(slots)}
+            self.valores = valores
+            self.bitsets = bitsets
+            self.vivos = (1 << len(slots)) - 1
+            self._desordenado = False
+            self._construido_en = time.monotonic()
+
+        logger.debug("Índice bitmap reconstruido con %s mascotas", len(slots))
+
+    def asegurar(self):
+
+        if not self._vigente():
+            self.construir()
+
+    def invalidar(self):
+
+        with self._lock:
+            self._construido_en = None
+
+    def _quitar_slot(self, slot, atributos):
+
+        mascara = ~(1 << slot)
+        self.vivos &= mascara
+        for columna, valor in zip(COLUMNAS_INDICE, atributos):
+            self.bitsets[columna][valor] &= mascara
+
+    def _poner_slot(self, slot, atributos):
+
+        bit = 1 << slot
+        self.vivos |= bit
+        for columna, valor in zip(COLUMNAS_INDICE, atributos):
+            self.bitsets[columna][valor] = self.bitsets[columna].get(valor, 0) | bit
+
+    def actualizar(self, mascota):
+
+        if self._construido_en is None:
+            return
+
+        atributos = tuple(getattr(mascota, columna) for columna in COLUMNAS_INDICE)
+        clave = (mascota.fecha_ingreso, mascota.id)
+
+        with self._lock:
+            slot = self.posiciones.get(mascota.id)
+            if slot is not None and mascota.id in self.valores:
+                self._quitar_slot(slot, self.valores.pop(mascota.id))
+
+            if mascota.estado != 'DISPONIBLE':
+                return
+
+            if slot is None:
+                if self.claves and clave < self.claves[-1]:
+                    # No cabe al final: se reconstruye en la próxima consulta
+                    self._desordenado = True
+                    return
+                slot = len(self.slots)
+                self.slots.append(mascota.id)
+                self.claves.append(clave)
+                self.posiciones[mascota.id] = slot
+            elif self.claves[slot] != clave:
+                self._desordenado = True
+                return
+
+            self.valores[mascota.id] = atributos
+            self._poner_slot(slot, atributos)
+
+    def quitar(self, mascota_id):
+
+        if self._construido_en is None:
+            return
+
+        with self._lock:
+            slot = self.posiciones.get(mascota_id)
+            if slot is not None and mascota_id in self.valores:
+                self._quitar_slot(slot, self.valores.pop(mascota_id))
+
+    def resolver(self, filtros):
+
+        self.asegurar()
+        with self._lock:
+            resultado = self.vivos
+            for columna, valor in filtros.items():
+                resultado &= self.bitsets[columna].get(valor, 0)
+            slots = self.slots
+        return ResultadoBitmap(resultado, slots, self)
+
+
+class ResultadoBitmap:
+
+    # Se comporta como una secuencia para django.core.paginator.Paginator: count() y slicing
+
+    def __init__(self, bitset, slots, indice=None):
+        self.bitset = bitset
+        self.slots = slots
+        self.indice = indice
+        self.queryset = None
+
+    def count(self):
+        return self.bitset.bit_count()
+
+    def __len__(self):
+        return self.count()
+
+    def ids(self, inicio=0, fin=None):
+
+        # Los bits altos son las mascotas más recientes; bin() los deja al principio
+        binario = bin(self.bitset)[2:]
+        largo = len(binario)
+        ids = []
+        posicion = binario.find('1')
+        indice = 0
+        while posicion != -1 and (fin is None or indice < fin):
+            if indice >= inicio:
+                ids.append(self.slots[largo - 1 - posicion])
+            indice += 1
+            posicion = binario.find('1', posicion + 1)
+        return ids
+
+    def hidratar(self, queryset):
+
+        self.queryset = queryset
+        return self
+
+    def __getitem__(self, item):
+
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        fin = item.stop
+        ids = self.ids(item.start or 0, fin)
+        objetos = self.queryset.in_bulk(ids)
+        pagina = [objetos[mascota_id] for mascota_id in ids if mascota_id in objetos]
+        if len(pagina) < len(ids) and self.indice is not None:
+            # Mascotas adoptadas o borradas desde otro proceso mientras el índice de este seguía
+            # vigente por TTL: se reconstruye en la próxima consulta
+            self.indice.invalidar()
+        # La página se completa con las siguientes para no devolverla corta
+        while fin is not None and len(pagina) < len(ids):
+            siguientes = self.ids(fin, fin + len(ids) - len(pagina))
+            if not siguientes:
+                break
+            fin += len(siguientes)
+            objetos = self.queryset.in_bulk(siguientes)
+            pagina += [objetos[mascota_id] for mascota_id in siguientes if mascota_id in objetos]
+        return pagina
+
+
+indice_catalogo = IndiceBitmap(ttl=getattr(settings, 'CATALOGO_INDICE_BITMAP_TTL', 60))
+
+
+def resolver_con_indice(query_params):
+
+    if not getattr(settings, 'CATALOGO_INDICE_BITMAP', True):
+        return None
+
+    # Solo filtros soportados por el índice y paginación por número de página
+    parametros_filtro = {parametro for parametro, _, _ in FILTROS_CATALOGO}
+    if any(p not in parametros_filtro and p not in PARAMETROS_PRESENTACION for p in query_params):
+        return None
+
+    return indice_catalogo.resolver(filtros_catalogo(query_params))
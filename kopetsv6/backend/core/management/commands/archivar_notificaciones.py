@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.notificaciones import aplicar_retencion, archivo_vencido, candidatas_retencion, compactar_tablas
+
+
+class Command(BaseCommand):
+    help = 'Aplica la retención de notificaciones (NOTIFICACIONES_RETENCION): archiva o borra las leídas antiguas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Solo cuenta lo que se archivaría o borraría')
+        parser.add_argument('--lote', type=int, default=settings.NOTIFICACIONES_RETENCION_LOTE, help='Filas por transacción')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre lotes')
+        parser.add_argument('--compactar', action='store_true', help='Reconstruye las tablas al terminar (OPTIMIZE TABLE en MySQL)')
+
+    def handle(self, *args, **options):
+        if options['simular']:
+            for tipo, accion, personales, difusiones in candidatas_retencion():
+                self.stdout.write(f'{tipo}: {accion} {personales.count()} leídas · borrar {difusiones.count()} difusiones')
+            self.stdout.write(f'Archivadas vencidas: {archivo_vencido().count()}')
+            return
+
+        resultado = aplicar_retencion(lote=options['lote'], pausa=options['pausa'])
+        archivo = resultado.pop('archivo')
+        cursores = resultado.pop('cursores')
+        for tipo, (accion, personales, difusiones) in resultado.items():
+            self.stdout.write(f'{tipo}: {accion} {personales} leídas · {difusiones} difusiones borradas')
+        self.stdout.write(f'Archivadas vencidas borradas: {archivo}')
+        self.stdout.write(f'Cursores podados: {cursores}')
+
+        if options['compactar']:
+            tablas = compactar_tablas()
+            self.stdout.write(f'Tablas compactadas: {", ".join(tablas)}' if tablas else 'Compactación solo disponible en MySQL')
+        self.stdout.write(self.style.SUCCESS('Retención aplicada'))
@@ -0,0 +1,107 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.busqueda import buscar_mascotas, texto_indexable
+from core.models import CustomUser, Mascota, Raza, Refugio, TipoAnimal
+
+
+NOMBRES = [
+    'Max', 'Luna', 'Rocky', 'Lola', 'Toby', 'Nala', 'Simón', 'Canela', 'Bruno', 'Maya',
+    'Coco', 'Kira', 'Thor', 'Mía', 'Zeus', 'Frida', 'Pancho', 'Chispa', 'Oreo', 'Úrsula',
+]
+COLORES = ['negro', 'blanco', 'café', 'atigrado', 'gris', 'dorado', 'bicolor', 'tricolor', 'canela']
+PALABRAS = [
+    'cariñoso', 'juguetón', 'tranquila', 'rescatado', 'energético', 'tímida', 'sociable', 'obediente',
+    'pequeño', 'grande', 'vacunado', 'esterilizada', 'paseos', 'niños', 'departamento', 'patio',
+    'compañía', 'dócil', 'curioso', 'protector', 'adulto', 'cachorrita', 'senior', 'calle',
+]
+CONSULTAS = [
+    'perro', 'gata negra', 'labrador', 'cariñosa', 'cachorro juguetón', 'luna', 'pe', 'gato atig',
+    'perros tranquilos', 'rescatada niños', 'dorado', 'max', 'obediente patio', 'tricolor',
+]
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de búsqueda del catálogo (opcionalmente sobre un dataset sintético)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crear', type=int, default=0, help='Mascotas sintéticas a crear antes de medir')
+        parser.add_argument('--consultas', type=int, default=500)
+        parser.add_argument('--limpiar', action='store_true', help='Elimina el dataset sintético y termina')
+
+    def _refugio_benchmark(self):
+        user, _ = CustomUser.objects.get_or_create(
+            username='benchmark_busqueda',
+            defaults={'email': 'benchmark_busqueda@kokoropets.local', 'tipo_usuario': 'REFUGIO'}
+        )
+        refugio, _ = Refugio.objects.get_or_create(
+            user=user,
+            defaults={'nombre': 'Refugio Benchmark', 'direccion': '-', 'ciudad': 'Santiago', 'region': 'Metropolitana'}
+        )
+        return refugio
+
+    def _crear_dataset(self, cantidad):
+        refugio = self._refugio_benchmark()
+        tipos = list(TipoAnimal.objects.all()) or [TipoAnimal.objects.create(nombre='Perro')]
+        razas = {t.id: list(Raza.objects.filter(tipo_animal=t)) for t in tipos}
+
+        creadas = 0
+        while creadas < cantidad:
+            lote = []
+            for _ in range(min(5000, cantidad - creadas)):
+                tipo = random.choice(tipos)
+                raza = random.choice(razas[tipo.id]) if razas[tipo.id] else None
+                nombre = random.choice(NOMBRES)
+                color = random.choice(COLORES)
+                descripcion = ' '.join(random.choices(PALABRAS, k=12))
+                lote.append(Mascota(
+                    refugio=refugio, tipo_animal=tipo, raza=raza,
+                    nombre=nombre, sexo=random.choice(['MACHO', 'HEMBRA']),
+                    edad=random.choice(['CACHORRO', 'JOVEN', 'ADULTO', 'SENIOR']),
+                    descripcion=descripcion, color=color, estado='DISPONIBLE',
+                    texto_busqueda=texto_indexable(
+                        nombre=nombre, raza=raza.nombre if raza else '', color=color,
+                        tipo_animal=tipo.nombre, descripcion=descripcion,
+                    ),
+                ))
+            with transaction.atomic():
+                Mascota.objects.bulk_create(lote, batch_size=1000)
+            creadas += len(lote)
+            self.stdout.write(f'  {creadas}/{cantidad} mascotas creadas')
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            borradas, _ = Mascota.objects.filter(refugio__user__username='benchmark_busqueda').delete()
+            self.stdout.write(self.style.SUCCESS(f'Eliminados {borradas} registros sintéticos'))
+            return
+
+        if options['crear']:
+            self._crear_dataset(options['crear'])
+
+        base = Mascota.objects.filter(estado='DISPONIBLE')
+        total = base.count()
+        tiempos = []
+        for _ in range(options['consultas']):
+            consulta = random.choice(CONSULTAS)
+            inicio = time.perf_counter()
+            list(buscar_mascotas(base, consulta).values_list('id', flat=True)[:20])
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+
+        self.stdout.write(f'Mascotas disponibles: {total}')
+        if not tiempos:
+            self.stdout.write(self.style.WARNING('Sin consultas que medir'))
+            return
+
+        tiempos.sort()
+        p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+        p99 = tiempos[int(len(tiempos) * 0.99) - 1]
+        self.stdout.write(f'Consultas: {len(tiempos)}')
+        self.stdout.write(f'p50: {statistics.median(tiempos):.2f} ms')
+        self.stdout.write(f'p95: {p95:.2f} ms')
+        self.stdout.write(f'p99: {p99:.2f} ms')
+        estilo = self.style.SUCCESS if p95 < 50 else self.style.WARNING
+        self.stdout.write(estilo(f'Objetivo p95 < 50 ms: {"OK" if p95 < 50 else "NO CUMPLE"}'))
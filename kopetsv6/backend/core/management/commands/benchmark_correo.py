@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.mail import EmailMultiAlternatives
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.correo import cerrar_pools, enviar_mensajes, metricas_envio
+from core.smtp_local import ServidorSMTPLocal
+
+
+def iniciar_servidor(latencia, latencia_conexion):
+
+    # El servidor corre en su propio event loop, en un hilo aparte, en un puerto libre
+    servidor = ServidorSMTPLocal(latencia=latencia, latencia_conexion=latencia_conexion)
+    loop = asyncio.new_event_loop()
+    tcp = loop.run_until_complete(servidor.iniciar('127.0.0.1', 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return servidor, tcp.sockets[0].getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = 'Compara el envío de correos con una conexión SMTP por mensaje y con el pool, contra un servidor SMTP local'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mensajes', type=int, default=300)
+        parser.add_argument('--hilos', type=int, default=4, help='Hilos (y conexiones del pool) en el envío concurrente')
+        parser.add_argument('--latencia', type=float, default=0.005, help='Segundos que tarda el servidor en aceptar cada mensaje')
+        parser.add_argument('--latencia-conexion', type=float, default=0.05, help='Segundos de saludo + TLS + AUTH por conexión')
+        parser.add_argument('--limite', type=float, default=0, help='Mensajes por segundo en una prueba extra con límite')
+
+    def handle(self, *args, **options):
+        servidor, puerto = iniciar_servidor(options['latencia'], options['latencia_conexion'])
+        html = '<html><body>' + '<p>Kokoropets</p>' * 200 + '</body></html>'
+        mensajes = [
+            EmailMultiAlternatives(f'Prueba {numero}', 'Texto de prueba', 'Kokoropets <prueba@kokoropets.cl>', [f'destino{numero}@example.com'])
+            for numero in range(options['mensajes'])
+        ]
+        for mensaje in mensajes:
+            mensaje.attach_alternative(html, 'text/html')
+
+        smtp = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': puerto,
+            'EMAIL_USE_TLS': False,
+            'EMAIL_USE_SSL': False,
+            'EMAIL_HOST_USER': 'benchmark',
+            'EMAIL_HOST_PASSWORD': 'benchmark',
+        }
+        hilos = options['hilos']
+        escenarios = [
+            ('Una conexión por mensaje', 1, None, False),
+            ('Pool, 1 hilo', 1, None, True),
+            (f'Pool, {hilos} hilos', hilos, None, True),
+        ]
+        if options['limite']:
+            escenarios.append((f"Pool, {hilos} hilos, límite {options['limite']:g}/s", hilos, options['limite'], True))
+
+        self.stdout.write(
+            f"{len(mensajes)} mensajes · servidor local con {options['latencia'] * 1000:g} ms por mensaje "
+            f"y {options['latencia_conexion'] * 1000:g} ms por conexión"
+        )
+        for nombre, concurrencia, limite, con_pool in escenarios:
+            with override_settings(**smtp, CORREO_POOL_CONEXIONES=concurrencia, CORREO_LIMITES={'*': limite}):
+                cerrar_pools()
+                conexiones = servidor.conexiones
+                recibidos = servidor.mensajes
+                inicio = time.perf_counter()
+                if con_pool:
+                    partes = [mensajes[i::concurrencia] for i in range(concurrencia)]
+                    with ThreadPoolExecutor(concurrencia) as ejecutor:
+                        errores = sum((list(r) for r in ejecutor.map(enviar_mensajes, partes)), [])
+                    fallidos = sum(error is not None for error in errores)
+                else:
+                    fallidos = len(mensajes) - sum(mensaje.send(fail_silently=True) for mensaje in mensajes)
+                segundos = time.perf_counter() - inicio
+                metricas = next(iter(metricas_envio().values()), {}) if con_pool else {}
+                cerrar_pools()
+
+            latencia = f" · latencia media {metricas['latencia_media_ms']} ms, p95 {metricas['latencia_p95_ms']} ms" if metricas else ''
+            self.stdout.write(
+                f'{nombre}: {segundos:.2f} s ({len(mensajes) / segundos:.0f} msg/s) · '
+                f'conexiones {servidor.conexiones - conexiones} · recibidos {servidor.mensajes - recibidos} · '
+                f'fallidos {fallidos}{latencia}'
+            )
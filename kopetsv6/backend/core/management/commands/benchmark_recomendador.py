@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.recomendador import CARACTERISTICAS, MatrizCompatibilidad, pesos_perfil, vector_mascota
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia del recomendador de mascotas (opcionalmente con candidatos sintéticos en memoria)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sinteticas', type=int, default=500000,
+            help='Candidatos sintéticos en memoria; 0 usa las mascotas disponibles de la base de datos'
+        )
+        parser.add_argument('--consultas', type=int, default=200)
+        parser.add_argument('--limite', type=int, default=20)
+
+    def _matriz_sintetica(self, cantidad):
+        matriz = MatrizCompatibilidad(ttl=float('inf'))
+        matriz._vaciar(capacidad=cantidad)
+        combinaciones = [
+            vector_mascota(energia, cuidado, tamano, *(random.random() < .5 for _ in range(5)))
+            for energia in ('BAJA', 'MEDIA', 'ALTA', '')
+            for cuidado in ('BAJO', 'MEDIO', 'ALTO', '')
+            for tamano in ('PEQUENO', 'MEDIANO', 'GRANDE', 'GIGANTE', '')
+            for _ in range(8)
+        ]
+        indices = np.random.randint(0, len(combinaciones), size=cantidad)
+        matriz.matriz[:, :cantidad] = np.asarray(combinaciones, dtype=np.float32)[indices].T
+        matriz.ids[:cantidad] = np.arange(1, cantidad + 1)
+        matriz.tipos[:cantidad] = np.random.randint(1, 3, size=cantidad)
+        matriz.activas[:cantidad] = True
+        matriz.cantidad = cantidad
+        matriz._construida_en = time.monotonic()
+        return matriz
+
+    def handle(self, *args, **options):
+        if options['sinteticas']:
+            matriz = self._matriz_sintetica(options['sinteticas'])
+        else:
+            matriz = MatrizCompatibilidad()
+            inicio = time.perf_counter()
+            matriz.construir()
+            self.stdout.write(f'Construcción desde la base de datos: {(time.perf_counter() - inicio) * 1000:.0f} ms')
+
+        tiempos = []
+        for _ in range(options['consultas']):
+            perfil = SimpleNamespace(
+                tipo_vivienda=random.choice(['CASA', 'DEPARTAMENTO', 'PARCELA', '']),
+                tiene_patio=random.random() < .5,
+                experiencia_previa=random.random() < .5,
+                tiene_mascotas=random.random() < .5,
+                cantidad_mascotas=random.randint(0, 4),
+            )
+            tipo_animal = random.choice([None, 1, 2])
+            inicio = time.perf_counter()
+            matriz.recomendar(pesos_perfil(perfil), limite=options['limite'], tipo_animal_id=tipo_animal)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+
+        tiempos.sort()
+        p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+        p99 = tiempos[int(len(tiempos) * 0.99) - 1]
+        self.stdout.write(f'Candidatos: {matriz.cantidad} ({len(CARACTERISTICAS)} características)')
+        self.stdout.write(f'Consultas: {len(tiempos)}')
+        self.stdout.write(f'p50: {statistics.median(tiempos):.2f} ms')
+        self.stdout.write(f'p95: {p95:.2f} ms')
+        self.stdout.write(f'p99: {p99:.2f} ms')
+        estilo = self.style.SUCCESS if p95 < 20 else self.style.WARNING
+        self.stdout.write(estilo(f'Objetivo p95 < 20 ms: {"OK" if p95 < 20 else "NO CUMPLE"}'))
@@ -0,0 +1,138 @@
+import asyncio
+import gc
+import os
+import resource
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.asgi import application
+from core.models import CustomUser
+from core.tiempo_real import canal
+
+
+def memoria_mb():
+
+    # RSS actual en Linux; en otros sistemas, el máximo alcanzado
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = 'Abre conexiones SSE inactivas contra config.asgi en este proceso y mide memoria y reparto de eventos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conexiones', type=int, default=10000)
+        parser.add_argument('--eventos', type=int, default=5, help='Eventos de difusión a repartir entre todas las conexiones')
+        parser.add_argument('--latido', type=float, default=0, help='Segundos de latido para comprobarlo (0 = el configurado, sin esperar)')
+        parser.add_argument('--usuario', help='Usuario de las conexiones (por defecto el primer adoptante activo)')
+
+    def handle(self, *args, **options):
+        filtro = {'username': options['usuario']} if options['usuario'] else {'tipo_usuario': 'ADOPTANTE', 'is_active': True}
+        usuario = CustomUser.objects.filter(**filtro).order_by('pk').first()
+        if usuario is None:
+            raise CommandError('No hay un usuario para abrir las conexiones')
+
+        latido = options['latido'] or getattr(settings, 'TIEMPO_REAL_LATIDO_SEGUNDOS', 25)
+        with override_settings(TIEMPO_REAL_LATIDO_SEGUNDOS=latido, TIEMPO_REAL_BROKER=''):
+            asyncio.run(self._medir(usuario, options))
+
+    def _scope(self, token, numero):
+        host = next((h for h in settings.ALLOWED_HOSTS if h not in ('*',) and not h.startswith('.')), 'localhost')
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': '/api/notificaciones/eventos/',
+            'raw_path': b'/api/notificaciones/eventos/',
+            'query_string': f'token={token}'.encode(),
+            'headers': [(b'host', host.encode()), (b'accept', b'text/event-stream')],
+            'server': (host, 80),
+            'client': ('127.0.0.1', 10000 + numero % 50000),
+        }
+
+    async def _medir(self, usuario, options):
+        token = str(AccessToken.for_user(usuario))
+        total = options['conexiones']
+        cerrar = asyncio.Event()
+        conectadas = asyncio.Event()
+        estado = {'abiertas': 0, 'errores': 0, 'pings': 0, 'recibidos': 0}
+        objetivo = {'recibidos': 0}
+        todos = asyncio.Event()
+
+        def conexion(numero):
+            enviada = False
+
+            async def receive():
+                nonlocal enviada
+                if not enviada:
+                    enviada = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await cerrar.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(mensaje):
+                if mensaje['type'] == 'http.response.start' and mensaje['status'] != 200:
+                    estado['errores'] += 1
+                cuerpo = mensaje.get('body', b'')
+                if b'event: no_leidas\ndata: {"count"' in cuerpo:
+                    estado['abiertas'] += 1
+                    if estado['abiertas'] + estado['errores'] == total:
+                        conectadas.set()
+                if b'event: notificacion' in cuerpo:
+                    estado['recibidos'] += 1
+                    if estado['recibidos'] == objetivo['recibidos']:
+                        todos.set()
+                if cuerpo.startswith(b': ping'):
+                    estado['pings'] += 1
+
+            return application(self._scope(token, numero), receive, send)
+
+        gc.collect()
+        memoria_inicial = memoria_mb()
+        inicio = time.perf_counter()
+        tareas = [asyncio.create_task(conexion(numero)) for numero in range(total)]
+        await conectadas.wait()
+        apertura = time.perf_counter() - inicio
+        gc.collect()
+        memoria = memoria_mb() - memoria_inicial
+
+        self.stdout.write(f'Conexiones abiertas: {estado["abiertas"]} (errores: {estado["errores"]}) en {apertura:.1f} s')
+        self.stdout.write(f'Suscripciones en el canal: {canal.conexiones()} · hilos: {threading.active_count()}')
+        self.stdout.write(f'Memoria adicional: {memoria:.0f} MB ({memoria * 1024 / max(estado["abiertas"], 1):.1f} KB por conexión)')
+
+        tiempos = []
+        for numero in range(options['eventos']):
+            objetivo['recibidos'] = estado['recibidos'] + estado['abiertas']
+            todos.clear()
+            inicio = time.perf_counter()
+            canal.publicar_local({
+                'tipo_usuario': usuario.tipo_usuario,
+                'notificacion': {'id': -(numero + 1), 'tipo': 'MENSAJE_GENERAL', 'titulo': 'Benchmark', 'difusion': True},
+            })
+            await todos.wait()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        if tiempos:
+            self.stdout.write(
+                f'Reparto de un evento a todas: mediana {sorted(tiempos)[len(tiempos) // 2]:.0f} ms, máximo {max(tiempos):.0f} ms'
+            )
+
+        if options['latido']:
+            pings = estado['pings']
+            await asyncio.sleep(options['latido'] * 1.5)
+            self.stdout.write(f'Latidos en {options["latido"] * 1.5:.1f} s: {estado["pings"] - pings}')
+
+        cerrar.set()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        restantes = canal.conexiones()
+        estilo = self.style.SUCCESS if not restantes and not estado['errores'] else self.style.WARNING
+        self.stdout.write(estilo(f'Conexiones cerradas; suscripciones restantes: {restantes}'))
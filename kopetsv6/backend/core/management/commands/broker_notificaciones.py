@@ -0,0 +1,59 @@
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Bytes pendientes de enviar a un suscriptor antes de cortarlo (no está leyendo)
+LIMITE_BUFFER = 4 * 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = 'Broker de notificaciones en tiempo real entre procesos (servidores ASGI, worker de tareas, admin)'
+
+    def add_arguments(self, parser):
+        host, _, puerto = (getattr(settings, 'TIEMPO_REAL_BROKER', '') or '127.0.0.1:8765').rpartition(':')
+        parser.add_argument('--host', default=host or '127.0.0.1')
+        parser.add_argument('--puerto', type=int, default=int(puerto))
+
+    def handle(self, *args, **options):
+        self.suscriptores = set()
+        self.publicados = 0
+        asyncio.run(self._servir(options['host'], options['puerto']))
+        self.stdout.write(self.style.SUCCESS(f'Broker detenido: {self.publicados} eventos publicados'))
+
+    async def _servir(self, host, puerto):
+        detener = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(senal, detener.set)
+
+        servidor = await asyncio.start_server(self._atender, host, puerto, limit=1024 * 1024)
+        self.stdout.write(f'Broker de notificaciones escuchando en {host}:{puerto}')
+        async with servidor:
+            await detener.wait()
+
+    async def _atender(self, lector, escritor):
+        try:
+            rol = (await lector.readline()).strip()
+            if rol == b'SUB':
+                self.suscriptores.add(escritor)
+                # El suscriptor no envía nada más: se espera a que cierre
+                await lector.read()
+            elif rol == b'PUB':
+                while linea := await lector.readline():
+                    self._reenviar(linea)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.suscriptores.discard(escritor)
+            escritor.close()
+
+    def _reenviar(self, linea):
+        self.publicados += 1
+        for suscriptor in list(self.suscriptores):
+            if suscriptor.transport.get_write_buffer_size() > LIMITE_BUFFER:
+                self.suscriptores.discard(suscriptor)
+                suscriptor.close()
+                continue
+            suscriptor.write(linea)
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.similares import calcular_similares
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla de mascotas similares de todo el catálogo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = calcular_similares(tamano_lote=options['lote'])
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'Calculados {total} pares de mascotas similares en {segundos:.1f} s'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core.imagenes import CAMPOS_IMAGEN, TAREA_DERIVADOS, generar_derivados, tiene_derivados
+from core.models import Tarea
+
+
+class Command(BaseCommand):
+    help = 'Genera las versiones thumb / card / full (WebP y JPEG) de las imágenes ya subidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Regenera también las imágenes que ya tienen derivados'
+        )
+
+    def handle(self, *args, **options):
+        generadas = 0
+        fallidas = 0
+        for modelo, campos in CAMPOS_IMAGEN.items():
+            for campo in campos:
+                field = modelo._meta.get_field(campo)
+                nombres = (
+                    modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                    .order_by().values_list(campo, flat=True).distinct()
+                )
+                for nombre in nombres.iterator():
+                    if not options['todos'] and tiene_derivados(nombre):
+                        continue
+                    archivo = field.attr_class(None, field, nombre)
+                    try:
+                        generar_derivados(archivo)
+                        generadas += 1
+                        Tarea.objects.filter(tipo=TAREA_DERIVADOS, clave=nombre, estado='FALLIDA').delete()
+                    except Exception as e:
+                        fallidas += 1
+                        self.stdout.write(self.style.WARNING(f'{modelo.__name__}.{campo} {nombre}: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Derivados generados para {generadas} imágenes ({fallidas} con error)'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+
+from core.cache_respuestas import TAG_MASCOTAS, invalidar_tags
+from core.imagenes import CAMPOS_PLACEHOLDER, calcular_placeholder
+from core.models import Mascota
+
+
+class Command(BaseCommand):
+    help = 'Calcula el LQIP y el color dominante de las fotos de mascotas ya subidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Recalcula también las fotos que ya tienen placeholder'
+        )
+
+    def handle(self, *args, **options):
+        campos = CAMPOS_PLACEHOLDER[Mascota]
+        calculados = {}
+        generadas = 0
+        fallidas = 0
+
+        mascotas = Mascota.objects.only('pk', 'placeholders', *campos).order_by('pk')
+        for mascota in mascotas.iterator(chunk_size=500):
+            placeholders = dict(mascota.placeholders or {})
+            cambio = False
+            for campo in campos:
+                archivo = getattr(mascota, campo)
+                if not archivo:
+                    continue
+                if not options['todos'] and placeholders.get(campo, {}).get('nombre') == archivo.name:
+                    continue
+
+                # Varias mascotas pueden compartir la misma foto (blob): se calcula una vez
+                if archivo.name not in calculados:
+                    try:
+                        calculados[archivo.name] = calcular_placeholder(archivo)
+                    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+                        calculados[archivo.name] = None
+                        self.stdout.write(self.style.WARNING(f'Mascota {mascota.pk} {campo} {archivo.name}: {e}'))
+                if calculados[archivo.name] is None:
+                    fallidas += 1
+                    continue
+
+                placeholders[campo] = {'nombre': archivo.name, **calculados[archivo.name]}
+                cambio = True
+                generadas += 1
+
+            if cambio:
+                Mascota.objects.filter(pk=mascota.pk).update(placeholders=placeholders)
+
+        if generadas:
+            invalidar_tags(TAG_MASCOTAS)
+        self.stdout.write(self.style.SUCCESS(f'Placeholders calculados para {generadas} fotos ({fallidas} con error)'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core.geo import codificar_geohash, geocodificar
+from core.models import Refugio
+
+
+class Command(BaseCommand):
+    help = 'Asigna coordenadas a los refugios desde la tabla de comunas incluida'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Vuelve a geocodificar también los refugios que ya tienen coordenadas'
+        )
+
+    def handle(self, *args, **options):
+        refugios = Refugio.objects.all()
+        if not options['todos']:
+            refugios = refugios.filter(latitud__isnull=True)
+
+        actualizados = []
+        sin_coincidencia = []
+        for refugio in refugios.only('user_id', 'nombre', 'direccion', 'ciudad', 'region'):
+            coordenadas = geocodificar(refugio.ciudad, refugio.region, refugio.direccion)
+            if not coordenadas:
+                sin_coincidencia.append(refugio)
+                continue
+            refugio.latitud, refugio.longitud = coordenadas
+            refugio.geohash = codificar_geohash(*coordenadas)
+            actualizados.append(refugio)
+
+        Refugio.objects.bulk_update(actualizados, ['latitud', 'longitud', 'geohash'], batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f'Geocodificados {len(actualizados)} refugios'))
+        for refugio in sin_coincidencia:
+            self.stdout.write(self.style.WARNING(
+                f'Sin coincidencia: {refugio.nombre} ({refugio.ciudad}, {refugio.region})'
+            ))
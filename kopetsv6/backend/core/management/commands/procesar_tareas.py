@@ -0,0 +1,46 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.correo import purgar_correos
+from core.subidas import purgar_subidas_abandonadas
+from core.tareas import procesar_lote, purgar_tareas
+
+
+class Command(BaseCommand):
+    help = 'Worker de la cola de tareas en segundo plano (derivados de imágenes, correos, etc.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10, help='Tareas tomadas por vuelta')
+        parser.add_argument('--espera', type=float, default=2.0, help='Segundos de espera con la cola vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina')
+
+    def handle(self, *args, **options):
+        self.detener = False
+        signal.signal(signal.SIGTERM, self._detener)
+        signal.signal(signal.SIGINT, self._detener)
+
+        total = 0
+        ultima_purga = 0.0
+        while not self.detener:
+            close_old_connections()
+            if time.monotonic() - ultima_purga > 3600:
+                purgar_tareas()
+                purgar_subidas_abandonadas()
+                purgar_correos()
+                ultima_purga = time.monotonic()
+
+            procesadas = procesar_lote(options['lote'])
+            total += procesadas
+            if not procesadas:
+                if options['una_vez']:
+                    break
+                time.sleep(options['espera'])
+
+        self.stdout.write(self.style.SUCCESS(f'Worker detenido: {total} tareas procesadas'))
+
+    def _detener(self, signum, frame):
+        # Termina la tarea en curso y sale en la siguiente vuelta
+        self.detener = True
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.almacenamiento import directorio_cuarentena, purgar_cuarentena, recolectar_huerfanos
+
+
+class Command(BaseCommand):
+    help = 'Busca archivos de media que ningún registro referencia y los informa, borra o mueve a cuarentena'
+
+    def add_arguments(self, parser):
+        accion = parser.add_mutually_exclusive_group()
+        accion.add_argument('--borrar', action='store_true', help='Borra los archivos huérfanos')
+        accion.add_argument('--cuarentena', action='store_true', help='Mueve los archivos huérfanos a MEDIA_CUARENTENA_ROOT')
+        parser.add_argument('--gracia', type=int, default=24, help='Horas desde la última modificación antes de considerar un archivo')
+        parser.add_argument('--purgar-cuarentena', type=int, metavar='DIAS', help='Borra la cuarentena con más de DIAS días')
+
+    def handle(self, *args, **options):
+        if options['gracia'] < 1:
+            raise CommandError('--gracia debe ser de al menos 1 hora')
+        if options['purgar_cuarentena'] is not None and options['purgar_cuarentena'] < 0:
+            raise CommandError('--purgar-cuarentena no puede ser negativo')
+
+        accion = 'borrar' if options['borrar'] else 'cuarentena' if options['cuarentena'] else None
+        archivos = 0
+        recuperables = 0
+        for ruta, tamano in recolectar_huerfanos(accion, timedelta(hours=options['gracia'])):
+            archivos += 1
+            recuperables += tamano
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {ruta} ({tamano / 1024:.1f} KB)')
+
+        megas = recuperables / 1024 / 1024
+        if accion == 'borrar':
+            self.stdout.write(self.style.SUCCESS(f'Archivos huérfanos borrados: {archivos} ({megas:.1f} MB liberados)'))
+        elif accion == 'cuarentena':
+            self.stdout.write(self.style.SUCCESS(
+                f'Archivos huérfanos movidos a {directorio_cuarentena()}: {archivos} ({megas:.1f} MB liberados de media)'
+            ))
+        else:
+            self.stdout.write(f'Archivos huérfanos: {archivos} ({megas:.1f} MB recuperables)')
+            if archivos:
+                self.stdout.write(self.style.WARNING('Sin cambios: use --cuarentena o --borrar para liberarlos'))
+
+        if options['purgar_cuarentena'] is not None:
+            carpetas, liberados = purgar_cuarentena(options['purgar_cuarentena'])
+            self.stdout.write(f'Cuarentena purgada: {carpetas} carpetas ({liberados / 1024 / 1024:.1f} MB liberados)')
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.almacenamiento import (
+    AlmacenamientoDeduplicado,
+    borrar_blobs_sin_referencias,
+    metricas_deduplicacion,
+    migrar_archivos_legados,
+    reconciliar_referencias,
+)
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las referencias de los blobs de media y muestra el ahorro por deduplicación'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--migrar', action='store_true', help='Copia a blobs los archivos subidos antes de la deduplicación')
+        parser.add_argument('--borrar', action='store_true', help='Borra los blobs sin referencias')
+        parser.add_argument('--gracia', type=int, default=24, help='Horas sin referencias antes de borrar un blob')
+
+    def handle(self, *args, **options):
+        if options['migrar']:
+            if not isinstance(default_storage, AlmacenamientoDeduplicado):
+                raise CommandError('El storage por defecto no es core.almacenamiento.AlmacenamientoDeduplicado')
+            migrados = migrar_archivos_legados()
+            self.stdout.write(f'Archivos migrados a blobs: {migrados}')
+
+        corregidos = reconciliar_referencias()
+        self.stdout.write(f'Blobs con referencias corregidas: {corregidos}')
+
+        if options['borrar']:
+            borrados, liberados = borrar_blobs_sin_referencias(timedelta(hours=options['gracia']))
+            self.stdout.write(f'Blobs borrados: {borrados} ({liberados / 1024 / 1024:.1f} MB liberados)')
+
+        metricas = metricas_deduplicacion()
+        self.stdout.write(
+            f"Blobs: {metricas['blobs']} · referencias: {metricas['referencias_totales']} · "
+            f"almacenado: {metricas['bytes_almacenados'] / 1024 / 1024:.1f} MB · "
+            f"ahorrado: {metricas['bytes_ahorrados'] / 1024 / 1024:.1f} MB · "
+            f"sin referencias: {metricas['bytes_huerfanos'] / 1024 / 1024:.1f} MB"
+        )
+        self.stdout.write(self.style.SUCCESS('Reconciliación completa'))
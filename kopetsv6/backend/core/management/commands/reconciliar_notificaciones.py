@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.notificaciones import reconciliar_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de notificaciones no leídas desde las notificaciones y los cursores'
+
+    def handle(self, *args, **options):
+        corregidos = reconciliar_contadores()
+        self.stdout.write(f'Contadores corregidos: {corregidos}')
+        self.stdout.write(self.style.SUCCESS('Reconciliación completa'))
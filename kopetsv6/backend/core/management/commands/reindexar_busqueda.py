@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Mascota
+from core.signals import reindexar_mascotas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el texto de búsqueda de todas las mascotas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = Mascota.objects.count()
+        reindexar_mascotas(Mascota.objects.all(), tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Reindexadas {total} mascotas'))
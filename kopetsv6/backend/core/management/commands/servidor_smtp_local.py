@@ -0,0 +1,51 @@
+import asyncio
+import email
+import email.policy
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.smtp_local import ServidorSMTPLocal
+
+
+class Command(BaseCommand):
+    help = 'Servidor SMTP local que recibe los correos sin reenviarlos (desarrollo y pruebas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--puerto', type=int, default=1025)
+        parser.add_argument('--directorio', help='Guarda cada mensaje recibido como .eml en este directorio')
+        parser.add_argument('--latencia', type=float, default=0, help='Segundos de espera por mensaje (simula un proveedor real)')
+        parser.add_argument('--latencia-conexion', type=float, default=0, help='Segundos de espera al conectar')
+
+    def handle(self, *args, **options):
+        if options['directorio']:
+            os.makedirs(options['directorio'], exist_ok=True)
+        asyncio.run(self.servir(options))
+
+    def recibido(self, directorio, remitente, destinatarios, datos):
+        mensaje = email.message_from_bytes(datos, policy=email.policy.default)
+        self.stdout.write(f"{remitente} -> {', '.join(destinatarios)}: {mensaje['Subject']}")
+        if directorio:
+            nombre = os.path.join(directorio, f'{time.time_ns()}.eml')
+            with open(nombre, 'wb') as archivo:
+                archivo.write(datos)
+
+    async def servir(self, options):
+        servidor = ServidorSMTPLocal(
+            al_recibir=lambda *mensaje: self.recibido(options['directorio'], *mensaje),
+            latencia=options['latencia'],
+            latencia_conexion=options['latencia_conexion'],
+        )
+        tcp = await servidor.iniciar(options['host'], options['puerto'])
+        detener = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(senal, detener.set)
+        self.stdout.write(f"Servidor SMTP local en {options['host']}:{options['puerto']}")
+
+        async with tcp:
+            await detener.wait()
+        self.stdout.write(self.style.SUCCESS(f'Servidor detenido: {servidor.mensajes} mensajes recibidos'))
@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+
+def poblar_texto_busqueda(apps, schema_editor):
+    from core.busqueda import texto_indexable
+
+    Mascota = apps.get_model('core', 'Mascota')
+    lote = []
+    for mascota in Mascota.objects.select_related('raza', 'tipo_animal').iterator(chunk_size=500):
+        mascota.texto_busqueda = texto_indexable(
+            nombre=mascota.nombre,
+            raza=mascota.raza.nombre if mascota.raza_id else '',
+            color=mascota.color,
+            tipo_animal=mascota.tipo_animal.nombre,
+            descripcion=mascota.descripcion,
+        )
+        lote.append(mascota)
+        if len(lote) >= 500:
+            Mascota.objects.bulk_update(lote, ['texto_busqueda'])
+            lote = []
+    if lote:
+        Mascota.objects.bulk_update(lote, ['texto_busqueda'])
+
+
+def crear_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX core_mascota_texto_busqueda_ft ON core_mascota (texto_busqueda)'
+        )
+
+
+def eliminar_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'DROP INDEX core_mascota_texto_busqueda_ft ON core_mascota'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_rename_core_mascot_estado_b9ffc6_idx_core_mascot_estado_aa3fac_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mascota',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Texto normalizado para el índice de búsqueda (se calcula automáticamente)'),
+        ),
+        migrations.RunPython(poblar_texto_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_fulltext, eliminar_indice_fulltext),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_mascota_texto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adopcion',
+            index=models.Index(fields=['fecha_adopcion', 'id'], name='core_adopci_fecha_a_1dce05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mascota',
+            index=models.Index(fields=['estado', 'fecha_ingreso', 'id'], name='core_mascot_estado_c1c7f2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', 'fecha_creacion', 'id'], name='core_notifi_usuario_e177ac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudadopcion',
+            index=models.Index(fields=['adoptante', 'created_at', 'id'], name='core_solici_adoptan_e849fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudadopcion',
+            index=models.Index(fields=['mascota', 'created_at', 'id'], name='core_solici_mascota_35528c_idx'),
+        ),
+    ]
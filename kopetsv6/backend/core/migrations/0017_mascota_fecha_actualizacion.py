@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 02:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_indices_paginacion_keyset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mascota',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
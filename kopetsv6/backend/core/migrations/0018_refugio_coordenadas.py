@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:01
+
+from django.db import migrations, models
+
+
+def geocodificar_refugios(apps, schema_editor):
+    from core.geo import codificar_geohash, geocodificar
+
+    Refugio = apps.get_model('core', 'Refugio')
+    actualizados = []
+    for refugio in Refugio.objects.all():
+        coordenadas = geocodificar(refugio.ciudad, refugio.region, refugio.direccion)
+        if coordenadas:
+            refugio.latitud, refugio.longitud = coordenadas
+            refugio.geohash = codificar_geohash(*coordenadas)
+            actualizados.append(refugio)
+    Refugio.objects.bulk_update(actualizados, ['latitud', 'longitud', 'geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_mascota_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refugio',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Celda geohash de las coordenadas (se calcula automáticamente)', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='refugio',
+            name='latitud',
+            field=models.FloatField(blank=True, help_text='Se geocodifica desde la comuna si no se indica', null=True),
+        ),
+        migrations.AddField(
+            model_name='refugio',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(geocodificar_refugios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_refugio_coordenadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MascotaSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distancia', models.FloatField(help_text='Distancia entre los atributos de ambas mascotas (menor es más parecida)')),
+                ('mascota', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='core.mascota')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.mascota')),
+            ],
+            options={
+                'verbose_name': 'Mascota Similar',
+                'verbose_name_plural': 'Mascotas Similares',
+                'indexes': [models.Index(fields=['mascota', 'distancia'], name='core_mascot_mascota_276824_idx')],
+                'unique_together': {('mascota', 'similar')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_mascota_similar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=100)),
+                ('clave', models.CharField(blank=True, db_index=True, help_text='Identifica el objeto sobre el que trabaja la tarea (p. ej. la ruta de una imagen)', max_length=255)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En proceso'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=5)),
+                ('disponible_en', models.DateTimeField(default=django.utils.timezone.now, help_text='No se ejecuta antes de esta fecha (reintentos con espera)')),
+                ('bloqueada_hasta', models.DateTimeField(blank=True, help_text='Si el worker muere, la tarea vuelve a tomarse pasada esta fecha', null=True)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'disponible_en'], name='core_tarea_estado_5dbe5c_idx'), models.Index(fields=['tipo', 'estado'], name='core_tarea_tipo_24fa92_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(help_text='SHA-256 del contenido', max_length=64, unique=True)),
+                ('ruta', models.CharField(max_length=255, unique=True)),
+                ('tamano', models.BigIntegerField(help_text='Tamaño en bytes')),
+                ('referencias', models.IntegerField(default=0, help_text='Campos de archivo que apuntan a este blob')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Blob de Media',
+                'verbose_name_plural': 'Blobs de Media',
+                'indexes': [models.Index(fields=['referencias', 'fecha_actualizacion'], name='core_blobme_referen_82d1bc_idx')],
+            },
+        ),
+    ]
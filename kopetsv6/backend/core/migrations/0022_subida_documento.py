@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:18
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_blob_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaDocumento',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('tipo_archivo', models.CharField(choices=[('PDF', 'PDF'), ('DOCX', 'Word'), ('XLSX', 'Excel'), ('TXT', 'Texto')], max_length=10)),
+                ('tamano', models.PositiveIntegerField(help_text='Tamaño total anunciado en bytes')),
+                ('recibidos', models.PositiveIntegerField(default=0, help_text='Bytes escritos hasta ahora')),
+                ('datos', models.JSONField(blank=True, default=dict, help_text='Campos del Documento a crear')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('refugio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_documentos', to='core.refugio')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_documentos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Subida de Documento',
+                'verbose_name_plural': 'Subidas de Documentos',
+                'indexes': [models.Index(fields=['fecha_actualizacion'], name='core_subida_fecha_a_4f9cfb_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_subida_documento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mascota',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='LQIP y color dominante por foto (se calculan en segundo plano)'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_mascota_placeholders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CursorNotificaciones',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cursor_notificaciones', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('leidas_hasta', models.PositiveBigIntegerField(default=0)),
+                ('leidas', models.JSONField(blank=True, default=list)),
+                ('ocultas', models.JSONField(blank=True, default=list)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Cursor de Notificaciones',
+                'verbose_name_plural': 'Cursores de Notificaciones',
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificacionDifusion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('SOLICITUD_NUEVA', 'Nueva Solicitud de Adopción'), ('SOLICITUD_APROBADA', 'Solicitud Aprobada'), ('SOLICITUD_RECHAZADA', 'Solicitud Rechazada'), ('VISITA_PROGRAMADA', 'Visita de Seguimiento Programada'), ('CAMPANA_NUEVA', 'Nueva Campaña Disponible'), ('TIP_NUEVO', 'Nuevo Tip Publicado'), ('VOLUNTARIADO_NUEVO', 'Nuevo Evento de Voluntariado'), ('MENSAJE_GENERAL', 'Mensaje General')], max_length=30)),
+                ('titulo', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('url', models.CharField(blank=True, help_text='URL de redirección al hacer clic', max_length=500)),
+                ('tipo_usuario', models.CharField(choices=[('ADOPTANTE', 'Adoptante'), ('REFUGIO', 'Refugio')], default='ADOPTANTE', help_text='Usuarios que la reciben', max_length=10)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Notificación General',
+                'verbose_name_plural': 'Notificaciones Generales',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['tipo_usuario', 'fecha_creacion', 'id'], name='core_notifi_tipo_us_ad8229_idx')],
+            },
+        ),
+    ]
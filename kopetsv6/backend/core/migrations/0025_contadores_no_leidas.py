@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_notificaciones_difusion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorDifusiones',
+            fields=[
+                ('tipo_usuario', models.CharField(choices=[('ADOPTANTE', 'Adoptante'), ('REFUGIO', 'Refugio')], max_length=10, primary_key=True, serialize=False)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de Difusiones',
+                'verbose_name_plural': 'Contadores de Difusiones',
+            },
+        ),
+        migrations.AddField(
+            model_name='cursornotificaciones',
+            name='difusiones_vistas',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cursornotificaciones',
+            name='no_leidas',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
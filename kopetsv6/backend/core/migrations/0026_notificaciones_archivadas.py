@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_contadores_no_leidas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('SOLICITUD_NUEVA', 'Nueva Solicitud de Adopción'), ('SOLICITUD_APROBADA', 'Solicitud Aprobada'), ('SOLICITUD_RECHAZADA', 'Solicitud Rechazada'), ('VISITA_PROGRAMADA', 'Visita de Seguimiento Programada'), ('CAMPANA_NUEVA', 'Nueva Campaña Disponible'), ('TIP_NUEVO', 'Nuevo Tip Publicado'), ('VOLUNTARIADO_NUEVO', 'Nuevo Evento de Voluntariado'), ('MENSAJE_GENERAL', 'Mensaje General')], max_length=30)),
+                ('titulo', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('leida', models.BooleanField(default=True)),
+                ('url', models.CharField(blank=True, max_length=500)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones_archivadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Notificación Archivada',
+                'verbose_name_plural': 'Notificaciones Archivadas',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['usuario', 'fecha_creacion', 'id'], name='core_notifi_usuario_f1c5da_idx'), models.Index(fields=['fecha_creacion'], name='core_notifi_fecha_c_0604f6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_correo_saliente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='correosaliente',
+            name='lote',
+            field=models.CharField(blank=True, db_index=True, help_text='Envíos masivos: los correos de un mismo lote se envían juntos', max_length=36),
+        ),
+    ]
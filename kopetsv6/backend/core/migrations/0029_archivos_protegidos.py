@@ -0,0 +1,77 @@
+# Generated by Django 5.1.4 on 2026-10-18 02:27
+
+import posixpath
+from collections import Counter
+
+import core.models
+from django.core.files.storage import storages
+from django.db import migrations, models
+from django.db.models import F
+
+
+# (modelo, campo, upload_to) de los archivos que pasan al storage protegido
+CAMPOS_PROTEGIDOS = [
+    ('Documento', 'archivo', 'documentos/'),
+    ('Adopcion', 'documento_contrato', 'contratos/'),
+    ('Refugio', 'documento_verificacion', 'documentos_refugios/'),
+]
+
+
+def _mover(apps, origen, destino):
+
+    BlobMedia = apps.get_model('core', 'BlobMedia')
+    movidos = Counter()
+    for modelo, campo, upload_to in CAMPOS_PROTEGIDOS:
+        Modelo = apps.get_model('core', modelo)
+        filas = Modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True}).values_list('pk', campo)
+        for pk, nombre in list(filas):
+            if not origen.exists(nombre):
+                continue
+            with origen.open(nombre, 'rb') as archivo:
+                nuevo = destino.save(posixpath.join(upload_to, posixpath.basename(nombre)), archivo)
+            Modelo.objects.filter(pk=pk).update(**{campo: nuevo})
+            BlobMedia.objects.filter(ruta=nuevo).update(referencias=F('referencias') + 1)
+            movidos[nombre] += 1
+
+    # La copia de origen se borra salvo que sea un blob que otra fila pública sigue usando
+    for nombre, cantidad in movidos.items():
+        BlobMedia.objects.filter(ruta=nombre).update(referencias=F('referencias') - cantidad)
+        blob = BlobMedia.objects.filter(ruta=nombre).first()
+        if blob is None or blob.referencias <= 0:
+            origen.delete(nombre)
+            if blob is not None:
+                blob.delete()
+
+
+def mover_a_protegido(apps, schema_editor):
+    _mover(apps, storages['default'], storages['protegido'])
+
+
+def mover_a_media(apps, schema_editor):
+    _mover(apps, storages['protegido'], storages['default'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_correo_lotes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adopcion',
+            name='documento_contrato',
+            field=models.FileField(blank=True, null=True, storage=core.models.almacenamiento_protegido, upload_to='contratos/'),
+        ),
+        migrations.AlterField(
+            model_name='documento',
+            name='archivo',
+            field=models.FileField(storage=core.models.almacenamiento_protegido, upload_to='documentos/'),
+        ),
+        migrations.AlterField(
+            model_name='refugio',
+            name='documento_verificacion',
+            field=models.FileField(blank=True, null=True, storage=core.models.almacenamiento_protegido, upload_to='documentos_refugios/'),
+        ),
+        migrations.RunPython(mover_a_protegido, mover_a_media),
+    ]
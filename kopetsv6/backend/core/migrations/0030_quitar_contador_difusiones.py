@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 02:32
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_archivos_protegidos'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='ContadorDifusiones',
+        ),
+        migrations.RemoveField(
+            model_name='cursornotificaciones',
+            name='difusiones_vistas',
+        ),
+    ]
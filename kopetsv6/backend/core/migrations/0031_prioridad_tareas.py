@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_quitar_contador_difusiones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='correosaliente',
+            name='vence_en',
+            field=models.DateTimeField(blank=True, help_text='No se envía después de esta fecha (p. ej. un código 2FA ya expirado)', null=True),
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='prioridad',
+            field=models.SmallIntegerField(default=0, help_text='Las tareas disponibles se toman de mayor a menor prioridad'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['estado', 'prioridad', 'disponible_en'], name='core_tarea_estado_7e9c88_idx'),
+        ),
+    ]
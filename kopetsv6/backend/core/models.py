@@ -1,10 +1,18 @@
 from django.db import models
+import uuid
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from datetime import timedelta
 from django.utils import timezone
 from django.db.models import F, Q
 from django.core.exceptions import ValidationError
+from django.core.files.storage import storages
+
+
+def almacenamiento_protegido():
+
+    # Archivos que solo se descargan con permiso (ver core/descargas.py y STORAGES['protegido'])
+    return storages['protegido']
 
 
 # =============================================================================
@@ -57,6 +65,7 @@ class Refugio(models.Model):
     
     documento_verificacion = models.FileField(
         upload_to='documentos_refugios/',
+        storage=almacenamiento_protegido,
         null=True,
         blank=True
     )
@@ -69,6 +78,21 @@ class Refugio(models.Model):
     ciudad = models.CharField(max_length=100)
     region = models.CharField(max_length=100)
     
+    latitud = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Se geocodifica desde la comuna si no se indica"
+    )
+    longitud = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(
+        max_length=12,
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True,
+        help_text="Celda geohash de las coordenadas (se calcula automáticamente)"
+    )
+    
     horario_atencion = models.TextField(blank=True)
     
     def __str__(self):
@@ -299,6 +323,12 @@ class Mascota(models.Model):
     foto_principal = models.ImageField(upload_to='mascotas/', null=True, blank=True)
     foto_2 = models.ImageField(upload_to='mascotas/', null=True, blank=True)
     foto_3 = models.ImageField(upload_to='mascotas/', null=True, blank=True)
+    placeholders = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="LQIP y color dominante por foto (se calculan en segundo plano)"
+    )
     
     
     estado = models.CharField(
@@ -307,6 +337,14 @@ class Mascota(models.Model):
         default='DISPONIBLE'
     )
     fecha_ingreso = models.DateField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    texto_busqueda = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        help_text="Texto normalizado para el índice de búsqueda (se calcula automáticamente)"
+    )
 
     def __str__(self):
         return f"{self.nombre} ({self.tipo_animal.nombre})"
@@ -364,6 +402,36 @@ class Mascota(models.Model):
             models.Index(fields=['refugio', 'estado']),
             models.Index(fields=['tamano', 'nivel_energia']),
             models.Index(fields=['-fecha_ingreso']),
+            models.Index(fields=['estado', 'fecha_ingreso', 'id']),
+        ]
+
+
+class MascotaSimilar(models.Model):
+
+
+    mascota = models.ForeignKey(
+        Mascota,
+        on_delete=models.CASCADE,
+        related_name='similares'
+    )
+    similar = models.ForeignKey(
+        Mascota,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    distancia = models.FloatField(
+        help_text="Distancia entre los atributos de ambas mascotas (menor es más parecida)"
+    )
+
+    def __str__(self):
+        return f"{self.mascota_id} ~ {self.similar_id} ({self.distancia:.3f})"
+
+    class Meta:
+        verbose_name = 'Mascota Similar'
+        verbose_name_plural = 'Mascotas Similares'
+        unique_together = [['mascota', 'similar']]
+        indexes = [
+            models.Index(fields=['mascota', 'distancia']),
         ]
 
 
@@ -547,6 +615,8 @@ class SolicitudAdopcion(models.Model):
             models.Index(fields=['adoptante']),
             models.Index(fields=['mascota']),
             models.Index(fields=['-created_at']),
+            models.Index(fields=['adoptante', 'created_at', 'id']),
+            models.Index(fields=['mascota', 'created_at', 'id']),
         ]
 
 
@@ -586,6 +656,7 @@ class Adopcion(models.Model):
     contrato_firmado = models.BooleanField(default=False)
     documento_contrato = models.FileField(
         upload_to='contratos/',
+        storage=almacenamiento_protegido,
         null=True,
         blank=True
     )
@@ -714,6 +785,7 @@ class Adopcion(models.Model):
             models.Index(fields=['estado']),
             models.Index(fields=['fecha_adopcion']),
             models.Index(fields=['solicitud']),
+            models.Index(fields=['fecha_adopcion', 'id']),
         ]
         constraints = [
             models.CheckConstraint(check=Q(strikes__gte=0), name='adopcion_strikes_gte_0'),
@@ -850,6 +922,7 @@ class VisitaSeguimiento(models.Model):
 
 class FotoVisita(models.Model):
     
+    MAXIMO_POR_VISITA = 3
 
     visita = models.ForeignKey(
         VisitaSeguimiento,
@@ -911,7 +984,7 @@ class Documento(models.Model):
     version = models.CharField(max_length=20, default='1.0')
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='ACTIVO')
 
-    archivo = models.FileField(upload_to='documentos/')
+    archivo = models.FileField(upload_to='documentos/', storage=almacenamiento_protegido)
     tamano = models.PositiveIntegerField(help_text='Tamaño del archivo en bytes')
 
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -956,6 +1029,43 @@ class Documento(models.Model):
         self.save(update_fields=['usos'])
 
 
+class SubidaDocumento(models.Model):
+
+    # Subida por partes de un documento: los trozos se escriben a un archivo parcial fuera de
+    # MEDIA_ROOT y el Documento se crea al finalizar. El id (UUID) es el que usa el cliente
+    # para reanudar la subida
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='subidas_documentos'
+    )
+    refugio = models.ForeignKey(
+        'Refugio',
+        on_delete=models.CASCADE,
+        related_name='subidas_documentos'
+    )
+
+    nombre_archivo = models.CharField(max_length=255)
+    tipo_archivo = models.CharField(max_length=10, choices=Documento.TIPO_ARCHIVO_CHOICES)
+    tamano = models.PositiveIntegerField(help_text='Tamaño total anunciado en bytes')
+    recibidos = models.PositiveIntegerField(default=0, help_text='Bytes escritos hasta ahora')
+    datos = models.JSONField(default=dict, blank=True, help_text='Campos del Documento a crear')
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Subida de Documento'
+        verbose_name_plural = 'Subidas de Documentos'
+        indexes = [
+            models.Index(fields=['fecha_actualizacion']),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.recibidos}/{self.tamano})"
+
+
 # =============================================================================
 # CODIGO DE AUTENTICACION
 # =============================================================================
@@ -994,8 +1104,7 @@ class TwoFactorCode(models.Model):
         import hashlib
         from django.utils import timezone
         from datetime import timedelta
-        from django.core.mail import send_mail
-        from django.conf import settings
+        from .correo import encolar_correo
 
         codigo = ''.join([str(random.randint(0, 9)) for _ in range(6)])
         codigo_hash = hashlib.sha256(codigo.encode()).hexdigest()
@@ -1083,23 +1192,24 @@ class TwoFactorCode(models.Model):
             - Equipo Kokoropets
             """
 
-            send_mail(
-                subject=asunto,
-                message=mensaje_texto,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=mensaje_html,
-                fail_silently=False,
+            # El worker de tareas lo envía; el login no espera al servidor SMTP
+            encolar_correo(
+                asunto=asunto,
+                texto=mensaje_texto,
+                destinatarios=[user.email],
+                html=mensaje_html,
+                sensible=True,
+                vence_en=expiracion,
             )
 
             import logging
             logger = logging.getLogger(__name__)
-            logger.info(f"Email enviado exitosamente a {user.email}")
+            logger.info(f"Email encolado para {user.email}")
 
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
-            logger.error(f"Error al enviar email: {str(e)}")
+            logger.error(f"Error al encolar email: {str(e)}")
             # No lanzamos excepción para que el login continúe aunque falle el email
 
         return codigo  # Retorna el código en texto plano para enviarlo por email
@@ -1492,9 +1602,98 @@ class Notificacion(models.Model):
         indexes = [
             models.Index(fields=['usuario', 'leida']),
             models.Index(fields=['fecha_creacion']),
+            models.Index(fields=['usuario', 'fecha_creacion', 'id']),
+        ]
+
+
+class NotificacionArchivada(models.Model):
+
+    # Notificaciones personales leídas que la política de retención sacó de Notificacion
+    # (manage.py archivar_notificaciones). Conservan su id y se siguen listando al pedir
+    # páginas antiguas
+
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notificaciones_archivadas'
+    )
+    tipo = models.CharField(max_length=30, choices=Notificacion.TIPO_CHOICES)
+    titulo = models.CharField(max_length=200)
+    mensaje = models.TextField()
+    leida = models.BooleanField(default=True)
+    url = models.CharField(max_length=500, blank=True)
+    fecha_creacion = models.DateTimeField()
+    fecha_archivado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.usuario.username} - {self.titulo}"
+
+    class Meta:
+        verbose_name = 'Notificación Archivada'
+        verbose_name_plural = 'Notificaciones Archivadas'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_creacion', 'id']),
+            models.Index(fields=['fecha_creacion']),
+        ]
+
+
+class NotificacionDifusion(models.Model):
+
+    # Notificación para todos los usuarios de un tipo (tips, campañas, voluntariado): una
+    # sola fila por envío. Lo leído por cada usuario se guarda en CursorNotificaciones
+
+    tipo = models.CharField(max_length=30, choices=Notificacion.TIPO_CHOICES)
+    titulo = models.CharField(max_length=200)
+    mensaje = models.TextField()
+    url = models.CharField(max_length=500, blank=True, help_text='URL de redirección al hacer clic')
+    tipo_usuario = models.CharField(
+        max_length=10,
+        choices=CustomUser.TIPO_USUARIO_CHOICES,
+        default='ADOPTANTE',
+        help_text='Usuarios que la reciben'
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_usuario_display()} - {self.titulo}"
+
+    class Meta:
+        verbose_name = 'Notificación General'
+        verbose_name_plural = 'Notificaciones Generales'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['tipo_usuario', 'fecha_creacion', 'id']),
         ]
 
 
+class CursorNotificaciones(models.Model):
+
+    # Las difusiones con id <= leidas_hasta están leídas; las leídas una por una más allá del
+    # cursor van en `leidas` hasta que el cursor las alcanza. Sin fila, no hay nada leído
+
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='cursor_notificaciones'
+    )
+    leidas_hasta = models.PositiveBigIntegerField(default=0)
+    leidas = models.JSONField(default=list, blank=True)
+    ocultas = models.JSONField(default=list, blank=True)
+    # Personales sin leer, para /no_leidas/. Null: sin calcular todavía
+    no_leidas = models.PositiveIntegerField(null=True, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.usuario.username} - hasta {self.leidas_hasta}"
+
+    class Meta:
+        verbose_name = 'Cursor de Notificaciones'
+        verbose_name_plural = 'Cursores de Notificaciones'
+
+
 # =============================================================================
 # FAVORITOS
 # =============================================================================
@@ -1706,4 +1905,144 @@ class ItemInventario(models.Model):
                 check=Q(precio_unitario__gte=0),
                 name='inventario_precio_no_negativo'
             ),
-        ]
\ No newline at end of file
+        ]
+
+# =============================================================================
+# TAREAS EN SEGUNDO PLANO
+# =============================================================================
+
+class Tarea(models.Model):
+    
+
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('COMPLETADA', 'Completada'),
+        ('FALLIDA', 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=100)
+    clave = models.CharField(
+        max_length=255,
+        blank=True,
+        db_index=True,
+        help_text="Identifica el objeto sobre el que trabaja la tarea (p. ej. la ruta de una imagen)"
+    )
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='PENDIENTE'
+    )
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    prioridad = models.SmallIntegerField(
+        default=0,
+        help_text="Las tareas disponibles se toman de mayor a menor prioridad"
+    )
+    disponible_en = models.DateTimeField(
+        default=timezone.now,
+        help_text="No se ejecuta antes de esta fecha (reintentos con espera)"
+    )
+    bloqueada_hasta = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Si el worker muere, la tarea vuelve a tomarse pasada esta fecha"
+    )
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tipo} [{self.estado}] {self.clave}"
+
+    class Meta:
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en']),
+            models.Index(fields=['estado', 'prioridad', 'disponible_en']),
+            models.Index(fields=['tipo', 'estado']),
+        ]
+
+
+# =============================================================================
+# CORREO SALIENTE
+# =============================================================================
+
+class CorreoSaliente(models.Model):
+
+    # Bandeja de salida: el request guarda el correo ya armado y el worker de tareas lo envía
+    # (ver core/correo.py)
+
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('ENVIADO', 'Enviado'),
+        ('FALLIDO', 'Fallido'),
+    ]
+
+    remitente = models.CharField(max_length=254)
+    destinatarios = models.JSONField(default=list)
+    asunto = models.CharField(max_length=255)
+    texto = models.TextField(blank=True)
+    html = models.TextField(blank=True)
+    sensible = models.BooleanField(
+        default=False,
+        help_text="El cuerpo se borra al enviarlo (p. ej. códigos de verificación)"
+    )
+    vence_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="No se envía después de esta fecha (p. ej. un código 2FA ya expirado)"
+    )
+    lote = models.CharField(
+        max_length=36,
+        blank=True,
+        db_index=True,
+        help_text="Envíos masivos: los correos de un mismo lote se envían juntos"
+    )
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.asunto} [{self.estado}]"
+
+    class Meta:
+        verbose_name = 'Correo Saliente'
+        verbose_name_plural = 'Correos Salientes'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+
+
+# =============================================================================
+# ALMACENAMIENTO DE ARCHIVOS DEDUPLICADO
+# =============================================================================
+
+class BlobMedia(models.Model):
+    
+
+    hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 del contenido")
+    ruta = models.CharField(max_length=255, unique=True)
+    tamano = models.BigIntegerField(help_text="Tamaño en bytes")
+    referencias = models.IntegerField(
+        default=0,
+        help_text="Campos de archivo que apuntan a este blob"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.ruta} ({self.referencias} ref.)"
+
+    class Meta:
+        verbose_name = 'Blob de Media'
+        verbose_name_plural = 'Blobs de Media'
+        indexes = [
+            models.Index(fields=['referencias', 'fecha_actualizacion']),
+        ]
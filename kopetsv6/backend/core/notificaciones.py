@@ -0,0 +1,440 @@
+import heapq
+import time
+from datetime import timedelta
+from itertools import islice
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, Count, F, Max, Min, Q, Value, When
+from django.utils import timezone
+
+from .models import (
+    CursorNotificaciones, Notificacion, NotificacionArchivada, NotificacionDifusion,
+)
+
+
+# =============================================================================
+# DIFUSIÓN DE NOTIFICACIONES
+# =============================================================================
+
+# Tips, campañas y eventos de voluntariado se notifican a todos los adoptantes con una sola
+# fila en NotificacionDifusion. Cada usuario ve las difusiones de su tipo publicadas desde
+# que se registró y su CursorNotificaciones indica cuáles leyó
+
+def difundir_notificacion(tipo, titulo, mensaje, url='', tipo_usuario='ADOPTANTE'):
+    return NotificacionDifusion.objects.create(
+        tipo=tipo, titulo=titulo, mensaje=mensaje, url=url, tipo_usuario=tipo_usuario
+    )
+
+
+def cursor_de(usuario):
+
+    # Sin fila todavía no hay nada leído; la fila se crea al marcar la primera como leída
+    return CursorNotificaciones.objects.filter(usuario=usuario).first() or CursorNotificaciones(usuario=usuario)
+
+
+def difusiones_para(usuario, cursor):
+    return NotificacionDifusion.objects.filter(
+        tipo_usuario=usuario.tipo_usuario, fecha_creacion__gte=usuario.date_joined
+    ).exclude(pk__in=cursor.ocultas)
+
+
+def filtro_leidas(cursor):
+    return Q(pk__lte=cursor.leidas_hasta) | Q(pk__in=cursor.leidas)
+
+
+# =============================================================================
+# LECTURA COMBINADA
+# =============================================================================
+
+# Las difusiones se listan junto a las notificaciones personales con id negativo: los ids
+# no chocan y el orden (fecha_creacion, id) sigue siendo total para la paginación keyset
+COLUMNAS = ('tipo', 'titulo', 'mensaje', 'url', 'fecha_creacion', 'id_lista', 'leida_lista', 'difusion')
+RENOMBRES = {'id': 'id_lista', 'pk': 'id_lista', 'leida': 'leida_lista'}
+
+
+def _renombrar(condicion):
+
+    if isinstance(condicion, Q):
+        return Q.create([_renombrar(hijo) for hijo in condicion.children], condicion.connector, condicion.negated)
+    clave, valor = condicion
+    campo, separador, resto = clave.partition('__')
+    return RENOMBRES.get(campo, campo) + separador + resto, valor
+
+
+def _renombrar_orden(campo):
+    signo = '-' if campo.startswith('-') else ''
+    return signo + RENOMBRES.get(campo.lstrip('-'), campo.lstrip('-'))
+
+
+class NotificacionesCombinadas:
+
+    # Se comporta como un queryset para el paginador (filter / order_by / count / slicing):
+    # cada filtro se aplica a todas las partes y la página sale de un UNION ALL ordenado
+    ordered = True
+
+    def __init__(self, personales, difusiones, archivadas=None, orden=('-fecha_creacion', '-id_lista')):
+        self.personales = personales
+        self.difusiones = difusiones
+        self.archivadas = archivadas
+        self.orden = orden
+
+    def _partes(self):
+        return [parte for parte in (self.personales, self.difusiones, self.archivadas) if parte is not None]
+
+    def filter(self, *condiciones, **campos):
+        condiciones = [_renombrar(condicion) for condicion in condiciones]
+        campos = dict(_renombrar(item) for item in campos.items())
+        return NotificacionesCombinadas(
+            *(parte.filter(*condiciones, **campos) if parte is not None else None
+              for parte in (self.personales, self.difusiones, self.archivadas)),
+            orden=self.orden,
+        )
+
+    def order_by(self, *campos):
+        return NotificacionesCombinadas(
+            self.personales, self.difusiones, self.archivadas, tuple(map(_renombrar_orden, campos))
+        )
+
+    def count(self):
+        return sum(parte.count() for parte in self._partes())
+
+    def __getitem__(self, indice):
+
+        if not isinstance(indice, slice):
+            return self[indice:indice + 1][0]
+        recientes = self.personales.union(self.difusiones, all=True).order_by(*self.orden)
+        filas = list(recientes[indice])
+        if self.archivadas is not None and indice.stop is not None:
+            filas = self._con_archivadas(recientes, filas, indice)
+        return [self._objeto(fila) for fila in filas]
+
+    def _con_archivadas(self, recientes, filas, indice):
+
+        # El archivo solo entra en la página si tiene filas que van antes de la última de la
+        # página (o si la página quedó incompleta): "ver más antiguas" lo alcanza al final.
+        # Una página vacía ([0:0] cuando el paginador cuenta 0) no tiene última fila
+        inicio, fin = indice.start or 0, indice.stop
+        archivadas = self.archivadas.order_by(*self.orden)
+        if filas and len(filas) == fin - inicio:
+            archivadas = archivadas.filter(self._antes_de(filas[-1]))
+        if not archivadas.exists():
+            return filas
+        campos = [campo.lstrip('-') for campo in self.orden]
+        mezcla = heapq.merge(
+            recientes[:fin], archivadas[:fin],
+            key=lambda fila: tuple(fila[campo] for campo in campos),
+            reverse=self.orden[0].startswith('-'),
+        )
+        return list(islice(mezcla, inicio, fin))
+
+    def _antes_de(self, fila):
+
+        # Filas que el orden actual pone antes que `fila` (comparación lexicográfica)
+        condicion, iguales = None, Q()
+        for campo in self.orden:
+            nombre = campo.lstrip('-')
+            parte = iguales & Q(**{f'{nombre}__{"gt" if campo.startswith("-") else "lt"}': fila[nombre]})
+            condicion = parte if condicion is None else condicion | parte
+            iguales &= Q(**{nombre: fila[nombre]})
+        return condicion
+
+    @staticmethod
+    def _objeto(fila):
+        fila = dict(fila)
+        fila['id'] = fila.pop('id_lista')
+        fila['leida'] = bool(fila.pop('leida_lista'))
+        fila['difusion'] = bool(fila['difusion'])
+        return SimpleNamespace(**fila)
+
+
+def _columnas_personales(notificaciones):
+    return (
+        notificaciones.order_by()
+        .annotate(id_lista=F('id'), leida_lista=F('leida'), difusion=Value(False, output_field=BooleanField()))
+        .values(*COLUMNAS)
+    )
+
+
+def notificaciones_usuario(usuario, cursor=None):
+
+    cursor = cursor or cursor_de(usuario)
+    personales = _columnas_personales(Notificacion.objects.filter(usuario=usuario))
+    difusiones = (
+        difusiones_para(usuario, cursor).order_by()
+        .annotate(
+            id_lista=-F('id'),
+            leida_lista=Case(When(filtro_leidas(cursor), then=Value(True)), default=Value(False), output_field=BooleanField()),
+            difusion=Value(True, output_field=BooleanField()),
+        )
+        .values(*COLUMNAS)
+    )
+    archivadas = _columnas_personales(NotificacionArchivada.objects.filter(usuario=usuario))
+    return NotificacionesCombinadas(personales, difusiones, archivadas)
+
+
+def buscar_difusion(usuario, difusion_id):
+    filas = notificaciones_usuario(usuario).filter(id=-difusion_id)[:1]
+    return filas[0] if filas else None
+
+
+def difusiones_no_leidas(usuario, cursor):
+    return difusiones_para(usuario, cursor).filter(pk__gt=cursor.leidas_hasta).exclude(pk__in=cursor.leidas).count()
+
+
+def firma_difusiones(usuario):
+
+    # Para el ETag del listado: cambia con una difusión nueva, una borrada o al mover el cursor
+    cursor = cursor_de(usuario)
+    datos = difusiones_para(usuario, cursor).order_by().aggregate(total=Count('pk'), ultima=Max('fecha_creacion'))
+    return (datos['total'], cursor.leidas_hasta, tuple(cursor.leidas), tuple(cursor.ocultas)), datos['ultima']
+
+
+# =============================================================================
+# CONTADORES DE NO LEÍDAS
+# =============================================================================
+
+# /no_leidas/ lee el cursor del usuario por clave primaria: el contador de personales sin
+# leer (los signals lo mantienen al crear, leer y borrar) y la posición desde la que se
+# cuentan las difusiones. Las difusiones no llevan contador propio: contar las visibles
+# posteriores al cursor sigue siendo exacto cuando se borra una
+
+def sumar_no_leidas(usuario_id, delta):
+
+    # Un contador null (sin calcular) sigue null: NULL + 1 es NULL
+    cursores = CursorNotificaciones.objects.filter(usuario_id=usuario_id)
+    if delta < 0:
+        cursores = cursores.filter(no_leidas__gte=-delta)
+    cursores.update(no_leidas=F('no_leidas') + delta)
+
+
+def _calcular_no_leidas(usuario, cursor):
+    cursor.no_leidas = Notificacion.objects.filter(usuario=usuario, leida=False).count()
+
+
+def contar_no_leidas(usuario):
+
+    cursor = CursorNotificaciones.objects.filter(usuario=usuario).first()
+    if cursor is None or cursor.no_leidas is None:
+        with transaction.atomic():
+            cursor = _cursor_bloqueado(usuario)
+            _calcular_no_leidas(usuario, cursor)
+            cursor.save(update_fields=['no_leidas', 'fecha_actualizacion'])
+    return cursor.no_leidas + difusiones_no_leidas(usuario, cursor)
+
+
+def reconciliar_contadores():
+
+    # Recalcula las personales sin leer desde las notificaciones (la fuente de verdad).
+    # Devuelve cuántos contadores estaban desviados
+    corregidos = 0
+    for usuario_id in CursorNotificaciones.objects.values_list('usuario_id', flat=True).iterator():
+        with transaction.atomic():
+            cursor = CursorNotificaciones.objects.select_for_update().select_related('usuario').get(usuario_id=usuario_id)
+            antes = cursor.no_leidas
+            _calcular_no_leidas(cursor.usuario, cursor)
+            if cursor.no_leidas != antes:
+                cursor.save(update_fields=['no_leidas', 'fecha_actualizacion'])
+                corregidos += 1
+    return corregidos
+
+
+# =============================================================================
+# CURSOR DE LECTURA
+# =============================================================================
+
+def _cursor_bloqueado(usuario):
+    cursor, _ = CursorNotificaciones.objects.select_for_update().get_or_create(usuario=usuario)
+    return cursor
+
+
+def _avanzar_cursor(usuario, cursor, leidas):
+
+    # El cursor avanza mientras las siguientes difusiones visibles estén leídas; las demás
+    # quedan en la lista hasta que el cursor las alcance
+    hasta = cursor.leidas_hasta
+    siguientes = (
+        difusiones_para(usuario, cursor).filter(pk__gt=hasta)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    for pk in siguientes.iterator():
+        if pk not in leidas:
+            break
+        hasta = pk
+    cursor.leidas_hasta = hasta
+    cursor.leidas = sorted(pk for pk in leidas if pk > hasta)
+
+
+def marcar_difusion_leida(usuario, difusion_id):
+
+    with transaction.atomic():
+        cursor = _cursor_bloqueado(usuario)
+        if difusion_id <= cursor.leidas_hasta or difusion_id in cursor.leidas:
+            return
+        _avanzar_cursor(usuario, cursor, set(cursor.leidas) | {difusion_id})
+        cursor.save()
+
+
+def marcar_notificacion_leida(notificacion):
+
+    # El UPDATE condicional decide quién descuenta si dos peticiones llegan a la vez
+    with transaction.atomic():
+        if Notificacion.objects.filter(pk=notificacion.pk, leida=False).update(leida=True):
+            sumar_no_leidas(notificacion.usuario_id, -1)
+    notificacion.leida = True
+
+
+def marcar_todo_leido(usuario):
+
+    # El cursor se bloquea primero: una notificación creada mientras tanto suma al contador
+    # después de que este quede en cero
+    with transaction.atomic():
+        cursor = _cursor_bloqueado(usuario)
+        Notificacion.objects.filter(usuario=usuario, leida=False).update(leida=True)
+        ultima = NotificacionDifusion.objects.aggregate(ultima=Max('pk'))['ultima'] or 0
+        cursor.leidas_hasta = max(cursor.leidas_hasta, ultima)
+        cursor.leidas = []
+        cursor.no_leidas = 0
+        cursor.save()
+
+
+def ocultar_difusion(usuario, difusion_id):
+
+    # "Eliminar" una difusión solo la quita de la lista de ese usuario
+    with transaction.atomic():
+        cursor = _cursor_bloqueado(usuario)
+        if difusion_id not in cursor.ocultas:
+            cursor.ocultas = sorted([*cursor.ocultas, difusion_id])
+            _avanzar_cursor(usuario, cursor, set(cursor.leidas))
+            cursor.save()
+
+
+# =============================================================================
+# RETENCIÓN Y ARCHIVO
+# =============================================================================
+
+# NOTIFICACIONES_RETENCION define por tipo cuántos días se conserva una notificación leída
+# y qué se hace después: 'archivar' (pasa a NotificacionArchivada, que se sigue listando) o
+# 'borrar'. Las difusiones de ese tipo se borran al cumplir los mismos días
+
+def politica_retencion(tipo):
+    politicas = getattr(settings, 'NOTIFICACIONES_RETENCION', {})
+    return politicas.get(tipo, politicas.get('*'))
+
+
+def candidatas_retencion(ahora=None):
+
+    # (tipo, acción, personales, difusiones) para cada tipo con política
+    ahora = ahora or timezone.now()
+    for tipo, _ in Notificacion.TIPO_CHOICES:
+        politica = politica_retencion(tipo)
+        if politica is None:
+            continue
+        dias, accion = politica
+        limite = ahora - timedelta(days=dias)
+        yield (
+            tipo,
+            accion,
+            Notificacion.objects.filter(tipo=tipo, leida=True, fecha_creacion__lt=limite),
+            NotificacionDifusion.objects.filter(tipo=tipo, fecha_creacion__lt=limite),
+        )
+
+
+def archivo_vencido(ahora=None):
+    dias = getattr(settings, 'NOTIFICACIONES_ARCHIVO_DIAS', None)
+    if dias is None:
+        return NotificacionArchivada.objects.none()
+    return NotificacionArchivada.objects.filter(fecha_creacion__lt=(ahora or timezone.now()) - timedelta(days=dias))
+
+
+def _por_lotes(consulta, procesar, lote, pausa):
+
+    # Cada lote es una transacción corta que solo bloquea sus filas; la condición se vuelve a
+    # comprobar dentro de la transacción (una notificación puede volver a "no leída")
+    procesadas = 0
+    while True:
+        with transaction.atomic():
+            ids = list(consulta.order_by().values_list('pk', flat=True)[:lote])
+            if not ids:
+                return procesadas
+            procesadas += procesar(consulta.filter(pk__in=ids))
+        if pausa:
+            time.sleep(pausa)
+
+
+def _archivar(notificaciones):
+
+    filas = list(notificaciones.select_for_update())
+    NotificacionArchivada.objects.bulk_create([
+        NotificacionArchivada(
+            id=fila.id, usuario_id=fila.usuario_id, tipo=fila.tipo, titulo=fila.titulo,
+            mensaje=fila.mensaje, leida=fila.leida, url=fila.url, fecha_creacion=fila.fecha_creacion,
+        )
+        for fila in filas
+    ])
+    Notificacion.objects.filter(pk__in=[fila.pk for fila in filas]).delete()
+    return len(filas)
+
+
+def _borrar(consulta):
+    return consulta.delete()[0]
+
+
+def podar_cursores(lote, pausa=0):
+
+    # Los ids de `leidas` y `ocultas` menores que la difusión más antigua que queda son de
+    # difusiones borradas: se quitan para que las listas no crezcan sin límite. Devuelve
+    # cuántos cursores cambiaron
+    minimo = NotificacionDifusion.objects.aggregate(minimo=Min('pk'))['minimo']
+    vigente = (lambda pk: pk >= minimo) if minimo is not None else (lambda pk: False)
+    con_listas = CursorNotificaciones.objects.exclude(leidas=[], ocultas=[]).order_by('pk')
+    podados = 0
+    ultimo = None
+    while True:
+        with transaction.atomic():
+            pagina = con_listas if ultimo is None else con_listas.filter(pk__gt=ultimo)
+            cursores = list(pagina.select_for_update()[:lote])
+            if not cursores:
+                return podados
+            for cursor in cursores:
+                leidas = [pk for pk in cursor.leidas if vigente(pk)]
+                ocultas = [pk for pk in cursor.ocultas if vigente(pk)]
+                if (leidas, ocultas) != (cursor.leidas, cursor.ocultas):
+                    cursor.leidas, cursor.ocultas = leidas, ocultas
+                    cursor.save(update_fields=['leidas', 'ocultas', 'fecha_actualizacion'])
+                    podados += 1
+            ultimo = cursores[-1].pk
+        if pausa:
+            time.sleep(pausa)
+
+
+def aplicar_retencion(lote=None, pausa=0):
+
+    # Devuelve {tipo: (acción, personales, difusiones)} más 'archivo' (archivadas vencidas) y
+    # 'cursores' (cursores con ids de difusiones borradas quitados)
+    lote = lote or getattr(settings, 'NOTIFICACIONES_RETENCION_LOTE', 1000)
+    resultado = {}
+    for tipo, accion, personales, difusiones in candidatas_retencion():
+        procesar = _archivar if accion == 'archivar' else _borrar
+        cantidad_personales = _por_lotes(personales, procesar, lote, pausa)
+        cantidad_difusiones = _por_lotes(difusiones, _borrar, lote, pausa)
+        if cantidad_personales or cantidad_difusiones:
+            resultado[tipo] = (accion, cantidad_personales, cantidad_difusiones)
+
+    resultado['archivo'] = _por_lotes(archivo_vencido(), _borrar, lote, pausa)
+    resultado['cursores'] = podar_cursores(lote, pausa)
+    return resultado
+
+
+def compactar_tablas():
+
+    # Tras borrar muchas filas InnoDB no devuelve el espacio ni reordena los índices hasta
+    # reconstruir la tabla. En otros motores no hace nada
+    if connection.vendor != 'mysql':
+        return []
+    tablas = [modelo._meta.db_table for modelo in (Notificacion, NotificacionDifusion, NotificacionArchivada)]
+    with connection.cursor() as cursor:
+        cursor.execute('OPTIMIZE TABLE ' + ', '.join(map(connection.ops.quote_name, tablas)))
+    return tablas
+
@@ -0,0 +1,148 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginacionKeyset(BasePagination):
+
+    cursor_query_param = 'cursor'
+    mensaje_cursor_invalido = 'Cursor inválido'
+
+    def __init__(self, campos, page_size):
+        # campos = (campo_orden, campo_desempate); ambos se recorren en orden descendente
+        self.campo, self.desempate = campos
+        self.page_size = page_size
+
+    def codificar_cursor(self, valor, desempate, atras=False):
+
+        if hasattr(valor, 'isoformat'):
+            valor = valor.isoformat()
+        datos = json.dumps([valor, desempate, int(atras)], separators=(',', ':'))
+        return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+    def decodificar_cursor(self, cursor, modelo):
+
+        # El cursor llega del cliente: cada valor se convierte con su campo antes de llegar al filtro
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            if not isinstance(datos, list) or len(datos) != 3 or datos[2] not in (0, 1):
+                raise ValueError(cursor)
+            valor = modelo._meta.get_field(self.campo).to_python(datos[0])
+            desempate = modelo._meta.get_field(self.desempate).to_python(datos[1])
+            if valor is None or desempate is None:
+                raise ValueError(cursor)
+            return valor, desempate, bool(datos[2])
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.mensaje_cursor_invalido)
+
+    def filtro_posterior(self, valor, desempate):
+
+        return Q(**{f'{self.campo}__lt': valor}) | Q(**{self.campo: valor, f'{self.desempate}__lt': desempate})
+
+    def filtro_anterior(self, valor, desempate):
+
+        return Q(**{f'{self.campo}__gt': valor}) | Q(**{self.campo: valor, f'{self.desempate}__gt': desempate})
+
+    def paginate_queryset(self, queryset, request, view=None):
+
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.atras = False
+        if cursor:
+            valor, desempate, self.atras = self.decodificar_cursor(cursor, queryset.model)
+            if self.atras:
+                queryset = queryset.filter(self.filtro_anterior(valor, desempate))
+            else:
+                queryset = queryset.filter(self.filtro_posterior(valor, desempate))
+
+        if self.atras:
+            queryset = queryset.order_by(self.campo, self.desempate)
+        else:
+            queryset = queryset.order_by(f'-{self.campo}', f'-{self.desempate}')
+
+        resultados = list(queryset[:self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+        if self.atras:
+            resultados.reverse()
+
+        self.hay_siguiente = hay_mas if not self.atras else bool(cursor)
+        self.hay_anterior = bool(cursor) if not self.atras else hay_mas
+        self.resultados = resultados
+        return resultados
+
+    def _clave(self, objeto):
+        return getattr(objeto, self.campo), getattr(objeto, self.desempate)
+
+    def get_next_link(self):
+
+        if not self.hay_siguiente or not self.resultados:
+            return None
+        valor, desempate = self._clave(self.resultados[-1])
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.codificar_cursor(valor, desempate))
+
+    def get_previous_link(self):
+
+        if not self.hay_anterior or not self.resultados:
+            return None
+        valor, desempate = self._clave(self.resultados[0])
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.codificar_cursor(valor, desempate, atras=True))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class PaginacionSeleccionable(PageNumberPagination):
+
+    # ?paginacion=cursor activa el modo keyset; por defecto se mantiene la paginación por número de página
+    modo_query_param = 'paginacion'
+    # Parámetros que imponen su propio orden (relevancia, distancia): el keyset los ignoraría
+    parametros_sin_cursor = ('search', 'cerca_de')
+
+    def _usa_cursor(self, request):
+        return (
+            request.query_params.get(self.modo_query_param) == 'cursor'
+            or PaginacionKeyset.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+
+        self.keyset = None
+        campos = getattr(view, 'campos_keyset', None)
+        if campos and self._usa_cursor(request):
+            incompatibles = [param for param in self.parametros_sin_cursor if request.query_params.get(param)]
+            if incompatibles:
+                raise ValidationError({
+                    self.modo_query_param: f'La paginación por cursor no se combina con {", ".join(incompatibles)}'
+                })
+            self.keyset = PaginacionKeyset(campos, self.get_page_size(request) or self.page_size)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_previous_link()
+        return super().get_previous_link()
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .models import Mascota
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# MATRIZ DE CARACTERÍSTICAS DE MASCOTAS DISPONIBLES (POR PROCESO)
+# =============================================================================
+
+ESCALA_ENERGIA = {'BAJA': 0.0, 'MEDIA': 0.5, 'ALTA': 1.0}
+ESCALA_CUIDADO = {'BAJO': 0.0, 'MEDIO': 0.5, 'ALTO': 1.0}
+ESCALA_TAMANO = {'PEQUENO': 0.0, 'MEDIANO': 1 / 3, 'GRANDE': 2 / 3, 'GIGANTE': 1.0}
+VALOR_DESCONOCIDO = 0.5
+
+# Orden de las columnas de la matriz
+CARACTERISTICAS = (
+    'energia', 'cuidado', 'tamano',
+    'apto_ninos', 'apto_apartamento', 'sociable_perros', 'sociable_gatos',
+    'esterilizado', 'constante',
+)
+COLUMNA = {nombre: i for i, nombre in enumerate(CARACTERISTICAS)}
+
+CAMPOS_MASCOTA = (
+    'id', 'tipo_animal_id', 'nivel_energia', 'nivel_cuidado', 'tamano',
+    'apto_ninos', 'apto_apartamento', 'sociable_perros', 'sociable_gatos', 'esterilizado',
+)
+
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+
+def vector_mascota(nivel_energia, nivel_cuidado, tamano, apto_ninos, apto_apartamento,
+                   sociable_perros, sociable_gatos, esterilizado):
+
+    return (
+        ESCALA_ENERGIA.get(nivel_energia, VALOR_DESCONOCIDO),
+        ESCALA_CUIDADO.get(nivel_cuidado, VALOR_DESCONOCIDO),
+        ESCALA_TAMANO.get(tamano, VALOR_DESCONOCIDO),
+        float(apto_ninos),
+        float(apto_apartamento),
+        float(sociable_perros),
+        float(sociable_gatos),
+        float(esterilizado),
+        1.0,
+    )
+
+
+def pesos_perfil(perfil):
+
+    # El puntaje es lineal en las características de la mascota: puntaje = X @ pesos
+    pesos = np.zeros(len(CARACTERISTICAS), dtype=np.float32)
+    pesos[COLUMNA['constante']] = 5.0
+    pesos[COLUMNA['esterilizado']] = 0.25
+    pesos[COLUMNA['apto_ninos']] = 0.25
+
+    if perfil.tipo_vivienda == 'DEPARTAMENTO':
+        pesos[COLUMNA['apto_apartamento']] += 2.0
+        pesos[COLUMNA['tamano']] -= 1.0
+        pesos[COLUMNA['energia']] -= 1.0
+    elif perfil.tiene_patio:
+        pesos[COLUMNA['energia']] += 0.5
+    else:
+        pesos[COLUMNA['energia']] -= 0.5
+
+    if not perfil.experiencia_previa:
+        pesos[COLUMNA['cuidado']] -= 1.5
+        pesos[COLUMNA['energia']] -= 0.5
+
+    if perfil.tiene_mascotas:
+        # No sabemos la especie de sus mascotas: se premia la sociabilidad en general
+        factor = min(max(perfil.cantidad_mascotas, 1), 3) / 3
+        pesos[COLUMNA['sociable_perros']] += 1.0 * factor
+        pesos[COLUMNA['sociable_gatos']] += 1.0 * factor
+
+    return pesos
+
+
+class MatrizCompatibilidad:
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._construida_en = None
+        self._vaciar(capacidad=0)
+
+    def _vaciar(self, capacidad):
+        self.cantidad = 0
+        self.ids = np.zeros(capacidad, dtype=np.int64)
+        self.tipos = np.zeros(capacidad, dtype=np.int32)
+        self.activas = np.zeros(capacidad, dtype=bool)
+        # Una fila por característica y una columna por mascota: el producto recorre memoria contigua
+        self.matriz = np.zeros((len(CARACTERISTICAS), capacidad), dtype=np.float32)
+        self.filas = {}
+
+    def _vigente(self):
+        return self._construida_en is not None and time.monotonic() - self._construida_en < self.ttl
+
+    def construir(self):
+
+        filas = list(
+            Mascota.objects.filter(estado='DISPONIBLE').order_by().values_list(*CAMPOS_MASCOTA)
+        )
+        n = len(filas)
+        with self._lock:
+            self._vaciar(capacidad=max(n, 1024))
+            if n:
+                self.ids[:n] = [fila[0] for fila in filas]
+                self.tipos[:n] = [fila[1] for fila in filas]
+                self.matriz[:, :n] = np.asarray([vector_mascota(*fila[2:]) for fila in filas], dtype=np.float32).T
+                self.activas[:n] = True
+                self.filas = {mascota_id: i for i, mascota_id in enumerate(self.ids[:n].tolist())}
+            self.cantidad = n
+            self._construida_en = time.monotonic()
+        logger.debug("Matriz de compatibilidad reconstruida con %s mascotas", n)
+
+    def asegurar(self):
+
+        # Se reconstruye al vencer el TTL (cambios de otros procesos) o si hay muchas filas muertas
+        muertas = self.cantidad - int(np.count_nonzero(self.activas[:self.cantidad])) if self._construida_en else 0
+        if not self._vigente() or muertas > max(self.cantidad // 4, 1024):
+            self.construir()
+
+    def invalidar(self):
+
+        with self._lock:
+            self._construida_en = None
+
+    def _escribir(self, fila, valores):
+
+        mascota_id, tipo_animal_id, *atributos = valores
+        self.ids[fila] = mascota_id
+        self.tipos[fila] = tipo_animal_id
+        self.matriz[:, fila] = vector_mascota(*atributos)
+        self.activas[fila] = True
+        self.filas[mascota_id] = fila
+
+    def _crecer(self):
+
+        capacidad = max(len(self.ids) * 2, 1024)
+        self.ids = np.resize(self.ids, capacidad)
+        self.tipos = np.resize(self.tipos, capacidad)
+        activas = np.zeros(capacidad, dtype=bool)
+        activas[:self.cantidad] = self.activas[:self.cantidad]
+        self.activas = activas
+        matriz = np.zeros((len(CARACTERISTICAS), capacidad), dtype=np.float32)
+        matriz[:, :self.cantidad] = self.matriz[:, :self.cantidad]
+        self.matriz = matriz
+
+    def actualizar(self, mascota):
+
+        if self._construida_en is None:
+            return
+
+        with self._lock:
+            fila = self.filas.get(mascota.id)
+            if mascota.estado != 'DISPONIBLE':
+                if fila is not None:
+                    self.activas[fila] = False
+                return
+            if fila is None:
+                if self.cantidad == len(self.ids):
+                    self._crecer()
+                fila = self.cantidad
+                self.cantidad += 1
+            self._escribir(fila, tuple(getattr(mascota, campo) for campo in CAMPOS_MASCOTA))
+
+    def quitar(self, mascota_id):
+
+        if self._construida_en is None:
+            return
+
+        with self._lock:
+            fila = self.filas.get(mascota_id)
+            if fila is not None:
+                self.activas[fila] = False
+
+    def recomendar(self, pesos, limite=LIMITE_POR_DEFECTO, tipo_animal_id=None):
+
+        self.asegurar()
+        with self._lock:
+            n = self.cantidad
+            puntajes = pesos @ self.matriz[:, :n]
+            validas = self.activas[:n]
+            if tipo_animal_id is not None:
+                validas = validas & (self.tipos[:n] == tipo_animal_id)
+            np.putmask(puntajes, ~validas, -np.inf)
+
+            limite = min(limite, int(np.count_nonzero(validas)))
+            if limite <= 0:
+                return []
+            # argpartition es O(n): solo se ordenan los K mejores
+            mejores = np.argpartition(puntajes, n - limite)[n - limite:]
+            ids = self.ids[mejores]
+
+        orden = np.lexsort((-ids, -puntajes[mejores]))
+        return [(int(ids[i]), round(float(puntajes[mejores[i]]), 3)) for i in orden]
+
+
+matriz_compatibilidad = MatrizCompatibilidad(ttl=getattr(settings, 'RECOMENDADOR_TTL', 300))
@@ -1,24 +1,100 @@
+import math
+
 from rest_framework import serializers
 from django.db.models import Prefetch
 from .models import (
     CustomUser, Refugio, ContactoRefugio, RedSocialRefugio, SolicitudAdopcion, PerfilAdoptante, Adopcion, VisitaSeguimiento, FotoVisita,
     Mascota, TipoAnimal, Raza, TipoVacuna, VacunaMascota,
     Campana, ParticipacionCampana, Tip, ResenaRefugio, EventoVoluntariado, InscripcionVoluntariado, Documento,
-    Notificacion, MascotaFavorita, TipFavorito, ItemInventario
+    SubidaDocumento, Notificacion, MascotaFavorita, TipFavorito, ItemInventario
 )
+from .descargas import url_descarga
+from .imagenes import estados_imagenes, placeholder_vigente, srcset
+from .subidas import tamano_maximo_documento, tamano_trozo, validar_extension
+
+
+def distancia_redondeada(obj):
+    
+    # Solo viene anotada cuando se filtra con ?cerca_de=
+    distancia = getattr(obj, 'distancia_km', None)
+    return round(distancia, 2) if distancia is not None else None
+
+
+class SrcsetField(serializers.ReadOnlyField):
+
+    # Derivados thumb / card / full (WebP y JPEG) de la imagen indicada en source, o
+    # {'estado': 'procesando'} mientras el worker no los genera
+    def to_representation(self, archivo):
+        if not archivo:
+            return None
+
+        # Una sola consulta por respuesta: el contexto es el mismo para todos los serializers anidados
+        contexto = self.context
+        if '_estados_imagenes' not in contexto:
+            contexto['_estados_imagenes'] = estados_imagenes()
+        estado = contexto['_estados_imagenes'].get(archivo.name)
+        if estado:
+            return {'estado': estado}
+        return {'estado': 'listo', **srcset(archivo.name, contexto.get('request'))}
+
+
+class PlaceholderField(serializers.Field):
+
+    # {'lqip': data URI, 'color': '#rrggbb'} de la foto indicada; source apunta a la mascota
+    def __init__(self, campo, **kwargs):
+        self.campo = campo
+        kwargs.setdefault('source', '*')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, mascota):
+        return placeholder_vigente(mascota, self.campo)
+
+
+class DescargaField(serializers.ReadOnlyField):
+
+    # URL firmada del endpoint de descarga protegida para el archivo indicado en source
+    def __init__(self, tipo, **kwargs):
+        self.tipo = tipo
+        super().__init__(**kwargs)
+
+    def to_representation(self, archivo):
+        request = self.context.get('request')
+        if not archivo or request is None or not request.user.is_authenticated:
+            return None
+        return url_descarga(request, self.tipo, archivo.instance.pk)
+
+
+class CamposDinamicosMixin:
+
+    # ?fields=id,nombre limita la respuesta a esos campos (solo en lecturas y en el serializer raíz)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        campos = request.query_params.get('fields')
+        if not campos:
+            return
+
+        pedidos = {campo.strip() for campo in campos.split(',') if campo.strip()}
+        for campo in set(self.fields) - pedidos:
+            self.fields.pop(campo)
 
 
 # =============================================================================
 # USUARIOS
 # =============================================================================
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     foto_perfil = serializers.SerializerMethodField()
+    foto_perfil_srcset = SrcsetField(source='foto_perfil')
 
     class Meta:
         model = CustomUser
         fields = ['id', 'username', 'email', 'first_name', 'last_name',
-                  'tipo_usuario', 'telefono', 'foto_perfil', 'date_joined']
+                  'tipo_usuario', 'telefono', 'foto_perfil', 'foto_perfil_srcset', 'date_joined']
         read_only_fields = ['date_joined']
 
     def get_foto_perfil(self, obj):
@@ -35,45 +111,68 @@ class CustomUserSerializer(serializers.ModelSerializer):
 # REFUGIO
 # =============================================================================
 
-class ContactoRefugioSerializer(serializers.ModelSerializer):
+class ContactoRefugioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = ContactoRefugio
         fields = ['id', 'tipo', 'valor', 'principal']
 
 
-class RedSocialRefugioSerializer(serializers.ModelSerializer):
+class RedSocialRefugioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = RedSocialRefugio
         fields = ['id', 'plataforma', 'url']
 
 
-class RefugioSerializer(serializers.ModelSerializer):
+def validar_finito(valor):
+
+    # NaN pasa cualquier comparación con min_value/max_value
+    if valor is not None and not math.isfinite(valor):
+        raise serializers.ValidationError('Debe ser un número finito.')
+
+
+# Coordenadas fuera de rango romperían el geohash y el cálculo de distancias
+RANGO_COORDENADAS = {
+    'latitud': {'min_value': -90, 'max_value': 90, 'validators': [validar_finito]},
+    'longitud': {'min_value': -180, 'max_value': 180, 'validators': [validar_finito]},
+}
+
+
+class RefugioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     contactos = ContactoRefugioSerializer(many=True, read_only=True)
     redes_sociales = RedSocialRefugioSerializer(many=True, read_only=True)
     user_email = serializers.EmailField(source='user.email', read_only=True)
+    logo_srcset = SrcsetField(source='logo')
+    portada_srcset = SrcsetField(source='portada')
+    documento_verificacion_descarga = DescargaField('verificaciones', source='documento_verificacion')
     
     class Meta:
         model = Refugio
         fields = [
             'user', 'nombre', 'descripcion', 'anio_fundacion', 'capacidad',
-            'documento_verificacion', 'verificado', 'logo', 'portada',
-            'direccion', 'ciudad', 'region', 'horario_atencion',
+            'documento_verificacion', 'documento_verificacion_descarga', 'verificado', 'logo', 'portada', 'logo_srcset', 'portada_srcset',
+            'direccion', 'ciudad', 'region', 'latitud', 'longitud', 'horario_atencion',
             'contactos', 'redes_sociales', 'user_email'
         ]
         read_only_fields = ['user', 'verificado']
+        # El archivo solo se sube por aquí; se descarga por documento_verificacion_descarga
+        extra_kwargs = {**RANGO_COORDENADAS, 'documento_verificacion': {'write_only': True}}
 
 
-class RefugioUpdateSerializer(serializers.ModelSerializer):
+class RefugioUpdateSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     contactos = ContactoRefugioSerializer(many=True, required=False)
     redes_sociales = RedSocialRefugioSerializer(many=True, required=False)
+    logo_srcset = SrcsetField(source='logo')
+    portada_srcset = SrcsetField(source='portada')
     
     class Meta:
         model = Refugio
         fields = [
             'nombre', 'descripcion', 'anio_fundacion', 'capacidad',
-            'logo', 'portada', 'direccion', 'ciudad', 'region',
+            'logo', 'portada', 'logo_srcset', 'portada_srcset', 'direccion', 'ciudad', 'region',
+            'latitud', 'longitud',
             'horario_atencion', 'contactos', 'redes_sociales'
         ]
+        extra_kwargs = RANGO_COORDENADAS
     
     def update(self, instance, validated_data):
         contactos_data = validated_data.pop('contactos', None)
@@ -96,18 +195,22 @@ class RefugioUpdateSerializer(serializers.ModelSerializer):
         return instance
 
 
-class RefugioPublicoSerializer(serializers.ModelSerializer):
+class RefugioPublicoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     
     contactos = ContactoRefugioSerializer(many=True, read_only=True)
     calificacion_promedio = serializers.SerializerMethodField()
     total_resenas = serializers.SerializerMethodField()
     total_mascotas = serializers.SerializerMethodField()
+    distancia_km = serializers.SerializerMethodField()
+    logo_srcset = SrcsetField(source='logo')
+    portada_srcset = SrcsetField(source='portada')
     
     class Meta:
         model = Refugio
         fields = [
             'user', 'nombre', 'descripcion', 'anio_fundacion',
-            'logo', 'portada', 'direccion', 'ciudad', 'region',
+            'logo', 'portada', 'logo_srcset', 'portada_srcset', 'direccion', 'ciudad', 'region',
+            'latitud', 'longitud', 'distancia_km',
             'horario_atencion', 'contactos',
             'calificacion_promedio', 'total_resenas', 'total_mascotas'
         ]
@@ -124,19 +227,22 @@ class RefugioPublicoSerializer(serializers.ModelSerializer):
     
     def get_total_mascotas(self, obj):
         return obj.mascotas.count()
+    
+    def get_distancia_km(self, obj):
+        return distancia_redondeada(obj)
 
 
 # =============================================================================
 # MASCOTAS
 # =============================================================================
 
-class TipoAnimalSerializer(serializers.ModelSerializer):
+class TipoAnimalSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = TipoAnimal
         fields = ['id', 'nombre', 'activo']
 
 
-class RazaSerializer(serializers.ModelSerializer):
+class RazaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     tipo_animal_nombre = serializers.CharField(source='tipo_animal.nombre', read_only=True)
     
     class Meta:
@@ -144,7 +250,7 @@ class RazaSerializer(serializers.ModelSerializer):
         fields = ['id', 'nombre', 'tipo_animal', 'tipo_animal_nombre']
 
 
-class TipoVacunaSerializer(serializers.ModelSerializer):
+class TipoVacunaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     tipo_animal_nombre = serializers.CharField(source='tipo_animal.nombre', read_only=True)
     
     class Meta:
@@ -152,7 +258,7 @@ class TipoVacunaSerializer(serializers.ModelSerializer):
         fields = ['id', 'nombre', 'descripcion', 'obligatoria', 'tipo_animal', 'tipo_animal_nombre', 'activo']
 
 
-class VacunaMascotaSerializer(serializers.ModelSerializer):
+class VacunaMascotaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     tipo_vacuna_nombre = serializers.CharField(source='tipo_vacuna.nombre', read_only=True)
     tipo_vacuna_obligatoria = serializers.BooleanField(source='tipo_vacuna.obligatoria', read_only=True)
     
@@ -167,7 +273,7 @@ class VacunaMascotaSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class MascotaSerializer(serializers.ModelSerializer):
+class MascotaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     tipo_animal_nombre = serializers.CharField(source='tipo_animal.nombre', read_only=True)
     raza_nombre = serializers.CharField(source='raza.nombre', read_only=True, allow_null=True)
     refugio_nombre = serializers.CharField(source='refugio.nombre', read_only=True)
@@ -176,6 +282,9 @@ class MascotaSerializer(serializers.ModelSerializer):
     foto_principal = serializers.ImageField(required=False, allow_null=True)
     foto_2 = serializers.ImageField(required=False, allow_null=True)
     foto_3 = serializers.ImageField(required=False, allow_null=True)
+    foto_principal_srcset = SrcsetField(source='foto_principal')
+    foto_2_srcset = SrcsetField(source='foto_2')
+    foto_3_srcset = SrcsetField(source='foto_3')
 
     class Meta:
         model = Mascota
@@ -201,6 +310,7 @@ class MascotaSerializer(serializers.ModelSerializer):
 
 
             'foto_principal', 'foto_2', 'foto_3',
+            'foto_principal_srcset', 'foto_2_srcset', 'foto_3_srcset',
 
 
             'estado', 'fecha_ingreso'
@@ -249,7 +359,7 @@ class MascotaSerializer(serializers.ModelSerializer):
         return value
 
 
-class MascotaPublicaSerializer(serializers.ModelSerializer):
+class MascotaPublicaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     
     tipo_animal_nombre = serializers.CharField(source='tipo_animal.nombre', read_only=True)
     raza_nombre = serializers.CharField(source='raza.nombre', read_only=True)
@@ -259,6 +369,13 @@ class MascotaPublicaSerializer(serializers.ModelSerializer):
     vacunas_aplicadas = VacunaMascotaSerializer(many=True, read_only=True)
     
     whatsapp = serializers.SerializerMethodField()
+    distancia_km = serializers.SerializerMethodField()
+    foto_principal_srcset = SrcsetField(source='foto_principal')
+    foto_2_srcset = SrcsetField(source='foto_2')
+    foto_3_srcset = SrcsetField(source='foto_3')
+    foto_principal_placeholder = PlaceholderField('foto_principal')
+    foto_2_placeholder = PlaceholderField('foto_2')
+    foto_3_placeholder = PlaceholderField('foto_3')
     
     class Meta:
         model = Mascota
@@ -269,10 +386,50 @@ class MascotaPublicaSerializer(serializers.ModelSerializer):
             'nivel_energia', 'nivel_cuidado',
             'apto_ninos', 'apto_apartamento', 'sociable_perros', 'sociable_gatos',
             'foto_principal', 'foto_2', 'foto_3',
+            'foto_principal_srcset', 'foto_2_srcset', 'foto_3_srcset',
+            'foto_principal_placeholder', 'foto_2_placeholder', 'foto_3_placeholder',
             'esterilizado', 'desparasitado', 'microchip',
             'vacunas_aplicadas',
             'refugio_nombre', 'refugio_ciudad', 'refugio_region',
-            'whatsapp', 
+            'whatsapp', 'distancia_km', 
+            'fecha_ingreso'
+        ]
+    
+    def get_whatsapp(self, obj):
+        if hasattr(obj, 'whatsapp_principal') and obj.whatsapp_principal:
+            return obj.whatsapp_principal[0].valor
+        return None
+    
+    def get_distancia_km(self, obj):
+        return distancia_redondeada(obj)
+
+
+class MascotaPublicaListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    
+    # Tarjeta del catálogo: total_vacunas y vacunas_obligatorias_al_dia vienen anotados desde SQL
+    tipo_animal_nombre = serializers.CharField(source='tipo_animal.nombre', read_only=True)
+    raza_nombre = serializers.CharField(source='raza.nombre', read_only=True)
+    refugio_nombre = serializers.CharField(source='refugio.nombre', read_only=True)
+    refugio_ciudad = serializers.CharField(source='refugio.ciudad', read_only=True)
+    refugio_region = serializers.CharField(source='refugio.region', read_only=True)
+    total_vacunas = serializers.IntegerField(read_only=True)
+    vacunas_obligatorias_al_dia = serializers.BooleanField(read_only=True)
+    
+    whatsapp = serializers.SerializerMethodField()
+    distancia_km = serializers.SerializerMethodField()
+    foto_principal_srcset = SrcsetField(source='foto_principal')
+    foto_principal_placeholder = PlaceholderField('foto_principal')
+    
+    class Meta:
+        model = Mascota
+        fields = [
+            'id', 'nombre', 'tipo_animal_nombre', 'raza_nombre',
+            'sexo', 'edad', 'tamano', 'color', 'nivel_energia',
+            'apto_ninos', 'apto_apartamento', 'sociable_perros', 'sociable_gatos',
+            'foto_principal', 'foto_principal_srcset', 'foto_principal_placeholder',
+            'total_vacunas', 'vacunas_obligatorias_al_dia',
+            'refugio_nombre', 'refugio_ciudad', 'refugio_region',
+            'whatsapp', 'distancia_km',
             'fecha_ingreso'
         ]
     
@@ -280,13 +437,16 @@ class MascotaPublicaSerializer(serializers.ModelSerializer):
         if hasattr(obj, 'whatsapp_principal') and obj.whatsapp_principal:
             return obj.whatsapp_principal[0].valor
         return None
+    
+    def get_distancia_km(self, obj):
+        return distancia_redondeada(obj)
 
 
 # =============================================================================
 # ADOPTANTE
 # =============================================================================
 
-class PerfilAdoptanteSerializer(serializers.ModelSerializer):
+class PerfilAdoptanteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     usuario_nombre = serializers.SerializerMethodField()
     usuario_email = serializers.SerializerMethodField()
     
@@ -352,9 +512,10 @@ class PerfilAdoptanteSerializer(serializers.ModelSerializer):
 # ADOPCIÓN
 # =============================================================================
 
-class SolicitudAdopcionSerializer(serializers.ModelSerializer):
+class SolicitudAdopcionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     mascota_nombre = serializers.CharField(source='mascota.nombre', read_only=True)
     mascota_foto = serializers.ImageField(source='mascota.foto_principal', read_only=True)
+    mascota_foto_srcset = SrcsetField(source='mascota.foto_principal')
     mascota_tipo = serializers.CharField(source='mascota.tipo_animal.nombre', read_only=True)
     mascota_raza = serializers.CharField(source='mascota.raza.nombre', read_only=True)
     mascota_edad = serializers.CharField(source='mascota.edad', read_only=True)
@@ -367,7 +528,7 @@ class SolicitudAdopcionSerializer(serializers.ModelSerializer):
     class Meta:
         model = SolicitudAdopcion
         fields = [
-            'id', 'mascota', 'mascota_nombre', 'mascota_foto', 
+            'id', 'mascota', 'mascota_nombre', 'mascota_foto', 'mascota_foto_srcset',
             'mascota_tipo', 'mascota_raza', 'mascota_edad',
             'adoptante', 'adoptante_nombre', 'adoptante_email',
             'refugio_nombre', 'refugio_ciudad',
@@ -385,7 +546,7 @@ class SolicitudAdopcionSerializer(serializers.ModelSerializer):
 # CAMPAÑAS
 # =============================================================================
 
-class ParticipacionCampanaSerializer(serializers.ModelSerializer):
+class ParticipacionCampanaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     usuario_nombre = serializers.CharField(source='usuario.username', read_only=True)
     usuario_id = serializers.IntegerField(source='usuario.id', read_only=True)
     usuario_email = serializers.EmailField(source='usuario.email', read_only=True)
@@ -402,16 +563,17 @@ class ParticipacionCampanaSerializer(serializers.ModelSerializer):
         read_only_fields = ['usuario', 'created_at']
 
 
-class CampanaSerializer(serializers.ModelSerializer):
+class CampanaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     refugio_nombre = serializers.CharField(source='refugio.nombre', read_only=True)
     progreso_porcentaje = serializers.ReadOnlyField()
     total_participantes = serializers.SerializerMethodField()
     usuario_participa = serializers.SerializerMethodField()
+    imagen_srcset = SrcsetField(source='imagen')
     
     class Meta:
         model = Campana
         fields = [
-            'id', 'titulo', 'descripcion', 'imagen',
+            'id', 'titulo', 'descripcion', 'imagen', 'imagen_srcset',
             'fecha_inicio', 'fecha_fin',
             'tipo_kpi', 'meta_kpi', 'valor_actual_kpi',
             'estado', 'refugio', 'refugio_nombre',
@@ -480,15 +642,16 @@ class CampanaSerializer(serializers.ModelSerializer):
 # TIPS
 # =============================================================================
 
-class TipSerializer(serializers.ModelSerializer):
+class TipSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     refugio_nombre = serializers.CharField(source='refugio.nombre', read_only=True)
     tipo_animal_nombre = serializers.CharField(source='tipo_animal.nombre', read_only=True)
     imagen = serializers.SerializerMethodField()
+    imagen_srcset = SrcsetField(source='imagen')
 
     class Meta:
         model = Tip
         fields = [
-            'id', 'titulo', 'contenido', 'categoria', 'imagen',
+            'id', 'titulo', 'contenido', 'categoria', 'imagen', 'imagen_srcset',
             'tipo_animal', 'tipo_animal_nombre',
             'refugio', 'refugio_nombre', 'publicado',
             'created_at', 'updated_at'
@@ -505,13 +668,13 @@ class TipSerializer(serializers.ModelSerializer):
         return None
 
 
-class TipCreateUpdateSerializer(serializers.ModelSerializer):
-    
+class TipCreateUpdateSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    imagen_srcset = SrcsetField(source='imagen')
 
     class Meta:
         model = Tip
         fields = [
-            'id', 'titulo', 'contenido', 'categoria', 'imagen',
+            'id', 'titulo', 'contenido', 'categoria', 'imagen', 'imagen_srcset',
             'tipo_animal', 'refugio', 'publicado',
             'created_at', 'updated_at'
         ]
@@ -522,7 +685,7 @@ class TipCreateUpdateSerializer(serializers.ModelSerializer):
 # RESEÑAS
 # =============================================================================
 
-class ResenaRefugioSerializer(serializers.ModelSerializer):
+class ResenaRefugioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     usuario_nombre = serializers.SerializerMethodField()
     
     class Meta:
@@ -545,13 +708,13 @@ class ResenaRefugioSerializer(serializers.ModelSerializer):
 # ADOPCIONES-SEGUIMIENTO
 # =============================================================================
 
-class FotoVisitaSerializer(serializers.ModelSerializer):
-    
+class FotoVisitaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    imagen_srcset = SrcsetField(source='imagen')
 
     class Meta:
         model = FotoVisita
         fields = [
-            'id', 'visita', 'imagen', 'descripcion',
+            'id', 'visita', 'imagen', 'imagen_srcset', 'descripcion',
             'orden', 'fecha_subida'
         ]
         read_only_fields = ['fecha_subida']
@@ -559,7 +722,7 @@ class FotoVisitaSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         
         data = super().to_representation(instance)
-        if instance.imagen:
+        if instance.imagen and 'imagen' in data:
             request = self.context.get('request')
             if request:
                 data['imagen'] = request.build_absolute_uri(instance.imagen.url)
@@ -568,7 +731,29 @@ class FotoVisitaSerializer(serializers.ModelSerializer):
         return data
 
 
-class VisitaSeguimientoSerializer(serializers.ModelSerializer):
+class LoteFotosVisitaSerializer(serializers.Serializer):
+
+    # Subida de varias fotos de una visita en un solo request (multipart: imagenes=... repetido)
+    visita = serializers.IntegerField()
+    imagenes = serializers.ListField(
+        child=serializers.ImageField(),
+        min_length=1,
+        max_length=FotoVisita.MAXIMO_POR_VISITA,
+    )
+    descripciones = serializers.ListField(
+        child=serializers.CharField(max_length=200, allow_blank=True),
+        required=False,
+        default=list,
+    )
+
+    def validate(self, attrs):
+
+        if len(attrs['descripciones']) > len(attrs['imagenes']):
+            raise serializers.ValidationError({'descripciones': 'Hay más descripciones que imágenes.'})
+        return attrs
+
+
+class VisitaSeguimientoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     fotos = FotoVisitaSerializer(many=True, read_only=True)
     realizada_por_nombre = serializers.CharField(
         source='realizada_por.get_full_name',
@@ -617,7 +802,7 @@ class VisitaSeguimientoSerializer(serializers.ModelSerializer):
         ]
 
 
-class AdopcionSerializer(serializers.ModelSerializer):
+class AdopcionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     
     mascota_nombre = serializers.CharField(
         source='solicitud.mascota.nombre',
@@ -627,6 +812,7 @@ class AdopcionSerializer(serializers.ModelSerializer):
         source='solicitud.mascota.foto_principal',
         read_only=True
     )
+    mascota_foto_srcset = SrcsetField(source='solicitud.mascota.foto_principal')
     adoptante_nombre = serializers.CharField(
         source='solicitud.adoptante.get_full_name',
         read_only=True
@@ -663,13 +849,14 @@ class AdopcionSerializer(serializers.ModelSerializer):
 
     
     visitas = VisitaSeguimientoSerializer(many=True, read_only=True)
+    documento_contrato_descarga = DescargaField('contratos', source='documento_contrato')
 
     class Meta:
         model = Adopcion
         fields = [
             'id', 'solicitud',
             
-            'mascota_nombre', 'mascota_foto',
+            'mascota_nombre', 'mascota_foto', 'mascota_foto_srcset',
             'adoptante_nombre', 'adoptante_email',
 
             
@@ -690,7 +877,7 @@ class AdopcionSerializer(serializers.ModelSerializer):
             'visitas_planificadas',
 
             
-            'contrato_firmado', 'documento_contrato',
+            'contrato_firmado', 'documento_contrato', 'documento_contrato_descarga',
             'notas', 'recordatorio_enviado',
 
         
@@ -705,9 +892,10 @@ class AdopcionSerializer(serializers.ModelSerializer):
             'strikes_restantes',
             'puede_agregar_strike', 'puede_quitar_strike', 'puede_finalizar',
         ]
+        extra_kwargs = {'documento_contrato': {'write_only': True}}
 
 
-class AdopcionListSerializer(serializers.ModelSerializer):
+class AdopcionListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     mascota_nombre = serializers.CharField(
         source='solicitud.mascota.nombre',
         read_only=True
@@ -716,6 +904,7 @@ class AdopcionListSerializer(serializers.ModelSerializer):
         source='solicitud.mascota.foto_principal',
         read_only=True
     )
+    mascota_foto_srcset = SrcsetField(source='solicitud.mascota.foto_principal')
     adoptante_nombre = serializers.CharField(
         source='solicitud.adoptante.get_full_name',
         read_only=True
@@ -757,7 +946,7 @@ class AdopcionListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'solicitud',
             
-            'mascota_nombre', 'mascota_foto',
+            'mascota_nombre', 'mascota_foto', 'mascota_foto_srcset',
             'adoptante_nombre', 'adoptante_email',
             
             
@@ -797,7 +986,7 @@ class AdopcionListSerializer(serializers.ModelSerializer):
 # VOLUNTARIADO
 # =============================================================================
 
-class InscripcionVoluntariadoSerializer(serializers.ModelSerializer):
+class InscripcionVoluntariadoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     usuario_nombre = serializers.CharField(source='usuario.get_full_name', read_only=True)
     usuario_email = serializers.EmailField(source='usuario.email', read_only=True)
     usuario_telefono = serializers.CharField(source='usuario.telefono', read_only=True)
@@ -811,7 +1000,7 @@ class InscripcionVoluntariadoSerializer(serializers.ModelSerializer):
         read_only_fields = ['usuario', 'fecha_inscripcion']
 
 
-class EventoVoluntariadoSerializer(serializers.ModelSerializer):
+class EventoVoluntariadoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     refugio_nombre = serializers.CharField(source='refugio.nombre', read_only=True)
     refugio_ciudad = serializers.CharField(source='refugio.ciudad', read_only=True)
     cupos_ocupados = serializers.IntegerField(read_only=True)
@@ -820,6 +1009,7 @@ class EventoVoluntariadoSerializer(serializers.ModelSerializer):
     ya_paso = serializers.BooleanField(read_only=True)
     inscripciones = InscripcionVoluntariadoSerializer(many=True, read_only=True)
     usuario_inscrito = serializers.SerializerMethodField()
+    imagen_srcset = SrcsetField(source='imagen')
     
     class Meta:
         model = EventoVoluntariado
@@ -827,7 +1017,7 @@ class EventoVoluntariadoSerializer(serializers.ModelSerializer):
             'id', 'refugio', 'refugio_nombre', 'refugio_ciudad',
             'titulo', 'descripcion', 'fecha_evento', 'hora_inicio', 'hora_fin',
             'ubicacion', 'cupos_disponibles', 'cupos_ocupados', 'cupos_restantes',
-            'esta_lleno', 'ya_paso', 'estado', 'requisitos', 'imagen',
+            'esta_lleno', 'ya_paso', 'estado', 'requisitos', 'imagen', 'imagen_srcset',
             'inscripciones', 'usuario_inscrito',
             'fecha_creacion', 'fecha_actualizacion'
         ]
@@ -846,7 +1036,7 @@ class EventoVoluntariadoSerializer(serializers.ModelSerializer):
         return {'inscrito': False, 'inscripcion_id': None, 'fecha_inscripcion': None}
 
 
-class EventoVoluntariadoListSerializer(serializers.ModelSerializer):
+class EventoVoluntariadoListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     
     refugio_nombre = serializers.CharField(source='refugio.nombre', read_only=True)
     refugio_ciudad = serializers.CharField(source='refugio.ciudad', read_only=True)
@@ -856,6 +1046,7 @@ class EventoVoluntariadoListSerializer(serializers.ModelSerializer):
     ya_paso = serializers.BooleanField(read_only=True)
     total_inscritos = serializers.SerializerMethodField()
     usuario_inscrito = serializers.SerializerMethodField()
+    imagen_srcset = SrcsetField(source='imagen')
     
     class Meta:
         model = EventoVoluntariado
@@ -863,7 +1054,7 @@ class EventoVoluntariadoListSerializer(serializers.ModelSerializer):
             'id', 'refugio', 'refugio_nombre', 'refugio_ciudad',
             'titulo', 'descripcion', 'fecha_evento', 'hora_inicio', 'hora_fin',
             'ubicacion', 'cupos_disponibles', 'cupos_ocupados', 'cupos_restantes',
-            'esta_lleno', 'ya_paso', 'estado', 'imagen', 'total_inscritos',
+            'esta_lleno', 'ya_paso', 'estado', 'imagen', 'imagen_srcset', 'total_inscritos',
             'usuario_inscrito'
         ]
     
@@ -881,9 +1072,9 @@ class EventoVoluntariadoListSerializer(serializers.ModelSerializer):
 # DOCUMENTOS
 # =============================================================================
 
-class DocumentoSerializer(serializers.ModelSerializer):
+class DocumentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     
-    archivo = serializers.FileField(required=False)
+    archivo = serializers.FileField(required=False, write_only=True)
     creado_por_nombre = serializers.CharField(
         source='creado_por.get_full_name',
         read_only=True
@@ -892,41 +1083,64 @@ class DocumentoSerializer(serializers.ModelSerializer):
         source='refugio.nombre',
         read_only=True
     )
+    archivo_descarga = DescargaField('documentos', source='archivo')
 
     class Meta:
         model = Documento
         fields = [
             'id', 'nombre', 'categoria', 'tipo_archivo', 'descripcion',
-            'version', 'estado', 'archivo', 'tamano', 'fecha_creacion',
+            'version', 'estado', 'archivo', 'archivo_descarga', 'tamano', 'fecha_creacion',
             'fecha_modificacion', 'creado_por', 'creado_por_nombre',
             'refugio', 'refugio_nombre', 'descargas', 'usos'
         ]
         read_only_fields = ['fecha_creacion', 'fecha_modificacion', 'descargas', 'usos', 'creado_por', 'refugio', 'tamano']
 
-    def to_representation(self, instance):
-        
-        data = super().to_representation(instance)
-        if instance.archivo:
-            request = self.context.get('request')
-            if request:
-                data['archivo'] = request.build_absolute_uri(instance.archivo.url)
-            else:
-                data['archivo'] = instance.archivo.url
-        return data
+
+class SubidaDocumentoSerializer(serializers.ModelSerializer):
+
+    tamano_trozo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SubidaDocumento
+        fields = [
+            'id', 'nombre_archivo', 'tipo_archivo', 'tamano', 'recibidos',
+            'tamano_trozo', 'fecha_creacion', 'fecha_actualizacion'
+        ]
+        read_only_fields = ['recibidos', 'fecha_creacion', 'fecha_actualizacion']
+
+    def get_tamano_trozo(self, obj):
+        return tamano_trozo()
+
+    def validate_tamano(self, value):
+
+        if value <= 0:
+            raise serializers.ValidationError("El archivo está vacío.")
+        if value > tamano_maximo_documento():
+            raise serializers.ValidationError(
+                f"El archivo es demasiado grande. Máximo permitido: {tamano_maximo_documento() // (1024 * 1024)}MB"
+            )
+        return value
+
+    def validate(self, attrs):
+
+        validar_extension(attrs['nombre_archivo'], attrs['tipo_archivo'])
+        return attrs
 
 
 # =============================================================================
 # NOTIFICACIONES
 # =============================================================================
 
-class NotificacionSerializer(serializers.ModelSerializer):
+class NotificacionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     
+    # Las notificaciones generales (NotificacionDifusion) llegan con id negativo
+    difusion = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = Notificacion
         fields = [
             'id', 'tipo', 'titulo', 'mensaje', 'leida',
-            'url', 'fecha_creacion'
+            'url', 'fecha_creacion', 'difusion'
         ]
         read_only_fields = ['fecha_creacion']
 
@@ -935,12 +1149,14 @@ class NotificacionSerializer(serializers.ModelSerializer):
 # FAVORITOS
 # =============================================================================
 
-class MascotaFavoritaSerializer(serializers.ModelSerializer):
+class MascotaFavoritaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     
 
     mascota_nombre = serializers.CharField(source='mascota.nombre', read_only=True)
     mascota_especie = serializers.CharField(source='mascota.tipo_animal.nombre', read_only=True)
     mascota_foto = serializers.SerializerMethodField()
+    mascota_foto_srcset = SrcsetField(source='mascota.foto_principal')
+    mascota_foto_placeholder = PlaceholderField('foto_principal', source='mascota')
     refugio_nombre = serializers.CharField(source='mascota.refugio.nombre', read_only=True)
     mascota_estado = serializers.CharField(source='mascota.estado', read_only=True)
 
@@ -948,35 +1164,34 @@ class MascotaFavoritaSerializer(serializers.ModelSerializer):
         model = MascotaFavorita
         fields = [
             'id', 'mascota', 'mascota_nombre', 'mascota_especie',
-            'mascota_foto', 'refugio_nombre', 'mascota_estado',
+            'mascota_foto', 'mascota_foto_srcset', 'mascota_foto_placeholder', 'refugio_nombre', 'mascota_estado',
             'fecha_agregado'
         ]
         read_only_fields = ['fecha_agregado']
 
     def get_mascota_foto(self, obj):
-        if obj.mascota.fotos.exists():
-            foto = obj.mascota.fotos.first()
-            if foto.imagen:
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(foto.imagen.url)
-                return foto.imagen.url
+        if obj.mascota.foto_principal:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(obj.mascota.foto_principal.url)
+            return obj.mascota.foto_principal.url
         return None
 
 
-class TipFavoritoSerializer(serializers.ModelSerializer):
+class TipFavoritoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     
 
     tip_titulo = serializers.CharField(source='tip.titulo', read_only=True)
     tip_categoria = serializers.CharField(source='tip.categoria', read_only=True)
     tip_imagen = serializers.SerializerMethodField()
+    tip_imagen_srcset = SrcsetField(source='tip.imagen')
     refugio_nombre = serializers.SerializerMethodField()
 
     class Meta:
         model = TipFavorito
         fields = [
             'id', 'tip', 'tip_titulo', 'tip_categoria',
-            'tip_imagen', 'refugio_nombre', 'fecha_agregado'
+            'tip_imagen', 'tip_imagen_srcset', 'refugio_nombre', 'fecha_agregado'
         ]
         read_only_fields = ['fecha_agregado']
 
@@ -999,7 +1214,7 @@ class TipFavoritoSerializer(serializers.ModelSerializer):
 # INVENTARIO SERIALIZERS
 # =============================================================================
 
-class ItemInventarioSerializer(serializers.ModelSerializer):
+class ItemInventarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     refugio_nombre = serializers.CharField(source='refugio.nombre', read_only=True)
     bajo_stock = serializers.BooleanField(read_only=True)
     valor_total = serializers.DecimalField(
@@ -1,19 +1,45 @@
+import logging
 
-from django.db.models.signals import post_save, pre_save
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.db import transaction
 from django.dispatch import receiver
-from django.contrib.auth import get_user_model
+from django.utils import timezone
 from .models import (
     Notificacion,
+    NotificacionDifusion,
     SolicitudAdopcion,
     Tip,
     Campana,
     VisitaSeguimiento,
     EventoVoluntariado,
     Adopcion,
-    Mascota
+    Mascota,
+    Raza,
+    TipoAnimal,
+    TipoVacuna,
+    VacunaMascota,
+    Refugio,
+    ContactoRefugio,
+    ResenaRefugio,
+    ParticipacionCampana
 )
+from .busqueda import texto_indexable_mascota
+from .geo import codificar_geohash, geocodificar
+from .cache_respuestas import TAG_CAMPANAS, TAG_MASCOTAS, TAG_REFERENCIA, TAG_REFUGIOS, invalidar_tags
+from .indice_bitmap import indice_catalogo
+from .recomendador import matriz_compatibilidad
+from .similares import CAMPOS_RELEVANTES, TAREA_SIMILARES
+from .imagenes import (
+    CAMPOS_IMAGEN, CAMPOS_PLACEHOLDER, TAREA_DERIVADOS, TAREA_PLACEHOLDER, eliminar_derivados, tiene_derivados,
+)
+from .almacenamiento import ajustar_referencias, campos_archivo, es_blob
+from .notificaciones import difundir_notificacion, sumar_no_leidas
+from .tiempo_real import publicar_difusion, publicar_notificacion
+from .tareas import encolar
 
-User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 def crear_notificacion_segura(usuario, tipo, titulo, mensaje, url=''):
@@ -131,34 +157,24 @@ def notificar_nuevo_tip(sender, instance, created, **kwargs):
             publicado_ahora = True
 
     if publicado_ahora:
-        
-        usuarios = User.objects.filter(tipo_usuario='USUARIO')
-
-        for usuario in usuarios:
-            crear_notificacion_segura(
-                usuario=usuario,
-                tipo='TIP_NUEVO',
-                titulo='Nuevo consejo disponible',
-                mensaje=f'Nuevo tip: {instance.titulo}',
-                url=f'/tips/{instance.id}'
-            )
+        difundir_notificacion(
+            tipo='TIP_NUEVO',
+            titulo='Nuevo consejo disponible',
+            mensaje=f'Nuevo tip: {instance.titulo}',
+            url=f'/tips/{instance.id}'
+        )
 
 
 @receiver(post_save, sender=Campana)
 def notificar_nueva_campana(sender, instance, created, **kwargs):
     
     if created:
-        
-        usuarios = User.objects.filter(tipo_usuario='USUARIO')
-
-        for usuario in usuarios:
-            crear_notificacion_segura(
-                usuario=usuario,
-                tipo='CAMPANA_NUEVA',
-                titulo='Nueva campaña disponible',
-                mensaje=f'{instance.titulo} - ¡Descubre cómo puedes ayudar!',
-                url=f'/campanas/{instance.id}'
-            )
+        difundir_notificacion(
+            tipo='CAMPANA_NUEVA',
+            titulo='Nueva campaña disponible',
+            mensaje=f'{instance.titulo} - ¡Descubre cómo puedes ayudar!',
+            url=f'/campanas/{instance.id}'
+        )
 
 
 @receiver(post_save, sender=VisitaSeguimiento)
@@ -178,17 +194,12 @@ def notificar_visita_programada(sender, instance, created, **kwargs):
 def notificar_nuevo_evento_voluntariado(sender, instance, created, **kwargs):
     
     if created:
-        
-        usuarios = User.objects.filter(tipo_usuario='USUARIO')
-
-        for usuario in usuarios:
-            crear_notificacion_segura(
-                usuario=usuario,
-                tipo='VOLUNTARIADO_NUEVO',
-                titulo='Nuevo evento de voluntariado',
-                mensaje=f'{instance.titulo} - {instance.fecha_evento.strftime("%d/%m/%Y")} en {instance.refugio.nombre}',
-                url=f'/voluntariado/{instance.id}'
-            )
+        difundir_notificacion(
+            tipo='VOLUNTARIADO_NUEVO',
+            titulo='Nuevo evento de voluntariado',
+            mensaje=f'{instance.titulo} - {instance.fecha_evento.strftime("%d/%m/%Y")} en {instance.refugio.nombre}',
+            url=f'/voluntariado/{instance.id}'
+        )
 
 
 @receiver(post_save, sender=Adopcion)
@@ -247,3 +258,357 @@ def actualizar_campanas_por_mascota_adoptada(sender, instance, created, **kwargs
             for campana in campanas_activas:
                 campana.valor_actual_kpi += 1
                 campana.save(update_fields=['valor_actual_kpi'])
+
+
+# =============================================================================
+# ÍNDICE DE BÚSQUEDA
+# =============================================================================
+
+# Campos que alimentan texto_busqueda (update_fields puede traer el nombre o el attname)
+CAMPOS_INDEXADOS = {'nombre', 'color', 'descripcion', 'raza', 'raza_id', 'tipo_animal', 'tipo_animal_id'}
+
+
+@receiver(pre_save, sender=Mascota)
+def actualizar_texto_busqueda_mascota(sender, instance, **kwargs):
+
+    instance.texto_busqueda = texto_indexable_mascota(instance)
+
+
+@receiver(post_save, sender=Mascota)
+def guardar_texto_busqueda_parcial(sender, instance, created, update_fields=None, **kwargs):
+
+    # Un save(update_fields=[...]) que toca campos indexados sin incluir texto_busqueda no lo
+    # escribe: se guarda aparte para que el índice no quede desactualizado
+    if created or update_fields is None or 'texto_busqueda' in update_fields:
+        return
+    if CAMPOS_INDEXADOS.intersection(update_fields):
+        Mascota.objects.filter(pk=instance.pk).update(texto_busqueda=instance.texto_busqueda)
+
+
+def reindexar_mascotas(queryset, tamano_lote=500):
+
+    mascotas = queryset.select_related('raza', 'tipo_animal').only(
+        'id', 'nombre', 'color', 'descripcion', 'raza__nombre', 'tipo_animal__nombre'
+    )
+    lote = []
+    for mascota in mascotas.iterator(chunk_size=tamano_lote):
+        mascota.texto_busqueda = texto_indexable_mascota(mascota)
+        lote.append(mascota)
+        if len(lote) >= tamano_lote:
+            Mascota.objects.bulk_update(lote, ['texto_busqueda'])
+            lote = []
+    if lote:
+        Mascota.objects.bulk_update(lote, ['texto_busqueda'])
+
+
+@receiver(post_save, sender=Raza)
+def reindexar_mascotas_por_raza(sender, instance, created, **kwargs):
+
+    if not created:
+        reindexar_mascotas(Mascota.objects.filter(raza=instance))
+
+
+@receiver(post_save, sender=TipoAnimal)
+def reindexar_mascotas_por_tipo_animal(sender, instance, created, **kwargs):
+
+    if not created:
+        reindexar_mascotas(Mascota.objects.filter(tipo_animal=instance))
+
+
+# =============================================================================
+# ÍNDICES EN MEMORIA DEL CATÁLOGO (BITMAP Y RECOMENDADOR)
+# =============================================================================
+
+@receiver(post_save, sender=Mascota)
+def actualizar_indices_catalogo(sender, instance, **kwargs):
+
+    def actualizar():
+        indice_catalogo.actualizar(instance)
+        matriz_compatibilidad.actualizar(instance)
+
+    transaction.on_commit(actualizar)
+
+
+@receiver(post_delete, sender=Mascota)
+def quitar_de_indices_catalogo(sender, instance, **kwargs):
+
+    mascota_id = instance.id
+
+    def quitar():
+        indice_catalogo.quitar(mascota_id)
+        matriz_compatibilidad.quitar(mascota_id)
+
+    transaction.on_commit(quitar)
+
+
+# =============================================================================
+# MASCOTAS SIMILARES
+# =============================================================================
+
+@receiver(post_save, sender=Mascota)
+def actualizar_mascotas_similares(sender, instance, update_fields=None, **kwargs):
+
+    # Se recalcula en el worker; varios guardados seguidos de la misma mascota se funden en
+    # una sola tarea. Lo que falle lo repara el lote periódico (calcular_similares)
+    if update_fields is not None and not CAMPOS_RELEVANTES.intersection(update_fields):
+        return
+    encolar(
+        TAREA_SIMILARES,
+        clave=f'similares:{instance.pk}',
+        espera=getattr(settings, 'SIMILARES_ESPERA_SEGUNDOS', 30),
+        mascota_id=instance.pk,
+    )
+
+
+# =============================================================================
+# INVALIDACIÓN DE CACHÉ DE RESPUESTAS
+# =============================================================================
+
+TAGS_POR_MODELO = {
+    Mascota: (TAG_MASCOTAS,),
+    VacunaMascota: (TAG_MASCOTAS,),
+    Refugio: (TAG_REFUGIOS,),
+    ContactoRefugio: (TAG_REFUGIOS,),
+    ResenaRefugio: (TAG_REFUGIOS,),
+    TipoAnimal: (TAG_REFERENCIA,),
+    Raza: (TAG_REFERENCIA,),
+    TipoVacuna: (TAG_REFERENCIA,),
+    Campana: (TAG_CAMPANAS,),
+    ParticipacionCampana: (TAG_CAMPANAS,),
+}
+
+
+def invalidar_cache_modelo(sender, **kwargs):
+
+    tags = TAGS_POR_MODELO[sender]
+    transaction.on_commit(lambda: invalidar_tags(*tags))
+
+
+for modelo in TAGS_POR_MODELO:
+    post_save.connect(invalidar_cache_modelo, sender=modelo, dispatch_uid=f'invalidar_cache_{modelo.__name__}')
+    post_delete.connect(invalidar_cache_modelo, sender=modelo, dispatch_uid=f'invalidar_cache_borrado_{modelo.__name__}')
+
+
+@receiver(post_save, sender=VacunaMascota)
+@receiver(post_delete, sender=VacunaMascota)
+def tocar_mascota_por_vacuna(sender, instance, **kwargs):
+
+    # Las vacunas forman parte de la representación de la mascota (ETag / Last-Modified)
+    Mascota.objects.filter(pk=instance.mascota_id).update(fecha_actualizacion=timezone.now())
+
+
+# =============================================================================
+# GEOCODIFICACIÓN DE REFUGIOS
+# =============================================================================
+
+@receiver(pre_save, sender=Refugio)
+def geocodificar_refugio(sender, instance, **kwargs):
+
+    anterior = Refugio.objects.filter(pk=instance.pk).values(
+        'direccion', 'ciudad', 'region', 'latitud', 'longitud'
+    ).first()
+
+    ubicacion_cambio = anterior is None or any(
+        anterior[campo] != getattr(instance, campo) for campo in ('direccion', 'ciudad', 'region')
+    )
+    # Coordenadas ingresadas a mano por el refugio: se respetan
+    coordenadas_manuales = instance.latitud is not None and (
+        anterior is None or (anterior['latitud'], anterior['longitud']) != (instance.latitud, instance.longitud)
+    )
+
+    if instance.latitud is None or instance.longitud is None or (ubicacion_cambio and not coordenadas_manuales):
+        coordenadas = geocodificar(instance.ciudad, instance.region, instance.direccion)
+        if coordenadas:
+            instance.latitud, instance.longitud = coordenadas
+
+    if instance.latitud is not None and instance.longitud is not None:
+        instance.geohash = codificar_geohash(instance.latitud, instance.longitud)
+    else:
+        instance.geohash = ''
+
+
+# =============================================================================
+# CONTADORES DE NO LEÍDAS
+# =============================================================================
+
+@receiver(pre_save, sender=Notificacion)
+def guardar_leida_anterior(sender, instance, **kwargs):
+
+    if instance.pk:
+        instance._leida_anterior = Notificacion.objects.filter(pk=instance.pk).values_list('leida', flat=True).first()
+
+
+@receiver(post_save, sender=Notificacion)
+def contar_notificacion_guardada(sender, instance, created, **kwargs):
+
+    if created:
+        if not instance.leida:
+            sumar_no_leidas(instance.usuario_id, 1)
+    elif getattr(instance, '_leida_anterior', None) not in (None, instance.leida):
+        sumar_no_leidas(instance.usuario_id, -1 if instance.leida else 1)
+
+
+@receiver(post_delete, sender=Notificacion)
+def descontar_notificacion_eliminada(sender, instance, **kwargs):
+
+    if not instance.leida:
+        sumar_no_leidas(instance.usuario_id, -1)
+
+
+# =============================================================================
+# NOTIFICACIONES EN TIEMPO REAL
+# =============================================================================
+
+@receiver(post_save, sender=Notificacion)
+def publicar_notificacion_creada(sender, instance, created, **kwargs):
+
+    if created:
+        transaction.on_commit(lambda: publicar_notificacion(instance))
+
+
+@receiver(post_save, sender=NotificacionDifusion)
+def publicar_difusion_creada(sender, instance, created, **kwargs):
+
+    if created:
+        transaction.on_commit(lambda: publicar_difusion(instance))
+
+
+# =============================================================================
+# ARCHIVOS SUBIDOS (REFERENCIAS A BLOBS Y DERIVADOS DE IMÁGENES)
+# =============================================================================
+
+CAMPOS_ARCHIVO = campos_archivo()
+
+
+def _nombres_archivos(instance, campos=CAMPOS_ARCHIVO):
+
+    # Se lee __dict__ para no disparar consultas por campos diferidos (.only()). Un archivo
+    # recién asignado que todavía no se guarda no cuenta como nombre en el storage
+    nombres = {}
+    for campo in campos[type(instance)]:
+        if campo in instance.__dict__:
+            valor = instance.__dict__[campo]
+            if isinstance(valor, FieldFile):
+                nombres[campo] = valor.name if valor._committed and valor.name else ''
+            else:
+                nombres[campo] = valor if isinstance(valor, str) else ''
+    return nombres
+
+
+def recordar_archivos(sender, instance, **kwargs):
+    instance._archivos_originales = _nombres_archivos(instance)
+
+
+def registrar_archivos_guardados(sender, instance, **kwargs):
+    registrar_archivos(instance)
+
+
+def registrar_archivos(instance):
+
+    # Referencias a blobs y tareas de derivados / placeholder de los archivos que cambiaron.
+    # También se llama directamente tras un bulk_create, que no emite post_save
+    sender = type(instance)
+    anteriores = getattr(instance, '_archivos_originales', {})
+    actuales = _nombres_archivos(instance)
+    instance._archivos_originales = actuales
+
+    cambios = {
+        campo: (anteriores.get(campo, ''), nombre)
+        for campo, nombre in actuales.items()
+        if nombre != anteriores.get(campo, '')
+    }
+    if not cambios:
+        return
+
+    ajustar_referencias(
+        [nombre for _, nombre in cambios.values() if nombre],
+        [anterior for anterior, _ in cambios.values() if anterior],
+    )
+
+    for campo, (anterior, nombre) in cambios.items():
+        if campo not in CAMPOS_IMAGEN.get(sender, ()):
+            continue
+        # Los derivados de un blob son compartidos: se borran con el blob, no con la fila
+        if anterior and not es_blob(anterior):
+            transaction.on_commit(lambda anterior=anterior: eliminar_derivados(anterior))
+        if nombre and not (es_blob(nombre) and tiene_derivados(nombre)):
+            # El worker (procesar_tareas) genera los derivados fuera del request
+            encolar(
+                TAREA_DERIVADOS,
+                clave=nombre,
+                modelo=instance._meta.label,
+                pk=instance.pk,
+                campo=campo,
+                nombre=nombre,
+                tags=list(TAGS_POR_MODELO.get(sender, ())),
+            )
+        if nombre and campo in CAMPOS_PLACEHOLDER.get(sender, ()):
+            # Por fila y no por archivo: dos mascotas con la misma foto comparten el blob
+            # pero cada una guarda su placeholder
+            encolar(
+                TAREA_PLACEHOLDER,
+                clave=f'{instance._meta.label}:{instance.pk}:{campo}',
+                modelo=instance._meta.label,
+                pk=instance.pk,
+                campo=campo,
+                nombre=nombre,
+                tags=list(TAGS_POR_MODELO.get(sender, ())),
+            )
+
+
+def liberar_archivos_instancia(sender, instance, **kwargs):
+
+    nombres = _nombres_archivos(instance)
+    ajustar_referencias([], [nombre for nombre in nombres.values() if nombre])
+    for campo, nombre in nombres.items():
+        if nombre and not es_blob(nombre) and campo in CAMPOS_IMAGEN.get(sender, ()):
+            transaction.on_commit(lambda nombre=nombre: eliminar_derivados(nombre))
+
+
+for modelo in CAMPOS_ARCHIVO:
+    post_init.connect(recordar_archivos, sender=modelo, dispatch_uid=f'recordar_archivos_{modelo.__name__}')
+    post_save.connect(registrar_archivos_guardados, sender=modelo, dispatch_uid=f'archivos_guardados_{modelo.__name__}')
+    post_delete.connect(liberar_archivos_instancia, sender=modelo, dispatch_uid=f'liberar_archivos_{modelo.__name__}')
+
+
+# =============================================================================
+# ARCHIVOS PROTEGIDOS
+# =============================================================================
+
+# Documentos, contratos y verificaciones no se deduplican: cada archivo es de una sola fila
+# y se borra del storage protegido cuando la fila lo reemplaza o se elimina
+CAMPOS_PROTEGIDOS = campos_archivo(protegidos=True)
+
+
+def _borrar_protegidos(instance, nombres):
+
+    for campo, nombre in nombres:
+        storage = instance._meta.get_field(campo).storage
+        transaction.on_commit(lambda storage=storage, nombre=nombre: storage.delete(nombre))
+
+
+def recordar_protegidos(sender, instance, **kwargs):
+    instance._protegidos_originales = _nombres_archivos(instance, CAMPOS_PROTEGIDOS)
+
+
+def borrar_protegidos_reemplazados(sender, instance, **kwargs):
+
+    anteriores = getattr(instance, '_protegidos_originales', {})
+    actuales = _nombres_archivos(instance, CAMPOS_PROTEGIDOS)
+    instance._protegidos_originales = actuales
+    _borrar_protegidos(instance, [
+        (campo, anterior) for campo, anterior in anteriores.items()
+        if anterior and campo in actuales and actuales[campo] != anterior
+    ])
+
+
+def borrar_protegidos_instancia(sender, instance, **kwargs):
+
+    nombres = _nombres_archivos(instance, CAMPOS_PROTEGIDOS)
+    _borrar_protegidos(instance, [(campo, nombre) for campo, nombre in nombres.items() if nombre])
+
+
+for modelo in CAMPOS_PROTEGIDOS:
+    post_init.connect(recordar_protegidos, sender=modelo, dispatch_uid=f'recordar_protegidos_{modelo.__name__}')
+    post_save.connect(borrar_protegidos_reemplazados, sender=modelo, dispatch_uid=f'protegidos_guardados_{modelo.__name__}')
+    post_delete.connect(borrar_protegidos_instancia, sender=modelo, dispatch_uid=f'borrar_protegidos_{modelo.__name__}')
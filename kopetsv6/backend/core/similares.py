@@ -0,0 +1,303 @@
+import logging
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .geo import clave_region
+from .models import Mascota, MascotaSimilar
+from .recomendador import ESCALA_CUIDADO, ESCALA_ENERGIA, ESCALA_TAMANO, VALOR_DESCONOCIDO
+from .tareas import registrar_tarea
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# DISTANCIA ENTRE MASCOTAS
+# =============================================================================
+
+ESCALA_EDAD = {'CACHORRO': 0.0, 'JOVEN': 1 / 3, 'ADULTO': 2 / 3, 'SENIOR': 1.0}
+
+# Peso de cada atributo en la distancia; el tipo de animal no pesa porque solo se
+# comparan mascotas del mismo tipo
+PESOS_NUMERICOS = np.array([
+    1.0,    # edad
+    1.0,    # tamano
+    0.75,   # energia
+    0.5,    # cuidado
+    0.25,   # apto_ninos
+    0.25,   # apto_apartamento
+    0.25,   # sociable_perros
+    0.25,   # sociable_gatos
+], dtype=np.float32)
+PESO_RAZA = 1.0
+PESO_REGION = 0.5
+
+CAMPOS_MASCOTA = (
+    'id', 'estado', 'raza_id', 'refugio__region', 'edad', 'tamano', 'nivel_energia', 'nivel_cuidado',
+    'apto_ninos', 'apto_apartamento', 'sociable_perros', 'sociable_gatos',
+)
+# Cambios que no alteran el vecindario no recalculan nada
+CAMPOS_RELEVANTES = {
+    'estado', 'tipo_animal', 'raza', 'refugio', 'edad', 'tamano', 'nivel_energia', 'nivel_cuidado',
+    'apto_ninos', 'apto_apartamento', 'sociable_perros', 'sociable_gatos',
+}
+
+TAMANO_BLOQUE = 512
+
+
+def similares_por_mascota():
+    return getattr(settings, 'SIMILARES_POR_MASCOTA', 12)
+
+
+class GrupoMascotas:
+
+    # Mascotas publicadas de un tipo de animal en forma de arreglos: las disponibles son
+    # candidatas a similar y todas (también adoptadas o reservadas) tienen su lista.
+    # Las distancias dependen solo de atributos categóricos, así que muchas mascotas
+    # comparten perfil (mismos atributos, raza y región): se calculan entre perfiles
+
+    def __init__(self, filas):
+
+        codigos_region = {}
+        self.ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+        self.disponibles = np.array([fila[1] == 'DISPONIBLE' for fila in filas], dtype=bool)
+        razas = np.array([fila[2] or 0 for fila in filas], dtype=np.int64)
+        regiones = np.array(
+            [codigos_region.setdefault(clave_region(fila[3] or ''), len(codigos_region)) for fila in filas],
+            dtype=np.int64
+        )
+        numericos = np.array([
+            (
+                ESCALA_EDAD.get(edad, VALOR_DESCONOCIDO),
+                ESCALA_TAMANO.get(tamano, VALOR_DESCONOCIDO),
+                ESCALA_ENERGIA.get(energia, VALOR_DESCONOCIDO),
+                ESCALA_CUIDADO.get(cuidado, VALOR_DESCONOCIDO),
+                *banderas,
+            )
+            for _, _, _, _, edad, tamano, energia, cuidado, *banderas in filas
+        ], dtype=np.float32).reshape(len(filas), len(PESOS_NUMERICOS))
+
+        columnas = len(PESOS_NUMERICOS)
+        perfiles, self.perfil = np.unique(
+            np.column_stack([numericos, razas, regiones]).astype(np.float64), axis=0, return_inverse=True
+        )
+        self.perfil = self.perfil.reshape(-1)
+        # Escalando por la raíz del peso, la distancia euclidiana al cuadrado queda ponderada
+        self.numericos = perfiles[:, :columnas].astype(np.float32) * np.sqrt(PESOS_NUMERICOS)
+        self.normas = np.einsum('ij,ij->i', self.numericos, self.numericos)
+        self.razas = perfiles[:, columnas].astype(np.int64)
+        self.regiones = perfiles[:, columnas + 1].astype(np.int64)
+
+        # Candidatas agrupadas por perfil, las más recientes primero
+        candidatas = np.flatnonzero(self.disponibles)
+        self.candidatas = candidatas[np.lexsort((-self.ids[candidatas], self.perfil[candidatas]))]
+        self.inicio_perfil = np.searchsorted(self.perfil[self.candidatas], np.arange(len(perfiles) + 1))
+        self.sin_candidatas = np.diff(self.inicio_perfil) == 0
+
+    @classmethod
+    def del_tipo(cls, tipo_animal_id):
+
+        filas = list(
+            Mascota.objects.filter(tipo_animal_id=tipo_animal_id)
+            .exclude(estado='BORRADOR')
+            .order_by()
+            .values_list(*CAMPOS_MASCOTA)
+        )
+        return cls(filas)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _distancias_perfiles(self, perfiles):
+
+        # ||a - b||² = ||a||² + ||b||² - 2ab para la parte numérica; raza y región suman su
+        # peso completo cuando difieren
+        d = self.normas[perfiles, None] + self.normas[None, :] - 2 * (self.numericos[perfiles] @ self.numericos.T)
+        # Redondeado para que d(a, b) == d(b, a) pese al error de punto flotante
+        np.maximum(d, 0, out=d)
+        np.round(d, 4, out=d)
+        d += np.float32(PESO_RAZA) * (self.razas[perfiles, None] != self.razas[None, :])
+        d += np.float32(PESO_REGION) * (self.regiones[perfiles, None] != self.regiones[None, :])
+        return d
+
+    def distancias(self, filas):
+
+        # Distancia de cada fila pedida a todas las mascotas del grupo
+        return self._distancias_perfiles(self.perfil[filas])[:, self.perfil]
+
+    def _mas_cercanas(self, distancias, cantidad):
+
+        # Las `cantidad` candidatas más cercanas a un perfil, a igual distancia primero las
+        # más recientes. Basta con los `cantidad` perfiles más cercanos (cada uno aporta al
+        # menos una candidata) más los que empatan con el último
+        distancias = np.where(self.sin_candidatas, np.inf, distancias)
+        tope = min(cantidad, int(np.count_nonzero(~self.sin_candidatas)))
+        if tope == 0:
+            return []
+        umbral = np.partition(distancias, tope - 1)[tope - 1]
+        perfiles = np.flatnonzero(distancias <= umbral)
+
+        resultado = []
+        for distancia in np.unique(distancias[perfiles]):
+            empatados = perfiles[distancias[perfiles] == distancia]
+            filas = np.concatenate([
+                self.candidatas[self.inicio_perfil[perfil]:self.inicio_perfil[perfil + 1]] for perfil in empatados
+            ])
+            if len(empatados) > 1:
+                filas = filas[np.argsort(-self.ids[filas], kind='stable')]
+            resultado.extend((int(fila), float(distancia)) for fila in filas[:cantidad - len(resultado)])
+            if len(resultado) >= cantidad:
+                break
+        return resultado
+
+    def vecinos(self, filas, k):
+
+        # Los k candidatos disponibles más cercanos de cada fila pedida, sin ella misma
+        if k <= 0:
+            return [[] for _ in filas]
+        perfiles, inverso = np.unique(self.perfil[filas], return_inverse=True)
+        d = self._distancias_perfiles(perfiles)
+        cercanas = [self._mas_cercanas(fila_d, k + 1) for fila_d in d]
+        return [
+            [(int(self.ids[otra]), distancia) for otra, distancia in cercanas[indice] if otra != fila][:k]
+            for fila, indice in zip(np.asarray(filas).tolist(), inverso.reshape(-1).tolist())
+        ]
+
+
+# =============================================================================
+# CÁLCULO EN LOTE
+# =============================================================================
+
+def calcular_similares(tamano_lote=2000):
+
+    # Se escribe por bloques de TAMANO_BLOQUE mascotas, cada uno en su propia transacción:
+    # la memoria no crece con el catálogo y la tabla nunca queda vacía para las lecturas
+    k = similares_por_mascota()
+    total = 0
+    tipos = (
+        Mascota.objects.exclude(estado='BORRADOR')
+        .order_by().values_list('tipo_animal_id', flat=True).distinct()
+    )
+    for tipo_animal_id in tipos:
+        grupo = GrupoMascotas.del_tipo(tipo_animal_id)
+        for inicio in range(0, len(grupo), TAMANO_BLOQUE):
+            filas = np.arange(inicio, min(inicio + TAMANO_BLOQUE, len(grupo)))
+            with transaction.atomic():
+                total += _reemplazar_listas(grupo, filas, k, tamano_lote)
+
+    # Listas de mascotas que volvieron a borrador desde el último cálculo
+    MascotaSimilar.objects.filter(mascota__estado='BORRADOR').delete()
+    return total
+
+
+# =============================================================================
+# ACTUALIZACIÓN INCREMENTAL
+# =============================================================================
+
+TAREA_SIMILARES = 'similares.mascota'
+
+
+def candidatos_por_mascota():
+    return getattr(settings, 'SIMILARES_CANDIDATOS', 1000)
+
+
+def _reemplazar_listas(grupo, filas, k, tamano_lote=None):
+
+    total = 0
+    for inicio in range(0, len(filas), TAMANO_BLOQUE):
+        bloque = filas[inicio:inicio + TAMANO_BLOQUE]
+        ids = grupo.ids[bloque].tolist()
+        nuevas = [
+            MascotaSimilar(mascota_id=mascota_id, similar_id=similar_id, distancia=distancia)
+            for mascota_id, vecinos in zip(ids, grupo.vecinos(bloque, k))
+            for similar_id, distancia in vecinos
+        ]
+        MascotaSimilar.objects.filter(mascota_id__in=ids).delete()
+        MascotaSimilar.objects.bulk_create(nuevas, batch_size=tamano_lote)
+        total += len(nuevas)
+    return total
+
+
+def _entrar_en_listas(mascota_id, candidatos, k):
+
+    # candidatos: {mascota_id: distancia} de las otras mascotas a la que cambió. Como sus
+    # listas ya eran los k mejores sin ella, basta con sumarla donde cabe o donde desplaza
+    # al peor vecino (a igual distancia gana la más reciente, como en vecinos())
+    filas = defaultdict(list)
+    for fila in (
+        MascotaSimilar.objects.filter(mascota_id__in=list(candidatos))
+        .order_by('mascota_id', '-distancia', 'similar_id')
+        .values_list('id', 'mascota_id', 'similar_id', 'distancia')
+    ):
+        filas[fila[1]].append(fila)
+
+    nuevas = []
+    desplazadas = []
+    for otra_id, distancia in candidatos.items():
+        lista = filas.get(otra_id, [])
+        if len(lista) >= k:
+            peor_id, _, peor_similar, peor_distancia = lista[0]
+            if (distancia, -mascota_id) >= (peor_distancia, -peor_similar):
+                continue
+            desplazadas.append(peor_id)
+        nuevas.append(MascotaSimilar(mascota_id=otra_id, similar_id=mascota_id, distancia=distancia))
+
+    MascotaSimilar.objects.filter(id__in=desplazadas).delete()
+    MascotaSimilar.objects.bulk_create(nuevas)
+    return len(nuevas)
+
+
+def actualizar_similares(mascota):
+
+    k = similares_por_mascota()
+
+    with transaction.atomic():
+        # Las listas donde ya aparecía pueden cambiar de orden o perderla: se recalculan enteras
+        afectadas = set(MascotaSimilar.objects.filter(similar_id=mascota.id).values_list('mascota_id', flat=True))
+        MascotaSimilar.objects.filter(similar_id=mascota.id).delete()
+        MascotaSimilar.objects.filter(mascota_id=mascota.id).delete()
+        afectadas.add(mascota.id)
+
+        grupo = GrupoMascotas.del_tipo(mascota.tipo_animal_id)
+        en_grupo = grupo.ids == mascota.id
+        _reemplazar_listas(grupo, np.flatnonzero(np.isin(grupo.ids, list(afectadas))), k)
+
+        entra = 0
+        if mascota.estado == 'DISPONIBLE' and en_grupo.any():
+            # La distancia es simétrica: solo puede entrar en las listas de las mascotas más
+            # cercanas a ella. Se revisan las SIMILARES_CANDIDATOS más cercanas; el lote
+            # periódico cubre el caso raro de una lista más lejana
+            distancias = grupo.distancias(np.flatnonzero(en_grupo))[0]
+            distancias[np.isin(grupo.ids, list(afectadas))] = np.inf
+            limite = min(candidatos_por_mascota(), len(grupo))
+            cercanas = np.argpartition(distancias, limite - 1)[:limite]
+            candidatos = {
+                int(grupo.ids[fila]): float(distancias[fila])
+                for fila in cercanas if np.isfinite(distancias[fila])
+            }
+            entra = _entrar_en_listas(mascota.id, candidatos, k)
+
+    logger.debug(
+        "Similares de la mascota %s: %s listas recalculadas, entra en %s", mascota.id, len(afectadas), entra
+    )
+
+
+@registrar_tarea(TAREA_SIMILARES)
+def tarea_actualizar_similares(mascota_id):
+
+    # Si la mascota se borró, el CASCADE ya quitó sus filas
+    mascota = Mascota.objects.filter(pk=mascota_id).only('id', 'estado', 'tipo_animal_id').first()
+    if mascota is not None:
+        actualizar_similares(mascota)
+
+
+def ids_similares(mascota_id, limite):
+
+    # Lectura directa del índice (mascota, distancia): no depende del tamaño del catálogo
+    return list(
+        MascotaSimilar.objects.filter(mascota_id=mascota_id, similar__estado='DISPONIBLE')
+        .order_by('distancia', '-similar_id')
+        .values_list('similar_id', flat=True)[:limite]
+    )
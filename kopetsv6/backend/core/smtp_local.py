@@ -0,0 +1,95 @@
+import asyncio
+
+
+# =============================================================================
+# SERVIDOR SMTP LOCAL
+# =============================================================================
+
+def _direccion(argumento):
+    # "FROM:<a@b.cl> SIZE=123" -> "a@b.cl"
+    return argumento.partition(':')[2].strip().split(' ')[0].strip('<>')
+
+
+# Servidor SMTP mínimo que acepta todo y no reenvía nada, para desarrollo, pruebas y
+# benchmarks (manage.py servidor_smtp_local). Anuncia AUTH y acepta cualquier credencial
+# para que funcione con la misma configuración que el servidor real, salvo TLS
+
+class ServidorSMTPLocal:
+
+    def __init__(self, al_recibir=None, latencia=0.0, latencia_conexion=0.0):
+        # al_recibir(remitente, destinatarios, datos) se llama por cada mensaje aceptado.
+        # latencia (segundos) se espera antes de responder a cada DATA y latencia_conexion
+        # antes del saludo (el costo de TCP + TLS + AUTH de un proveedor real)
+        self.al_recibir = al_recibir
+        self.latencia = latencia
+        self.latencia_conexion = latencia_conexion
+        self.mensajes = 0
+        self.conexiones = 0
+
+    async def iniciar(self, host='127.0.0.1', puerto=1025):
+        return await asyncio.start_server(self.atender, host, puerto)
+
+    async def atender(self, lector, escritor):
+
+        self.conexiones += 1
+        remitente, destinatarios = None, []
+
+        async def responder(linea):
+            escritor.write(linea.encode() + b'\r\n')
+            await escritor.drain()
+
+        try:
+            if self.latencia_conexion:
+                await asyncio.sleep(self.latencia_conexion)
+            await responder('220 kopets-smtp-local ESMTP')
+            while linea := await lector.readline():
+                comando, _, argumento = linea.decode('latin-1').rstrip('\r\n').partition(' ')
+                comando = comando.upper()
+                if comando == 'EHLO':
+                    escritor.write(b'250-kopets-smtp-local\r\n250-8BITMIME\r\n250-SIZE 52428800\r\n')
+                    await responder('250 AUTH PLAIN LOGIN')
+                elif comando == 'HELO':
+                    await responder('250 kopets-smtp-local')
+                elif comando == 'AUTH':
+                    mecanismo, _, inicial = argumento.partition(' ')
+                    if mecanismo.upper() == 'LOGIN':
+                        pasos = 1 if inicial else 2
+                        for _ in range(pasos):
+                            await responder('334 ')
+                            await lector.readline()
+                    elif not inicial:
+                        await responder('334 ')
+                        await lector.readline()
+                    await responder('235 2.7.0 Autenticado')
+                elif comando == 'MAIL':
+                    remitente, destinatarios = _direccion(argumento), []
+                    await responder('250 2.1.0 OK')
+                elif comando == 'RCPT':
+                    destinatarios.append(_direccion(argumento))
+                    await responder('250 2.1.5 OK')
+                elif comando == 'DATA':
+                    await responder('354 Terminar con <CRLF>.<CRLF>')
+                    lineas = []
+                    while (linea := await lector.readline()) not in (b'.\r\n', b'.\n', b''):
+                        lineas.append(linea[1:] if linea.startswith(b'..') else linea)
+                    if self.latencia:
+                        await asyncio.sleep(self.latencia)
+                    self.mensajes += 1
+                    if self.al_recibir:
+                        self.al_recibir(remitente, destinatarios, b''.join(lineas))
+                    remitente, destinatarios = None, []
+                    await responder('250 2.0.0 Aceptado')
+                elif comando == 'RSET':
+                    remitente, destinatarios = None, []
+                    await responder('250 2.0.0 OK')
+                elif comando == 'NOOP':
+                    await responder('250 2.0.0 OK')
+                elif comando == 'QUIT':
+                    await responder('221 2.0.0 Adiós')
+                    break
+                else:
+                    await responder('502 5.5.2 Comando no implementado')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
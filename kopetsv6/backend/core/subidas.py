@@ -0,0 +1,268 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import SubidaDocumento
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# VALIDACIÓN DE DOCUMENTOS
+# =============================================================================
+
+EXTENSIONES_DOCUMENTO = {
+    'PDF': ['.pdf'],
+    'DOCX': ['.docx', '.doc'],
+    'XLSX': ['.xlsx', '.xls'],
+    'TXT': ['.txt'],
+}
+
+FIRMA_ZIP = b'PK\x03\x04'  # .docx / .xlsx (Office Open XML)
+FIRMA_OLE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # .doc / .xls (formato binario antiguo)
+FIRMAS_DOCUMENTO = {
+    'PDF': (b'%PDF-',),
+    'DOCX': (FIRMA_ZIP, FIRMA_OLE),
+    'XLSX': (FIRMA_ZIP, FIRMA_OLE),
+}
+
+# Bytes del comienzo del archivo que se revisan (firma y, en texto plano, ausencia de NUL)
+BYTES_CABECERA = 8192
+
+
+def tamano_maximo_documento():
+    return getattr(settings, 'DOCUMENTOS_TAMANO_MAXIMO', 150 * 1024 * 1024)
+
+
+def validar_extension(nombre_archivo, tipo_archivo):
+
+    extensiones = EXTENSIONES_DOCUMENTO.get(tipo_archivo)
+    if extensiones and not nombre_archivo.lower().endswith(tuple(extensiones)):
+        raise ValidationError(
+            f"El archivo debe ser de tipo {tipo_archivo}. Extensiones permitidas: {', '.join(extensiones)}"
+        )
+
+
+def validar_firma(tipo_archivo, cabecera):
+
+    # El contenido manda, no la extensión: se revisa con los primeros bytes, sin esperar
+    # a que termine de subir el archivo completo
+    firmas = FIRMAS_DOCUMENTO.get(tipo_archivo)
+    if firmas:
+        valido = cabecera.startswith(firmas)
+    else:
+        valido = b'\x00' not in cabecera[:BYTES_CABECERA]
+    if not valido:
+        raise ValidationError(f"El contenido del archivo no corresponde a un {tipo_archivo}.")
+
+
+# =============================================================================
+# SUBIDAS POR PARTES
+# =============================================================================
+
+class ConflictoSubida(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'El trozo no comienza donde terminó el anterior.'
+    default_code = 'conflicto_subida'
+
+    def __init__(self, recibidos, detail=None):
+        super().__init__(detail)
+        # Los bytes ya recibidos van como número: el cliente reanuda desde ahí
+        self.detail = {'detail': self.detail, 'recibidos': recibidos}
+
+
+RANGO_TROZO = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+TAMANO_LECTURA = 64 * 1024
+
+
+def tamano_trozo():
+    return getattr(settings, 'SUBIDAS_TAMANO_TROZO', 5 * 1024 * 1024)
+
+
+def directorio_subidas():
+
+    directorio = getattr(settings, 'SUBIDAS_PARCIALES_DIR', os.path.join(tempfile.gettempdir(), 'kopets_subidas'))
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def ruta_parcial(subida_id):
+    return os.path.join(directorio_subidas(), f'{subida_id}.part')
+
+
+def parsear_rango(cabecera, tamano_total):
+
+    # Content-Range: bytes <inicio>-<fin>/<total>, con fin inclusivo como en HTTP
+    coincidencia = RANGO_TROZO.match((cabecera or '').strip())
+    if not coincidencia:
+        raise ValidationError({'Content-Range': 'Formato esperado: bytes inicio-fin/total'})
+    inicio, fin, total = (int(valor) for valor in coincidencia.groups())
+    if total != tamano_total or fin < inicio or fin >= total:
+        raise ValidationError({'Content-Range': 'Rango fuera del tamaño anunciado'})
+    if fin - inicio + 1 > tamano_trozo():
+        raise ValidationError({'Content-Range': f'Cada trozo admite hasta {tamano_trozo()} bytes'})
+    return inicio, fin - inicio + 1
+
+
+def ruta_trozo(subida_id):
+    # Con extensión .part para que purgar_subidas_abandonadas recoja los que queden huérfanos
+    return os.path.join(directorio_subidas(), f'{subida_id}-{uuid.uuid4().hex}.part')
+
+
+def _recibir_trozo(subida, inicio, longitud, flujo, ruta):
+
+    # El cuerpo se copia a un archivo propio del trozo en bloques de 64 KB: nunca se arma
+    # completo en memoria. Si la conexión se corta a mitad, se conserva lo recibido. Del
+    # primer trozo se juntan BYTES_CABECERA bytes (aunque lleguen en lecturas cortas) antes
+    # de validar la firma
+    cabecera = min(BYTES_CABECERA, subida.tamano) if inicio == 0 else 0
+    if longitud < cabecera:
+        raise ValidationError({'Content-Range': f'El primer trozo debe traer al menos {cabecera} bytes'})
+    pendiente = b''
+    escritos = 0
+    with open(ruta, 'wb') as destino:
+        while escritos + len(pendiente) < longitud:
+            try:
+                bloque = flujo.read(min(TAMANO_LECTURA, longitud - escritos - len(pendiente)))
+            except OSError:
+                logger.info("Subida %s interrumpida tras %s bytes", subida.pk, inicio + escritos)
+                break
+            if not bloque:
+                break
+            if cabecera:
+                pendiente += bloque
+                if len(pendiente) < cabecera:
+                    continue
+                validar_firma(subida.tipo_archivo, pendiente[:cabecera])
+                bloque, pendiente, cabecera = pendiente, b'', 0
+            destino.write(bloque)
+            escritos += len(bloque)
+    # Cortado antes de completar la cabecera: no se guarda nada y el cliente reanuda desde 0
+    return escritos
+
+
+def escribir_trozo(subida_id, inicio, longitud, flujo):
+
+    # El cuerpo se recibe sin bloqueo ni transacción abiertos: un cliente lento no retiene
+    # una conexión a la base de datos. El bloqueo solo cubre revisar el offset y pegar el
+    # trozo, ya en disco, al archivo parcial
+    subida = SubidaDocumento.objects.get(pk=subida_id)
+    if inicio != subida.recibidos:
+        raise ConflictoSubida(subida.recibidos)
+
+    ruta = ruta_trozo(subida.pk)
+    try:
+        escritos = _recibir_trozo(subida, inicio, longitud, flujo, ruta)
+        with transaction.atomic():
+            subida = SubidaDocumento.objects.select_for_update().get(pk=subida_id)
+            if inicio != subida.recibidos:
+                # Otro PUT del mismo trozo llegó antes
+                raise ConflictoSubida(subida.recibidos)
+
+            with open(ruta_parcial(subida.pk), 'r+b' if inicio else 'wb') as destino, open(ruta, 'rb') as trozo:
+                destino.seek(inicio)
+                destino.truncate()
+                shutil.copyfileobj(trozo, destino, TAMANO_LECTURA)
+
+            subida.recibidos = inicio + escritos
+            subida.save(update_fields=['recibidos', 'fecha_actualizacion'])
+    finally:
+        _eliminar_parcial(ruta)
+    return subida
+
+
+def hash_archivo(ruta):
+
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_LECTURA), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def finalizar_subida(subida_id, sha256, serializer_class, context):
+
+    with transaction.atomic():
+        subida = SubidaDocumento.objects.select_for_update().select_related('refugio', 'usuario').get(pk=subida_id)
+        if subida.recibidos != subida.tamano:
+            raise ConflictoSubida(subida.recibidos, f'Faltan {subida.tamano - subida.recibidos} bytes por subir.')
+
+        ruta = ruta_parcial(subida.pk)
+        coincide = hash_archivo(ruta) == sha256.lower()
+        if not coincide:
+            # El archivo armado no es el que tiene el cliente: se descarta y se sube de nuevo
+            subida.recibidos = 0
+            subida.save(update_fields=['recibidos', 'fecha_actualizacion'])
+            _eliminar_parcial(ruta)
+        else:
+            serializer = _crear_documento(subida, ruta, serializer_class, context)
+            subida.delete()
+            transaction.on_commit(lambda: _eliminar_parcial(ruta))
+
+    if not coincide:
+        raise ValidationError({'sha256': 'El checksum no coincide; la subida debe reiniciarse.'})
+    return serializer
+
+
+def _crear_documento(subida, ruta, serializer_class, context):
+
+    serializer = serializer_class(
+        data={**subida.datos, 'tipo_archivo': subida.tipo_archivo}, context=context
+    )
+    serializer.is_valid(raise_exception=True)
+    with open(ruta, 'rb') as parcial:
+        serializer.save(
+            archivo=File(parcial, name=subida.nombre_archivo),
+            creado_por=subida.usuario,
+            refugio=subida.refugio,
+            tamano=subida.tamano,
+        )
+    return serializer
+
+
+def _eliminar_parcial(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def cancelar_subida(subida):
+
+    ruta = ruta_parcial(subida.pk)
+    subida.delete()
+    _eliminar_parcial(ruta)
+
+
+def purgar_subidas_abandonadas():
+
+    # Subidas sin actividad en SUBIDAS_EXPIRACION_HORAS y archivos parciales sin subida
+    # (p. ej. tras borrar el refugio)
+    horas = getattr(settings, 'SUBIDAS_EXPIRACION_HORAS', 24)
+    SubidaDocumento.objects.filter(fecha_actualizacion__lt=timezone.now() - timedelta(hours=horas)).delete()
+
+    vigentes = {f'{pk}.part' for pk in SubidaDocumento.objects.values_list('pk', flat=True)}
+    limite = time.time() - horas * 3600
+    borrados = 0
+    with os.scandir(directorio_subidas()) as entradas:
+        for entrada in entradas:
+            if not entrada.name.endswith('.part') or entrada.name in vigentes:
+                continue
+            # El margen cubre una subida creada después de leer las vigentes
+            if entrada.stat().st_mtime < limite:
+                _eliminar_parcial(entrada.path)
+                borrados += 1
+    return borrados
@@ -0,0 +1,142 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# COLA DE TAREAS EN BASE DE DATOS
+# =============================================================================
+
+# tipo -> función; las funciones se registran con @registrar_tarea al importar su módulo
+REGISTRO_TAREAS = {}
+
+# Estados en los que la tarea todavía no termina
+ESTADOS_ACTIVOS = ('PENDIENTE', 'EN_PROCESO')
+
+# Las tareas que alguien espera en pantalla (p. ej. el correo con un código 2FA) pasan
+# delante de las de fondo (envíos masivos, derivados de imágenes)
+PRIORIDAD_NORMAL = 0
+PRIORIDAD_ALTA = 10
+
+
+class TareaFallida(Exception):
+    # Error que no se arregla reintentando (p. ej. un archivo que no es una imagen)
+    pass
+
+
+def registrar_tarea(tipo):
+
+    def decorador(funcion):
+        REGISTRO_TAREAS[tipo] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(tipo, clave='', espera=0, prioridad=PRIORIDAD_NORMAL, **parametros):
+
+    # Se inserta dentro de la transacción de quien la pide: si esa transacción se revierte
+    # la tarea desaparece con ella, y el worker no la ve antes del commit. Con espera
+    # (segundos) y clave, los pedidos repetidos mientras la tarea espera se funden en uno
+    if tipo not in REGISTRO_TAREAS:
+        raise ValueError(f'Tipo de tarea no registrado: {tipo}')
+
+    if getattr(settings, 'TAREAS_EN_LINEA', False):
+        # Sin worker (desarrollo): se ejecuta al confirmar la transacción
+        transaction.on_commit(lambda: REGISTRO_TAREAS[tipo](**parametros))
+        return None
+
+    if clave:
+        pendiente = Tarea.objects.filter(tipo=tipo, clave=clave, estado='PENDIENTE').first()
+        if pendiente:
+            return pendiente
+    return Tarea.objects.create(
+        tipo=tipo, clave=clave, parametros=parametros, prioridad=prioridad,
+        disponible_en=timezone.now() + timedelta(seconds=espera),
+    )
+
+
+def _espera_reintento(intentos):
+    return timedelta(seconds=min(10 * 2 ** intentos, 3600))
+
+
+def tomar_tareas(limite):
+
+    # SKIP LOCKED: varios workers pueden tomar tareas a la vez sin bloquearse ni repetirlas.
+    # Las tareas EN_PROCESO cuyo bloqueo venció (worker caído) vuelven a tomarse
+    ahora = timezone.now()
+    bloqueo = timedelta(seconds=getattr(settings, 'TAREAS_BLOQUEO_SEGUNDOS', 300))
+    with transaction.atomic():
+        ids = list(
+            Tarea.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(estado='PENDIENTE', disponible_en__lte=ahora)
+                | Q(estado='EN_PROCESO', bloqueada_hasta__lt=ahora)
+            )
+            .order_by('-prioridad', 'disponible_en', 'id')
+            .values_list('id', flat=True)[:limite]
+        )
+        if ids:
+            Tarea.objects.filter(id__in=ids).update(
+                estado='EN_PROCESO',
+                bloqueada_hasta=ahora + bloqueo,
+                intentos=F('intentos') + 1,
+            )
+    return list(Tarea.objects.filter(id__in=ids).order_by('-prioridad', 'disponible_en', 'id'))
+
+
+def ejecutar_tarea(tarea):
+
+    funcion = REGISTRO_TAREAS.get(tarea.tipo)
+    try:
+        if funcion is None:
+            raise TareaFallida(f'Tipo de tarea no registrado: {tarea.tipo}')
+        funcion(**tarea.parametros)
+    except Exception as e:
+        definitiva = isinstance(e, TareaFallida) or tarea.intentos >= tarea.max_intentos
+        tarea.error = traceback.format_exc()
+        tarea.bloqueada_hasta = None
+        if definitiva:
+            tarea.estado = 'FALLIDA'
+            logger.error("Tarea %s (%s) fallida: %s", tarea.id, tarea.tipo, e)
+        else:
+            tarea.estado = 'PENDIENTE'
+            tarea.disponible_en = timezone.now() + _espera_reintento(tarea.intentos)
+            logger.warning("Tarea %s (%s) falló, se reintentará: %s", tarea.id, tarea.tipo, e)
+        tarea.save(update_fields=['estado', 'error', 'bloqueada_hasta', 'disponible_en', 'fecha_actualizacion'])
+        return False
+
+    tarea.estado = 'COMPLETADA'
+    tarea.bloqueada_hasta = None
+    tarea.error = ''
+    tarea.save(update_fields=['estado', 'error', 'bloqueada_hasta', 'fecha_actualizacion'])
+    return True
+
+
+def procesar_lote(limite=10):
+
+    tareas = tomar_tareas(limite)
+    for tarea in tareas:
+        ejecutar_tarea(tarea)
+    return len(tareas)
+
+
+def purgar_tareas():
+
+    # Las completadas solo sirven de historial; las fallidas se guardan más tiempo para revisarlas
+    ahora = timezone.now()
+    completadas = getattr(settings, 'TAREAS_RETENCION_DIAS', 7)
+    fallidas = getattr(settings, 'TAREAS_RETENCION_FALLIDAS_DIAS', 30)
+    borradas, _ = Tarea.objects.filter(
+        Q(estado='COMPLETADA', fecha_actualizacion__lt=ahora - timedelta(days=completadas))
+        | Q(estado='FALLIDA', fecha_actualizacion__lt=ahora - timedelta(days=fallidas))
+    ).delete()
+    return borradas
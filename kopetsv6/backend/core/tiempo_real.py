@@ -0,0 +1,391 @@
+import asyncio
+import atexit
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .notificaciones import contar_no_leidas
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# CANAL EN PROCESO
+# =============================================================================
+
+# Cada conexión SSE abierta en este proceso tiene una cola. Los eventos llegan desde
+# cualquier hilo (los signals corren en el hilo de las vistas síncronas) y se reparten en
+# el event loop del servidor ASGI
+
+def _tamano_cola():
+    return getattr(settings, 'TIEMPO_REAL_COLA_MAXIMA', 100)
+
+
+def cerrar_cola(cola):
+
+    # None indica al flujo que termine; se descarta lo pendiente para que quepa
+    while not cola.empty():
+        cola.get_nowait()
+    cola.put_nowait(None)
+
+
+class CanalNotificaciones:
+
+    def __init__(self):
+        self.por_usuario = defaultdict(set)
+        self.por_tipo_usuario = defaultdict(set)
+        self.loop = None
+        self.escucha_broker = None
+
+    def suscribir(self, usuario_id, tipo_usuario):
+
+        self.loop = asyncio.get_running_loop()
+        if broker_configurado() and (self.escucha_broker is None or self.escucha_broker.done()):
+            self.escucha_broker = self.loop.create_task(escuchar_broker(self))
+        cola = asyncio.Queue(maxsize=_tamano_cola())
+        self.por_usuario[usuario_id].add(cola)
+        self.por_tipo_usuario[tipo_usuario].add(cola)
+        return cola
+
+    def desuscribir(self, cola, usuario_id, tipo_usuario):
+
+        for grupos, clave in ((self.por_usuario, usuario_id), (self.por_tipo_usuario, tipo_usuario)):
+            colas = grupos.get(clave)
+            if colas is not None:
+                colas.discard(cola)
+                if not colas:
+                    del grupos[clave]
+
+    def conexiones(self):
+        return sum(len(colas) for colas in self.por_usuario.values())
+
+    def entregar(self, evento):
+
+        # Solo desde el event loop. Un cliente que no consume (cola llena) se desconecta:
+        # al reconectar recibe el contador completo y no se pierde nada
+        if 'usuario' in evento:
+            colas = self.por_usuario.get(evento['usuario'], ())
+        else:
+            colas = self.por_tipo_usuario.get(evento['tipo_usuario'], ())
+        for cola in list(colas):
+            try:
+                cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                cerrar_cola(cola)
+
+    def publicar_local(self, evento):
+
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            actual = asyncio.get_running_loop()
+        except RuntimeError:
+            actual = None
+        if actual is loop:
+            self.entregar(evento)
+        else:
+            loop.call_soon_threadsafe(self.entregar, evento)
+
+
+canal = CanalNotificaciones()
+
+
+# =============================================================================
+# BROKER ENTRE PROCESOS
+# =============================================================================
+
+# Con varios procesos (workers de uvicorn, procesar_tareas, admin) los eventos pasan por
+# `manage.py broker_notificaciones`: protocolo de líneas JSON sobre TCP. Quien se conecta
+# envía primero PUB (publica) o SUB (recibe todo lo publicado)
+
+def broker_configurado():
+    return bool(getattr(settings, 'TIEMPO_REAL_BROKER', ''))
+
+
+def direccion_broker():
+    host, _, puerto = settings.TIEMPO_REAL_BROKER.rpartition(':')
+    return host or '127.0.0.1', int(puerto)
+
+
+class PublicadorBroker:
+
+    # Una conexión por proceso. El request solo deja el evento en una cola acotada y un hilo
+    # lo envía: si el broker no responde, los eventos se descartan durante una espera que
+    # crece hasta 30 s y la cola llena descarta los nuevos. Los clientes se resincronizan al
+    # reconectar
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cola = None
+        self.cola_llena = False
+        self.hilo = None
+        self.conexion = None
+        self.espera = 1
+        self.reintentar_en = 0
+
+    def enviar(self, evento):
+
+        cola = self._iniciar()
+        try:
+            cola.put_nowait(evento)
+        except queue.Full:
+            # Se avisa una vez por racha, no por cada evento descartado
+            if not self.cola_llena:
+                logger.warning("Cola del publicador llena: se descartan eventos de notificaciones")
+            self.cola_llena = True
+            return
+        self.cola_llena = False
+
+    def _iniciar(self):
+
+        # También tras un fork: el hilo del proceso padre no existe en el hijo
+        with self.lock:
+            if self.hilo is None or not self.hilo.is_alive():
+                self.cola = queue.Queue(maxsize=getattr(settings, 'TIEMPO_REAL_PUBLICADOR_COLA', 1000))
+                self.conexion = None
+                self.hilo = threading.Thread(target=self._enviar_pendientes, args=(self.cola,), name='publicador-broker', daemon=True)
+                self.hilo.start()
+            return self.cola
+
+    def _enviar_pendientes(self, cola):
+
+        while (evento := cola.get()) is not None:
+            if time.monotonic() >= self.reintentar_en:
+                self._enviar(evento)
+        self._cerrar()
+
+    def _enviar(self, evento):
+
+        linea = (json.dumps(evento, separators=(',', ':')) + '\n').encode()
+        for _ in range(2):
+            try:
+                if self.conexion is None:
+                    self.conexion = socket.create_connection(direccion_broker(), timeout=2)
+                    self.conexion.sendall(b'PUB\n')
+                self.conexion.sendall(linea)
+                self.espera = 1
+                return
+            except OSError as e:
+                error = e
+                self._cerrar()
+        logger.warning("No se pudo publicar en el broker de notificaciones (%s); reintento en %s s", error, self.espera)
+        self.reintentar_en = time.monotonic() + self.espera
+        self.espera = min(self.espera * 2, 30)
+
+    def detener(self, timeout=2):
+
+        # Al salir del proceso se envía lo pendiente sin esperar más de `timeout` segundos
+        with self.lock:
+            hilo, cola = self.hilo, self.cola
+        if hilo is None or not hilo.is_alive():
+            return
+        try:
+            cola.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        hilo.join(timeout)
+
+    def _cerrar(self):
+        if self.conexion is not None:
+            try:
+                self.conexion.close()
+            except OSError:
+                pass
+        self.conexion = None
+
+
+publicador = PublicadorBroker()
+atexit.register(publicador.detener)
+
+
+async def escuchar_broker(canal):
+
+    espera = 1
+    host, puerto = direccion_broker()
+    while True:
+        try:
+            lector, escritor = await asyncio.open_connection(host, puerto, limit=1024 * 1024)
+            escritor.write(b'SUB\n')
+            await escritor.drain()
+            espera = 1
+            while linea := await lector.readline():
+                try:
+                    canal.entregar(json.loads(linea))
+                except ValueError:
+                    logger.warning("Evento inválido desde el broker: %r", linea[:200])
+            escritor.close()
+        except (OSError, ValueError) as e:
+            logger.warning("Broker de notificaciones no disponible (%s); reintento en %s s", e, espera)
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, 30)
+
+
+def publicar(evento):
+    if broker_configurado():
+        publicador.enviar(evento)
+    else:
+        canal.publicar_local(evento)
+
+
+# =============================================================================
+# EVENTOS
+# =============================================================================
+
+def _datos_notificacion(notificacion, id_lista, difusion):
+    return {
+        'id': id_lista,
+        'tipo': notificacion.tipo,
+        'titulo': notificacion.titulo,
+        'mensaje': notificacion.mensaje,
+        'leida': getattr(notificacion, 'leida', False),
+        'url': notificacion.url,
+        'fecha_creacion': notificacion.fecha_creacion.isoformat(),
+        'difusion': difusion,
+    }
+
+
+def publicar_notificacion(notificacion):
+    publicar({'usuario': notificacion.usuario_id, 'notificacion': _datos_notificacion(notificacion, notificacion.id, False)})
+
+
+def publicar_difusion(difusion):
+
+    # Mismo id negativo que en el listado de /api/notificaciones/
+    publicar({'tipo_usuario': difusion.tipo_usuario, 'notificacion': _datos_notificacion(difusion, -difusion.id, True)})
+
+
+# =============================================================================
+# SERVER-SENT EVENTS
+# =============================================================================
+
+# El flujo se atiende como aplicación ASGI propia, delante de Django (config/asgi.py): un
+# request de Django conserva un hilo y una conexión a la base de datos mientras dura, y
+# aquí una conexión inactiva es solo una cola y una tarea
+RUTA_EVENTOS = '/api/notificaciones/eventos/'
+
+
+def _token(scope):
+
+    # EventSource no permite cabeceras: el token de acceso también se acepta en ?token=
+    token = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+    if token:
+        return token[0]
+    crudo = JWTAuthentication().get_raw_token(dict(scope['headers']).get(b'authorization', b''))
+    return crudo.decode('latin-1') if crudo else None
+
+
+def _preparar_conexion(scope):
+
+    # Una sola visita a la base de datos por conexión; después se cierra para no mantener
+    # una conexión MySQL abierta por cada cliente conectado
+    autenticacion = JWTAuthentication()
+    try:
+        token = _token(scope)
+        if not token:
+            return None, 0
+        usuario = autenticacion.get_user(autenticacion.get_validated_token(token))
+        return usuario, contar_no_leidas(usuario)
+    except (InvalidToken, AuthenticationFailed):
+        return None, 0
+    finally:
+        connections.close_all()
+
+
+def _cabeceras_cors(scope):
+
+    # La petición no pasa por el middleware de CORS: se aplican los mismos orígenes
+    origen = dict(scope['headers']).get(b'origin')
+    if origen and origen.decode('latin-1') in getattr(settings, 'CORS_ALLOWED_ORIGINS', ()):
+        return [(b'access-control-allow-origin', origen), (b'access-control-allow-credentials', b'true'), (b'vary', b'origin')]
+    return []
+
+
+async def _responder_json(send, estado, datos, cabeceras):
+    cuerpo = json.dumps(datos).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': estado,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(cuerpo)).encode()), *cabeceras],
+    })
+    await send({'type': 'http.response.body', 'body': cuerpo})
+
+
+def mensaje_sse(evento, datos):
+    return f'event: {evento}\ndata: {json.dumps(datos, separators=(",", ":"))}\n\n'
+
+
+async def _vigilar_desconexion(receive, cola):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    cerrar_cola(cola)
+
+
+async def flujo_eventos(cola, no_leidas):
+
+    latido = getattr(settings, 'TIEMPO_REAL_LATIDO_SEGUNDOS', 25)
+    yield f'retry: {latido * 1000}\n' + mensaje_sse('no_leidas', {'count': no_leidas})
+    while True:
+        try:
+            evento = await asyncio.wait_for(cola.get(), timeout=latido)
+        except asyncio.TimeoutError:
+            # El comentario mantiene viva la conexión a través de proxies
+            yield ': ping\n\n'
+            continue
+        if evento is None:
+            return
+        yield mensaje_sse('notificacion', evento['notificacion']) + mensaje_sse('no_leidas', {'delta': 1})
+
+
+async def aplicacion_eventos(scope, receive, send):
+
+    cors = _cabeceras_cors(scope)
+    if scope['method'] != 'GET':
+        await _responder_json(send, 405, {'error': 'Método no permitido'}, cors)
+        return
+
+    usuario, no_leidas = await sync_to_async(_preparar_conexion)(scope)
+    if usuario is None:
+        await _responder_json(send, 401, {'detail': 'Token inválido o ausente'}, cors)
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            # nginx no debe acumular el flujo en su buffer
+            (b'x-accel-buffering', b'no'),
+            *cors,
+        ],
+    })
+    cola = canal.suscribir(usuario.pk, usuario.tipo_usuario)
+    vigilante = asyncio.ensure_future(_vigilar_desconexion(receive, cola))
+    try:
+        async for trozo in flujo_eventos(cola, no_leidas):
+            await send({'type': 'http.response.body', 'body': trozo.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        pass
+    finally:
+        vigilante.cancel()
+        canal.desuscribir(cola, usuario.pk, usuario.tipo_usuario)
+
+
+def eventos_notificaciones(request):
+
+    # Solo se llega aquí bajo WSGI: con config.asgi la ruta la atiende aplicacion_eventos.
+    # El cliente sigue consultando /api/notificaciones/no_leidas/
+    return JsonResponse({'error': 'Los eventos en tiempo real requieren el servidor ASGI'}, status=501)
@@ -9,8 +9,9 @@ from .views import (
     TipViewSet,
     SolicitudAdopcionViewSet, PerfilAdoptanteViewSet,  EventoVoluntariadoViewSet, InscripcionVoluntariadoViewSet,
     ResenaRefugioViewSet, AdopcionViewSet, VisitaSeguimientoViewSet, FotoVisitaViewSet,
-    DocumentoViewSet, NotificacionViewSet, MascotaFavoritaViewSet, TipFavoritoViewSet, ItemInventarioViewSet
+    DocumentoViewSet, SubidaDocumentoViewSet, ArchivoProtegidoViewSet, NotificacionViewSet, MascotaFavoritaViewSet, TipFavoritoViewSet, ItemInventarioViewSet
 )
+from .tiempo_real import eventos_notificaciones
 
 router = DefaultRouter()
 
@@ -35,11 +36,15 @@ router.register(r'fotos-visitas', FotoVisitaViewSet, basename='foto-visita')
 router.register(r'eventos-voluntariado', EventoVoluntariadoViewSet, basename='evento-voluntariado')
 router.register(r'inscripciones-voluntariado', InscripcionVoluntariadoViewSet, basename='inscripcion-voluntariado')
 router.register(r'documentos', DocumentoViewSet, basename='documento')
+router.register(r'documentos-subidas', SubidaDocumentoViewSet, basename='documento-subida')
+router.register(r'archivos/(?P<tipo>documentos|contratos|verificaciones)', ArchivoProtegidoViewSet, basename='archivo')
 router.register(r'notificaciones', NotificacionViewSet, basename='notificacion')
 router.register(r'mascotas-favoritas', MascotaFavoritaViewSet, basename='mascota-favorita')
 router.register(r'tips-favoritos', TipFavoritoViewSet, basename='tip-favorito')
 router.register(r'inventario', ItemInventarioViewSet, basename='inventario')
 
 urlpatterns = [
+    # Antes del router: si no, "eventos" se toma como el id de una notificación
+    path('notificaciones/eventos/', eventos_notificaciones, name='notificaciones-eventos'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
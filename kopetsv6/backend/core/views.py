@@ -1,17 +1,20 @@
 from rest_framework import viewsets, status, permissions
+import calendar
+import hashlib
 import logging
-from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.exceptions import NotAuthenticated, NotFound, PermissionDenied, ValidationError
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from django.utils import timezone
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.db.models import Q, Max, Sum, Count
 from django.db.models import Prefetch
 from django.db import transaction
+from django.http import Http404
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
 from django.conf import settings
 
 from .models import (
@@ -21,23 +24,42 @@ from .models import (
     Tip,
     SolicitudAdopcion, PerfilAdoptante,
     ResenaRefugio, ContactoRefugio, RedSocialRefugio, EventoVoluntariado, InscripcionVoluntariado,
-    Documento, Notificacion, MascotaFavorita, TipFavorito, ItemInventario
+    Documento, SubidaDocumento, Notificacion, NotificacionArchivada, MascotaFavorita, TipFavorito, ItemInventario
 )
 
 from .serializers import (
     AdopcionSerializer, AdopcionListSerializer,
-    VisitaSeguimientoSerializer, FotoVisitaSerializer,
+    VisitaSeguimientoSerializer, FotoVisitaSerializer, LoteFotosVisitaSerializer,
     CustomUserSerializer, PerfilAdoptanteSerializer,
     RefugioSerializer, RefugioPublicoSerializer, RefugioUpdateSerializer,
     ResenaRefugioSerializer,
-    MascotaSerializer, MascotaPublicaSerializer,
+    MascotaSerializer, MascotaPublicaSerializer, MascotaPublicaListSerializer,
     TipoAnimalSerializer, RazaSerializer,
     TipoVacunaSerializer, VacunaMascotaSerializer,
     SolicitudAdopcionSerializer,
     CampanaSerializer, ParticipacionCampanaSerializer,
     TipSerializer, TipCreateUpdateSerializer, EventoVoluntariadoSerializer, EventoVoluntariadoListSerializer, InscripcionVoluntariadoSerializer,
-    DocumentoSerializer, NotificacionSerializer, MascotaFavoritaSerializer, TipFavoritoSerializer, ItemInventarioSerializer
+    DocumentoSerializer, SubidaDocumentoSerializer, NotificacionSerializer, MascotaFavoritaSerializer, TipFavoritoSerializer, ItemInventarioSerializer
 )
+from .busqueda import buscar_mascotas
+from .descargas import leer_firma, resolver_archivo, respuesta_archivo, url_descarga
+from .notificaciones import (
+    buscar_difusion, contar_no_leidas, firma_difusiones, marcar_difusion_leida, marcar_notificacion_leida,
+    marcar_todo_leido, notificaciones_usuario, ocultar_difusion,
+)
+from .cache_respuestas import RespuestaCacheadaMixin, TAG_CAMPANAS, TAG_MASCOTAS, TAG_REFERENCIA, TAG_REFUGIOS
+from .condicional import GetCondicionalMixin
+from .geo import filtrar_por_cercania, parsear_cercania
+from .recomendador import LIMITE_MAXIMO, LIMITE_POR_DEFECTO, matriz_compatibilidad, pesos_perfil
+from .catalogo import aplicar_filtros, anotar_resumen_vacunas, facetas_catalogo, filtros_catalogo, mascotas_disponibles
+from .indice_bitmap import resolver_con_indice
+from .similares import ids_similares, similares_por_mascota
+from .signals import registrar_archivos
+from .subidas import (
+    BYTES_CABECERA, cancelar_subida, escribir_trozo, finalizar_subida, parsear_rango,
+    tamano_maximo_documento, validar_extension, validar_firma,
+)
+from .paginacion import PaginacionSeleccionable
 
 logger = logging.getLogger(__name__)
 # =============================================================================
@@ -131,14 +153,6 @@ class AuthViewSet(viewsets.ViewSet):
             if user_auth:
 
                 codigo = TwoFactorCode.generar_codigo(user)
-                
-                # TODO: Enviar código por email en producción
-                # send_mail(
-                #     'Código de verificación - KokoroPets',
-                #     f'Tu código de verificación es: {codigo}',
-                #     settings.DEFAULT_FROM_EMAIL,
-                #     [user.email],
-                # )
 
                 logger.debug(f"Código 2FA generado para {email}")
 
@@ -455,28 +469,39 @@ class RefugioViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_404_NOT_FOUND)
 
 
-class RefugioPublicoViewSet(viewsets.ReadOnlyModelViewSet):
+class RefugioPublicoViewSet(GetCondicionalMixin, RespuestaCacheadaMixin, viewsets.ReadOnlyModelViewSet):
     
     queryset = Refugio.objects.filter(verificado=True)
     serializer_class = RefugioPublicoSerializer
     permission_classes = [IsAuthenticated]
+    tags_cache = (TAG_REFUGIOS, TAG_MASCOTAS)
+    
+    def get_queryset(self):
+        
+        queryset = super().get_queryset()
+        cercania = parsear_cercania(self.request.query_params)
+        if cercania:
+            queryset = filtrar_por_cercania(queryset, *cercania, desempate=('nombre',))
+        return queryset
 
 
 # =============================================================================
 # MASCOTAS
 # =============================================================================
 
-class TipoAnimalViewSet(viewsets.ReadOnlyModelViewSet):
+class TipoAnimalViewSet(RespuestaCacheadaMixin, viewsets.ReadOnlyModelViewSet):
     
     queryset = TipoAnimal.objects.filter(activo=True)
     serializer_class = TipoAnimalSerializer
     permission_classes = [IsAuthenticated]
+    tags_cache = (TAG_REFERENCIA,)
 
 
-class RazaViewSet(viewsets.ReadOnlyModelViewSet):
+class RazaViewSet(RespuestaCacheadaMixin, viewsets.ReadOnlyModelViewSet):
     
     serializer_class = RazaSerializer
     permission_classes = [IsAuthenticated]
+    tags_cache = (TAG_REFERENCIA,)
     
     def get_queryset(self):
         queryset = Raza.objects.all()
@@ -486,10 +511,11 @@ class RazaViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
-class TipoVacunaViewSet(viewsets.ReadOnlyModelViewSet):
+class TipoVacunaViewSet(RespuestaCacheadaMixin, viewsets.ReadOnlyModelViewSet):
     
     serializer_class = TipoVacunaSerializer
     permission_classes = [IsAuthenticated]
+    tags_cache = (TAG_REFERENCIA,)
     
     def get_queryset(self):
         queryset = TipoVacuna.objects.filter(activo=True)
@@ -594,12 +620,7 @@ class MascotaViewSet(viewsets.ModelViewSet):
             
             busqueda = self.request.query_params.get('search')
             if busqueda:
-                queryset = queryset.filter(
-                    Q(nombre__icontains=busqueda) |
-                    Q(descripcion__icontains=busqueda) |
-                    Q(raza__nombre__icontains=busqueda) |
-                    Q(color__icontains=busqueda)
-                )
+                return buscar_mascotas(queryset, busqueda)
             
             return queryset.order_by('-fecha_ingreso')
         
@@ -626,14 +647,28 @@ class MascotaViewSet(viewsets.ModelViewSet):
         return Response({'success': True, 'message': 'Mascota marcada como adoptada'})
 
 
-class MascotaPublicaViewSet(viewsets.ReadOnlyModelViewSet):
+class MascotaPublicaViewSet(GetCondicionalMixin, RespuestaCacheadaMixin, viewsets.ReadOnlyModelViewSet):
     
     serializer_class = MascotaPublicaSerializer
     
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionSeleccionable
+    campos_keyset = ('fecha_ingreso', 'id')
+    tags_cache = (TAG_MASCOTAS, TAG_REFUGIOS, TAG_REFERENCIA)
+    campo_ultima_modificacion = 'fecha_actualizacion'
 
     
-    def get_queryset(self):
+    def usa_vista_compacta(self):
+        
+        # El listado usa la tarjeta compacta; ?vista=completa devuelve el detalle de cada mascota
+        return self.action in ('list', 'recomendadas', 'similares') and self.request.query_params.get('vista') != 'completa'
+    
+    def get_serializer_class(self):
+        if self.usa_vista_compacta():
+            return MascotaPublicaListSerializer
+        return MascotaPublicaSerializer
+    
+    def get_queryset_base(self):
         
         
         prefetch_whatsapp = Prefetch(
@@ -645,64 +680,93 @@ class MascotaPublicaViewSet(viewsets.ReadOnlyModelViewSet):
         queryset = Mascota.objects.filter(estado='DISPONIBLE').select_related(
             'tipo_animal', 'raza', 'refugio'
         ).prefetch_related(
-            prefetch_whatsapp,  
-            'vacunas_aplicadas__tipo_vacuna' 
+            prefetch_whatsapp
         )
         
-        tipo_animal = self.request.query_params.get('tipo_animal')
-        if tipo_animal:
-            queryset = queryset.filter(tipo_animal_id=tipo_animal)
+        if self.usa_vista_compacta():
+            return anotar_resumen_vacunas(queryset)
+        return queryset.prefetch_related('vacunas_aplicadas__tipo_vacuna')
+    
+    def get_queryset(self):
         
-        raza = self.request.query_params.get('raza')
-        if raza:
-            queryset = queryset.filter(raza_id=raza)
+        if self.action == 'list':
+            # El índice resuelve filtros y orden; la base de datos solo hidrata la página
+            resultado = resolver_con_indice(self.request.query_params)
+            if resultado is not None:
+                return resultado.hidratar(self.get_queryset_base())
         
-        sexo = self.request.query_params.get('sexo')
-        if sexo:
-            queryset = queryset.filter(sexo=sexo)
+        queryset = aplicar_filtros(self.get_queryset_base(), filtros_catalogo(self.request.query_params))
         
-        edad = self.request.query_params.get('edad')
-        if edad:
-            queryset = queryset.filter(edad=edad)
+        busqueda = self.request.query_params.get('search')
+        if busqueda:
+            queryset = buscar_mascotas(queryset, busqueda)
+        else:
+            queryset = queryset.order_by('-fecha_ingreso', '-id')
         
-        tamano = self.request.query_params.get('tamano')
-        if tamano:
-            queryset = queryset.filter(tamano=tamano)
+        cercania = parsear_cercania(self.request.query_params)
+        if cercania:
+            queryset = filtrar_por_cercania(
+                queryset, *cercania, campo_refugio='refugio', desempate=('-fecha_ingreso', '-id')
+            )
         
-        nivel_energia = self.request.query_params.get('nivel_energia')
-        if nivel_energia:
-            queryset = queryset.filter(nivel_energia=nivel_energia)
+        return queryset
+
+    def queryset_etag(self):
         
-        nivel_cuidado = self.request.query_params.get('nivel_cuidado')
-        if nivel_cuidado:
-            queryset = queryset.filter(nivel_cuidado=nivel_cuidado)
+        params = self.request.query_params
+        return aplicar_filtros(mascotas_disponibles(params), filtros_catalogo(params))
+
+    @action(detail=False, methods=['get'])
+    def recomendadas(self, request):
         
-        apto_ninos = self.request.query_params.get('apto_ninos')
-        if apto_ninos and apto_ninos.lower() == 'true':
-            queryset = queryset.filter(apto_ninos=True)
+        perfil = getattr(request.user, 'perfil_adoptante', None)
+        if perfil is None:
+            raise ValidationError('Completa tu perfil de adoptante para recibir recomendaciones')
         
-        apto_apartamento = self.request.query_params.get('apto_apartamento')
-        if apto_apartamento and apto_apartamento.lower() == 'true':
-            queryset = queryset.filter(apto_apartamento=True)
+        try:
+            limite = min(int(request.query_params.get('limite', LIMITE_POR_DEFECTO)), LIMITE_MAXIMO)
+            tipo_animal = request.query_params.get('tipo_animal')
+            tipo_animal = int(tipo_animal) if tipo_animal else None
+        except ValueError:
+            raise ValidationError('Parámetros inválidos')
+        
+        recomendadas = matriz_compatibilidad.recomendar(
+            pesos_perfil(perfil), limite=limite, tipo_animal_id=tipo_animal
+        )
+        mascotas = self.get_queryset_base().in_bulk([mascota_id for mascota_id, _ in recomendadas])
         
-        sociable_perros = self.request.query_params.get('sociable_perros')
-        if sociable_perros and sociable_perros.lower() == 'true':
-            queryset = queryset.filter(sociable_perros=True)
+        resultados = []
+        for mascota_id, puntaje in recomendadas:
+            if mascota_id in mascotas:
+                datos = self.get_serializer(mascotas[mascota_id]).data
+                datos['puntaje_compatibilidad'] = puntaje
+                resultados.append(datos)
         
-        sociable_gatos = self.request.query_params.get('sociable_gatos')
-        if sociable_gatos and sociable_gatos.lower() == 'true':
-            queryset = queryset.filter(sociable_gatos=True)
+        return Response({'success': True, 'results': resultados})
+
+    @action(detail=True, methods=['get'])
+    def similares(self, request, pk=None):
         
-        busqueda = self.request.query_params.get('search')
-        if busqueda:
-            queryset = queryset.filter(
-                Q(nombre__icontains=busqueda) |
-                Q(descripcion__icontains=busqueda) |
-                Q(raza__nombre__icontains=busqueda) |
-                Q(color__icontains=busqueda)
-            )
+        # También responde para mascotas ya adoptadas o reservadas (p. ej. un favorito que
+        # dejó de estar disponible), por eso no pasa por get_object()
+        try:
+            mascota_id = int(pk)
+            limite = min(int(request.query_params.get('limite', similares_por_mascota())), similares_por_mascota())
+        except ValueError:
+            raise ValidationError('Parámetros inválidos')
         
-        return queryset.order_by('-fecha_ingreso')
+        ids = ids_similares(mascota_id, limite)
+        if not ids and not Mascota.objects.filter(pk=mascota_id).exclude(estado='BORRADOR').exists():
+            raise NotFound('Mascota no encontrada')
+        
+        mascotas = self.get_queryset_base().in_bulk(ids)
+        resultados = [self.get_serializer(mascotas[similar_id]).data for similar_id in ids if similar_id in mascotas]
+        return Response({'success': True, 'results': resultados})
+
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facetas(self, request):
+        
+        return Response(facetas_catalogo(request.query_params))
 
 
 # =============================================================================
@@ -813,6 +877,8 @@ class SolicitudAdopcionViewSet(viewsets.ModelViewSet):
     
     serializer_class = SolicitudAdopcionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionSeleccionable
+    campos_keyset = ('created_at', 'id')
     
     def get_queryset(self):
         user = self.request.user
@@ -999,10 +1065,12 @@ class SolicitudAdopcionViewSet(viewsets.ModelViewSet):
 # CAMPAÑAS
 # =============================================================================
 
-class CampanaViewSet(viewsets.ModelViewSet):
+class CampanaViewSet(GetCondicionalMixin, viewsets.ModelViewSet):
     
     serializer_class = CampanaSerializer
     permission_classes = [IsAuthenticated]
+    campo_ultima_modificacion = 'updated_at'
+    tags_etag = (TAG_CAMPANAS, TAG_REFUGIOS)
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     
     def get_queryset(self):
@@ -1163,10 +1231,12 @@ class CampanaViewSet(viewsets.ModelViewSet):
 # TIPS
 # =============================================================================
 
-class TipViewSet(viewsets.ModelViewSet):
+class TipViewSet(GetCondicionalMixin, viewsets.ModelViewSet):
     
     serializer_class = TipSerializer
     permission_classes = [IsAuthenticated]
+    campo_ultima_modificacion = 'updated_at'
+    tags_etag = (TAG_REFUGIOS, TAG_REFERENCIA)
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
     def get_serializer_class(self):
@@ -1270,6 +1340,8 @@ class ResenaRefugioViewSet(viewsets.ModelViewSet):
 class AdopcionViewSet(viewsets.ModelViewSet):
     
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionSeleccionable
+    campos_keyset = ('fecha_adopcion', 'id')
 
     def get_serializer_context(self):
         
@@ -1596,11 +1668,75 @@ class FotoVisitaViewSet(viewsets.ModelViewSet):
         if visita.adopcion.solicitud.mascota.refugio != user.perfil_refugio:
             raise PermissionDenied("No eres el dueño de esta mascota.")
 
-        if visita.fotos.count() >= 3:
+        if visita.fotos.count() >= FotoVisita.MAXIMO_POR_VISITA:
             raise ValidationError("Máximo 3 fotos por visita.")
 
         serializer.save()
 
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+
+        # Varias fotos en un request: un solo chequeo de permiso y de cupo, un INSERT para
+        # todas y una tarea de derivados por foto (los workers las procesan en paralelo)
+        user = request.user
+        if not hasattr(user, 'perfil_refugio'):
+            raise PermissionDenied("Solo refugios pueden subir fotos.")
+
+        serializer = LoteFotosVisitaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+
+        visita_id = datos['visita']
+        if not VisitaSeguimiento.objects.filter(pk=visita_id).exists():
+            raise ValidationError("Visita no encontrada.")
+        if not VisitaSeguimiento.objects.filter(
+            pk=visita_id, adopcion__solicitud__mascota__refugio_id=user.pk
+        ).exists():
+            raise PermissionDenied("No eres el dueño de esta mascota.")
+
+        imagenes = datos['imagenes']
+        descripciones = datos['descripciones']
+        with transaction.atomic():
+            # El bloqueo de la visita serializa lotes simultáneos: el cupo y los números de
+            # orden libres se calculan una sola vez y no pueden cambiar hasta el commit
+            list(VisitaSeguimiento.objects.select_for_update().filter(pk=visita_id).order_by().values_list('pk'))
+            ocupados = set(FotoVisita.objects.filter(visita_id=visita_id).order_by().values_list('orden', flat=True))
+            libres = [orden for orden in range(1, FotoVisita.MAXIMO_POR_VISITA + 1) if orden not in ocupados]
+            if len(imagenes) > len(libres):
+                raise ValidationError(
+                    f"Máximo {FotoVisita.MAXIMO_POR_VISITA} fotos por visita. Quedan {len(libres)} disponibles."
+                )
+
+            fotos = [
+                FotoVisita(
+                    visita_id=visita_id,
+                    imagen=imagen,
+                    descripcion=descripciones[i] if i < len(descripciones) else '',
+                    orden=libres[i],
+                )
+                for i, imagen in enumerate(imagenes)
+            ]
+            FotoVisita.objects.bulk_create(fotos)
+
+            if any(foto.pk is None for foto in fotos):
+                # MySQL no devuelve los ids de un INSERT múltiple: se leen por (visita, orden)
+                ids = dict(
+                    FotoVisita.objects.filter(visita_id=visita_id, orden__in=libres)
+                    .values_list('orden', 'pk')
+                )
+                for foto in fotos:
+                    foto.pk = ids[foto.orden]
+
+            # bulk_create no emite post_save: las referencias a los blobs y los derivados se
+            # registran igual que al guardar una foto suelta
+            for foto in fotos:
+                registrar_archivos(foto)
+
+        return Response({
+            'success': True,
+            'results': FotoVisitaSerializer(fotos, many=True, context=self.get_serializer_context()).data
+        }, status=status.HTTP_201_CREATED)
+
 
 # =============================================================================
 # VOLUNTARIADO
@@ -1882,26 +2018,16 @@ class DocumentoViewSet(viewsets.ModelViewSet):
             raise ValidationError("Debe proporcionar un archivo.")
 
 
-        max_size = 150 * 1024 * 1024
-        if archivo.size > max_size:
-            raise ValidationError(f"El archivo es demasiado grande. Máximo permitido: 150MB")
+        if archivo.size > tamano_maximo_documento():
+            raise ValidationError(
+                f"El archivo es demasiado grande. Máximo permitido: {tamano_maximo_documento() // (1024 * 1024)}MB"
+            )
 
         
         tipo_archivo = serializer.validated_data.get('tipo_archivo')
-        extensiones_permitidas = {
-            'PDF': ['.pdf'],
-            'DOCX': ['.docx', '.doc'],
-            'XLSX': ['.xlsx', '.xls'],
-            'TXT': ['.txt'],
-        }
-
-        extension = archivo.name.lower().split('.')[-1]
-        if tipo_archivo in extensiones_permitidas:
-            extensiones = extensiones_permitidas[tipo_archivo]
-            if not any(archivo.name.lower().endswith(ext) for ext in extensiones):
-                raise ValidationError(
-                    f"El archivo debe ser de tipo {tipo_archivo}. Extensiones permitidas: {', '.join(extensiones)}"
-                )
+        validar_extension(archivo.name, tipo_archivo)
+        validar_firma(tipo_archivo, archivo.read(BYTES_CABECERA))
+        archivo.seek(0)
 
         serializer.save(
             creado_por=user,
@@ -1919,7 +2045,7 @@ class DocumentoViewSet(viewsets.ModelViewSet):
 
         
         return Response({
-            'url': request.build_absolute_uri(documento.archivo.url),
+            'url': url_descarga(request, 'documentos', documento.pk),
             'nombre': documento.nombre,
             'tamano': documento.tamano,
             'tipo_archivo': documento.tipo_archivo
@@ -1972,14 +2098,129 @@ class DocumentoViewSet(viewsets.ModelViewSet):
         })
 
 
+class SubidaDocumentoViewSet(viewsets.GenericViewSet):
+
+    # Subida por partes para documentos grandes:
+    #   POST   /documentos-subidas/                  inicia (nombre_archivo, tamano, tipo_archivo y campos del documento)
+    #   PUT    /documentos-subidas/{id}/             agrega un trozo (cuerpo binario + Content-Range). El primero
+    #                                                debe traer al menos los primeros 8 KB (o el archivo completo
+    #                                                si es menor): con ellos se valida la firma del contenido
+    #   GET    /documentos-subidas/{id}/             bytes recibidos, para reanudar
+    #   POST   /documentos-subidas/{id}/finalizar/   verifica el sha256 y crea el Documento
+    #   DELETE /documentos-subidas/{id}/             cancela
+    serializer_class = SubidaDocumentoSerializer
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+
+    def get_queryset(self):
+        return SubidaDocumento.objects.filter(usuario=self.request.user)
+
+    def create(self, request):
+
+        user = request.user
+        if not hasattr(user, 'perfil_refugio'):
+            raise PermissionDenied("Solo los refugios pueden crear documentos.")
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # Los datos del documento se validan ahora para no descubrir un error después de subir 150MB
+        documento = DocumentoSerializer(data=request.data, context=self.get_serializer_context())
+        documento.is_valid(raise_exception=True)
+        datos = {
+            campo: documento.validated_data[campo]
+            for campo in ('nombre', 'categoria', 'descripcion', 'version', 'estado')
+            if campo in documento.validated_data
+        }
+
+        serializer.save(usuario=user, refugio=user.perfil_refugio, datos=datos)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        return Response(self.get_serializer(self.get_object()).data)
+
+    def update(self, request, pk=None):
+
+        subida = self.get_object()
+        inicio, longitud = parsear_rango(request.headers.get('Content-Range'), subida.tamano)
+        try:
+            largo_cuerpo = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise ValidationError({'Content-Length': 'Debe ser un número de bytes'})
+        if largo_cuerpo != longitud:
+            raise ValidationError({'Content-Range': 'No coincide con el largo del cuerpo'})
+
+        # Se lee el cuerpo directamente del stream (request.data lo cargaría completo en memoria)
+        subida = escribir_trozo(subida.pk, inicio, longitud, request.stream)
+        return Response(self.get_serializer(subida).data)
+
+    def destroy(self, request, pk=None):
+
+        cancelar_subida(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def finalizar(self, request, pk=None):
+
+        subida = self.get_object()
+        sha256 = str(request.data.get('sha256', '')).strip()
+        if len(sha256) != 64 or any(c not in '0123456789abcdefABCDEF' for c in sha256):
+            raise ValidationError({'sha256': 'Debe ser el SHA-256 del archivo en hexadecimal'})
+
+        documento = finalizar_subida(subida.pk, sha256, DocumentoSerializer, self.get_serializer_context())
+        return Response(documento.data, status=status.HTTP_201_CREATED)
+
+
+class ArchivoProtegidoViewSet(viewsets.ViewSet):
+
+    # GET /archivos/{documentos|contratos|verificaciones}/{id}/ con el token JWT o con la
+    # firma temporal que entregan los serializers (?firma=...). Admite Range / If-Range
+    permission_classes = [AllowAny]
+
+    def retrieve(self, request, tipo=None, pk=None):
+
+        firma = request.query_params.get('firma')
+        if firma:
+            tipo_firmado, pk_firmado, usuario_id, es_staff = leer_firma(firma)
+            if (tipo_firmado, pk_firmado) != (tipo, str(pk)):
+                raise PermissionDenied("Enlace de descarga inválido.")
+        elif request.user.is_authenticated:
+            usuario_id, es_staff = request.user.pk, request.user.is_staff
+        else:
+            raise NotAuthenticated()
+
+        nombre, nombre_descarga = resolver_archivo(tipo, pk, usuario_id, es_staff)
+        return respuesta_archivo(request._request, nombre, nombre_descarga)
+
+
 # =============================================================================
 # NOTIFICACIONES
 # =============================================================================
 
-class NotificacionViewSet(viewsets.ModelViewSet):
+class NotificacionViewSet(GetCondicionalMixin, viewsets.ModelViewSet):
     
     serializer_class = NotificacionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionSeleccionable
+    campos_keyset = ('fecha_creacion', 'id')
+    campo_ultima_modificacion = 'fecha_creacion'
+    
+    def agregados_etag(self):
+        # Marcar como leída no cambia fecha_creacion
+        return {'leidas': Count('pk', filter=Q(leida=True))}
+
+    def firma_etag(self):
+
+        # Las difusiones no están en el queryset: su estado (y el cursor del usuario) se
+        # suma a la firma de las notificaciones personales
+        etag, ultima_modificacion = super().firma_etag()
+        estado, ultima_difusion = firma_difusiones(self.request.user)
+        estado += (NotificacionArchivada.objects.filter(usuario=self.request.user).count(),)
+        etag = '"%s"' % hashlib.sha1(f'{etag}|{estado!r}'.encode()).hexdigest()
+        if ultima_difusion is not None:
+            ultima_difusion = calendar.timegm(ultima_difusion.utctimetuple())
+            ultima_modificacion = max(ultima_modificacion or 0, ultima_difusion)
+        return etag, ultima_modificacion
 
     def get_queryset(self):
         
@@ -1987,31 +2228,74 @@ class NotificacionViewSet(viewsets.ModelViewSet):
             usuario=self.request.user
         ).order_by('-fecha_creacion')
 
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_condicional(request, lambda: self._listar(request))
+
+    def _listar(self, request):
+
+        # Personales y difusiones se mezclan al leer, en la misma página y el mismo orden
+        notificaciones = notificaciones_usuario(request.user)
+        page = self.paginate_queryset(notificaciones)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(notificaciones[:], many=True).data)
+
+    def _id_difusion(self):
+
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return -pk if pk < 0 else None
+
+    def get_object(self):
+
+        difusion_id = self._id_difusion()
+        if difusion_id is None:
+            try:
+                return super().get_object()
+            except Http404:
+                # Las leídas antiguas pueden estar en el archivo; solo se ven o se eliminan
+                if self.action not in ('retrieve', 'destroy', 'marcar_leida'):
+                    raise
+                return get_object_or_404(
+                    NotificacionArchivada, usuario=self.request.user, pk=self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+                )
+        # Una difusión se puede ver, marcar como leída u ocultar; no editar
+        if self.action not in ('retrieve', 'destroy', 'marcar_leida'):
+            raise NotFound()
+        notificacion = buscar_difusion(self.request.user, difusion_id)
+        if notificacion is None:
+            raise NotFound()
+        return notificacion
+
+    def perform_destroy(self, instance):
+
+        if getattr(instance, 'difusion', False):
+            ocultar_difusion(self.request.user, -instance.id)
+        else:
+            instance.delete()
+
     @action(detail=True, methods=['post'])
     def marcar_leida(self, request, pk=None):
         
         notificacion = self.get_object()
-        notificacion.leida = True
-        notificacion.save()
+        if getattr(notificacion, 'difusion', False):
+            marcar_difusion_leida(request.user, -notificacion.id)
+        elif isinstance(notificacion, Notificacion):
+            marcar_notificacion_leida(notificacion)
         return Response({'success': True})
 
     @action(detail=False, methods=['post'])
     def marcar_todas_leidas(self, request):
         
-        Notificacion.objects.filter(
-            usuario=request.user,
-            leida=False
-        ).update(leida=True)
+        marcar_todo_leido(request.user)
         return Response({'success': True})
 
     @action(detail=False, methods=['get'])
     def no_leidas(self, request):
         
-        count = Notificacion.objects.filter(
-            usuario=request.user,
-            leida=False
-        ).count()
-        return Response({'count': count})
+        return Response({'count': contar_no_leidas(request.user)})
 
 
 # =============================================================================
@@ -111,7 +111,7 @@ export function AdopcionesUsuario() {
   const cargarMascotas = async () => {
     try {
       setCargando(true);
-      const data = await mascotaPublicaService.listar();
+      const data = await mascotaPublicaService.listar({ vista: 'completa' });
       setMascotas(Array.isArray(data) ? data : data.results || []);
     } catch (error) {
       toast.error('Error al cargar mascotas');